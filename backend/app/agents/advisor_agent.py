@@ -1,9 +1,14 @@
-from typing import List, Dict, Optional, Any
+from typing import Optional
 from .base_agent import BaseAgent
-import random
+from app.models.conversation_log import ConversationLog
+from app.utils.openai_client import OpenAIClient
+from app.utils.stream_events import TokenCallback
 
 class AdvisorAgent(BaseAgent):
-    def __init__(self):
+    # 顾问在后续轮次中较积极地参与
+    NOVELTY_THRESHOLD = 0.3
+
+    def __init__(self, openai_client: Optional[OpenAIClient] = None):
         system_prompt = """你是一位友善的顾问，名字就是"顾问"。
 你的角色是提供建设性的建议和支持性的反馈。
 当用户提出问题时，你应该尽可能给出有帮助的解答。
@@ -11,22 +16,22 @@ class AdvisorAgent(BaseAgent):
 请注意，你是多个AI助手中的一个，其他助手也会针对用户的问题提供回答，
 所以你只需要专注于自己顾问的角色，不需要扮演其他角色。
 简明扼要地回答，不要太长。"""
-        super().__init__("顾问", system_prompt)
+        super().__init__("顾问", system_prompt, openai_client)
     
-    def should_respond(self, global_context: List[Dict[str, Any]]) -> bool:
+    def should_respond(self, global_context: ConversationLog) -> bool:
         # 顾问几乎总是回应
         return True
     
-    async def generate_response(self, global_context: List[Dict[str, Any]]) -> Optional[str]:
+    async def generate_response(self, global_context: ConversationLog, on_token: Optional[TokenCallback] = None) -> Optional[str]:
         if not global_context:
             return None
         
         messages = self.prepare_messages(global_context)
-        return await self.openai_client.generate_completion(messages)
+        return await self.openai_client.generate_completion(messages, on_token=on_token)
     
-    async def should_respond_in_discussion(self, global_context: List[Dict[str, Any]], current_round: int) -> bool:
+    async def should_respond_in_discussion(self, global_context: ConversationLog, current_round: int) -> bool:
         """顾问在讨论中的发言判断"""
         # 顾问在讨论中比较积极，几乎总是参与
         if current_round == 1:
             return True  # 第一轮总是参与
-        return random.random() > 0.2  # 80%概率参与后续轮次
\ No newline at end of file
+        return self.has_novel_content(global_context, current_round)
\ No newline at end of file
@@ -1,50 +1,165 @@
 import asyncio
-import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from .advisor_agent import AdvisorAgent
 from .critic_agent import CriticAgent
 from .innovator_agent import InnovatorAgent
 from .mediator_agent import MediatorAgent
 from .base_agent import BaseAgent
 from app.utils.intent_analyzer import IntentAnalyzer
+from app.utils.openai_client import OpenAIClient, get_openai_client
+from app.utils.stream_events import EventEmitter, make_token_callback, emit_message
+from app.utils.fan_out import Deadline, fan_out
+from app.utils.llm_scheduler import Priority
+from app.utils.llm_errors import LLMError
+from app.utils.metrics import span
+from app.utils.identity_guard import get_identity_guard, record_llm_rewrite
+from app.models.conversation_log import ConversationLog, Message
+from app.utils.conversation_store import ConversationStore, GLOBAL_SCOPE, SUMMARY_SCOPE
+from app.core.config import settings
 
 class AgentManager:
-    def __init__(self):
+    def __init__(self, openai_client: Optional[OpenAIClient] = None, session_id: Optional[str] = None,
+                 store: Optional[ConversationStore] = None):
+        """
+        Args:
+            openai_client: 共享的LLM客户端
+            session_id: 会话ID，配合store使用
+            store: 可选的持久化存储，传入时消息会追加写入存储，restore()从中恢复最近的上下文
+        """
+        # 所有Agent和意图分析器共享同一个客户端（同一个连接池）
+        self.openai_client = openai_client or get_openai_client()
         self.agents = [
-            AdvisorAgent(),
-            CriticAgent(),
-            InnovatorAgent(),
-            MediatorAgent()
+            AdvisorAgent(self.openai_client),
+            CriticAgent(self.openai_client),
+            InnovatorAgent(self.openai_client),
+            MediatorAgent(self.openai_client)
         ]
-        self.global_context = []
-        self.intent_analyzer = IntentAnalyzer()
+        self.global_context = ConversationLog()
+        self.identity_guard = get_identity_guard(tuple(agent.name for agent in self.agents))
+        self.intent_analyzer = IntentAnalyzer(self.openai_client)
+        self.session_id = session_id
+        self.store = store if session_id else None
+        self._attach_context(self.global_context)
     
-    def add_user_message(self, content: str):
-        """添加用户消息到全局上下文"""
-        message = {
-            "role": "user",
-            "content": content
-        }
+    def _attach_context(self, global_context: ConversationLog):
+        """使用新的全局上下文，各Agent的投影随之重建，之后追加消息时增量更新"""
+        self.global_context = global_context
+        for agent in self.agents:
+            agent.projection.rebuild(global_context)
+        for agent in self.agents:
+            global_context.subscribe(agent.projection.observe)
+    
+    @property
+    def latest_user_message(self) -> Optional[Message]:
+        return self.global_context.latest_user_message()
+    
+    @property
+    def rolling_summary(self) -> Optional[Message]:
+        return self.global_context.rolling_summary
+    
+    @property
+    def discussion_messages(self) -> List[Message]:
+        """全局上下文中的讨论消息"""
+        return self.global_context.discussion_messages()
+    
+    async def restore(self):
+        """从存储中恢复最近的上下文（只加载构建提示所需的尾部），须在会话处理第一个请求前调用
+
+        读取在线程池中进行，不阻塞事件循环。
+        """
+        if not self.store:
+            return
+        messages = await asyncio.get_running_loop().run_in_executor(None, self._load_tail)
+        if messages:
+            self._attach_context(ConversationLog(messages))
+    
+    def _load_tail(self) -> List[Message]:
+        limit = settings.CONVERSATION_HYDRATE_LIMIT
+        messages = [Message.from_dict(data) for data in self.store.load_tail(self.session_id, GLOBAL_SCOPE, limit)]
+        # 最新的滚动摘要可能早于加载的尾部，一起放入日志（按序号排序）
+        messages += [Message.from_dict(data) for data in self.store.load_tail(self.session_id, SUMMARY_SCOPE, 1)]
+        return messages
+    
+    def _append_global(self, message: Message, scope: str = GLOBAL_SCOPE) -> Message:
+        """追加消息到全局上下文（各Agent的私有视图随之更新），并写入存储"""
         self.global_context.append(message)
+        if self.store:
+            self.store.append(self.session_id, scope, message.to_dict())
+            self._trim()
+        return message
+    
+    def _trim(self):
+        """已持久化的旧消息不必常驻内存：超出上限一半时一次性裁剪回上限"""
+        limit = settings.CONVERSATION_MEMORY_LIMIT
+        if len(self.global_context) > limit + limit // 2:
+            self.global_context.trim(limit)
+    
+    def add_user_message(self, content: str):
+        """添加用户消息到全局上下文（所有Agent的私有视图都会包含它）"""
+        self._append_global(Message("user", content))
+    
+    def add_agent_message(self, agent: BaseAgent, content: str, round_num: Optional[int] = None, is_summary: bool = False):
+        """添加Agent的回复到全局上下文（该Agent的私有视图随之包含它）
         
-        # 同时添加到每个Agent的私有上下文
+        Args:
+            agent: 发言的Agent
+            content: 回复内容
+            round_num: 讨论轮次，直接回复时为None
+            is_summary: 是否是讨论总结
+        """
+        message = Message(
+            "assistant",
+            content,
+            name=agent.name,
+            is_discussion=round_num is not None or is_summary,  # 标记这是讨论中的回应
+            discussion_round=round_num,
+            is_summary=is_summary
+        )
+        self._append_global(message)
+    
+    def add_rolling_summary(self, content: str, summary_until: int):
+        """添加滚动摘要：序号不超过summary_until的消息在构建提示时由该摘要代替
+        
+        Args:
+            content: 摘要内容
+            summary_until: 摘要覆盖到的最后一条消息的序号
+        """
+        message = Message("system", content, is_rolling_summary=True, summary_until=summary_until)
+        self._append_global(message, SUMMARY_SCOPE)
+    
+    def uncompacted_count(self) -> int:
+        """尚未被滚动摘要覆盖的消息数"""
+        summary_until = self.rolling_summary.summary_until if self.rolling_summary else 0
+        return self.global_context.next_seq - 1 - summary_until
+    
+    def get_agent(self, agent_name: str) -> Optional[BaseAgent]:
+        """按名称查找Agent"""
         for agent in self.agents:
-            agent.add_to_private_context(message)
+            if agent.name == agent_name:
+                return agent
+        return None
     
-    async def get_responses(self) -> List[Dict[str, Any]]:
-        """异步获取所有应该回应的Agent的回复"""
-        tasks = []
+    async def get_responses(self, emit: Optional[EventEmitter] = None, intent_result: Optional[Dict[str, Any]] = None,
+                            deadline: Optional[Deadline] = None) -> List[Dict[str, Any]]:
+        """异步获取所有应该回应的Agent的回复
+        
+        Args:
+            emit: 可选的事件回调，传入时各Agent以流式方式输出
+            intent_result: 已有的发言意图分析结果（如路由阶段已算出），为None时单独调用意图分析
+            deadline: 请求的截止时间，超时的Agent被取消并记录在其中
+        """
+        selected_agents = []
         
         # 获取最新用户消息
-        latest_user_messages = [msg for msg in reversed(self.global_context) if msg["role"] == "user"]
-        if not latest_user_messages:
+        if not self.latest_user_message:
             return []
             
-        user_message = latest_user_messages[0]["content"]
+        user_message = self.latest_user_message.content
         
-        # 分析用户意图
-        available_agents = [agent.name for agent in self.agents]
-        intent_result = await self.intent_analyzer.analyze_speaker_intent(user_message, available_agents)
+        # 分析用户意图（路由阶段已分析过时直接复用）
+        if intent_result is None:
+            available_agents = [agent.name for agent in self.agents]
+            intent_result = await self.intent_analyzer.analyze_speaker_intent(user_message, available_agents)
         
         print(f"用户输入: '{user_message}'")
         print(f"意图分析结果: {intent_result}")
@@ -56,77 +171,101 @@ class AgentManager:
             
             if should_speak and not should_not_speak:
                 # 确定应该说话
-                task = self._process_agent_response(agent)
-                tasks.append(task)
+                selected_agents.append(agent)
             elif not should_speak and not should_not_speak:
                 # 没有明确指定，使用Agent自己的判断逻辑
                 if agent.should_respond(self.global_context):
-                    task = self._process_agent_response(agent)
-                    tasks.append(task)
+                    selected_agents.append(agent)
         
-        # 并行等待所有任务完成
-        responses = await asyncio.gather(*tasks)
+        return await self.dispatch(selected_agents, emit, deadline)
+    
+    async def dispatch(self, agents: List[BaseAgent], emit: Optional[EventEmitter] = None,
+                       deadline: Optional[Deadline] = None) -> List[Dict[str, Any]]:
+        """并行获取指定Agent的回复，超时的Agent被取消，返回按时完成的回复
         
+        Args:
+            agents: 需要回复的Agent
+            emit: 可选的事件回调，传入时各Agent以流式方式输出
+            deadline: 请求的截止时间，超时的Agent被取消并记录在其中
+        """
+        deadline = deadline or Deadline()
+        result = await fan_out(
+            [(agent.name, self._process_agent_response(agent, emit, deadline)) for agent in agents],
+            agent_timeout=settings.AGENT_RESPONSE_TIMEOUT,
+            deadline=deadline
+        )
         # 过滤掉空回复
-        return [r for r in responses if r]
+        return [response for _, response in result.results if response]
     
-    async def _process_agent_response(self, agent: BaseAgent) -> Dict[str, Any]:
-        """处理单个agent的响应"""
-        try:
-            response_content = await agent.generate_response(self.global_context)
-            
-            if not response_content:
-                return None
-            
-            # 添加身份检查 - 新增代码
-            if response_content and ("作为" in response_content or "我是" in response_content):
-                wrong_identities = []
-                for a in self.agents:
-                    if a.name != agent.name:
-                        if f"作为{a.name}" in response_content or f"我是{a.name}" in response_content:
-                            wrong_identities.append(a.name)
-                
-                if wrong_identities:
-                    # 检测到身份混淆，进行修正
-                    print(f"检测到{agent.name}身份混淆，提及了: {wrong_identities}")
-                    correction_prompt = f"""你是{agent.name}，请重写以下回复，确保:
+    async def _process_agent_response(self, agent: BaseAgent, emit: Optional[EventEmitter] = None,
+                                      deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """处理单个agent的响应
+
+        LLM调用失败时异常直接抛出，由fan_out记录为失败，错误信息不会写入上下文。
+        请求已被取消或已到截止时间时不再写入上下文。
+        """
+        with span("agent_response", agent.name):
+            response_content = await agent.generate_response(
+                self.global_context,
+                on_token=make_token_callback(emit, agent.name)
+            )
+        
+        if not response_content:
+            return None
+        
+        # 身份混淆检查：优先本地改写，只在必要时调用LLM重写
+        response_content = await self._correct_identity(agent, response_content)
+        
+        if deadline is not None and deadline.expired():
+            print(f"请求已结束，丢弃{agent.name}的回复")
+            return None
+        
+        response = {
+            "agent_name": agent.name,
+            "content": response_content
+        }
+        
+        # 添加到全局上下文
+        self.add_agent_message(agent, response_content)
+        
+        # 流式模式下发送最终内容（可能经过身份修正）
+        await emit_message(emit, agent.name, response_content)
+        
+        return response
+    
+    async def _correct_identity(self, agent: BaseAgent, content: str) -> str:
+        """修正回复中自称其他角色的内容
+        
+        只自称了一个其他角色时在本地把名称替换为自己的名称；同时自称多个其他角色时
+        才调用LLM重写（IDENTITY_LLM_REWRITE关闭或重写失败时退回本地替换）。
+        """
+        wrong_identities = self.identity_guard.find_wrong_identities(content, agent.name)
+        if not wrong_identities:
+            return content
+        print(f"检测到{agent.name}身份混淆，提及了: {wrong_identities}")
+        
+        if settings.IDENTITY_LLM_REWRITE and self.identity_guard.needs_llm_rewrite(wrong_identities):
+            correction_prompt = f"""你是{agent.name}，请重写以下回复，确保:
 1. 不要说"作为{', '.join(wrong_identities)}"
 2. 不要说"我是{', '.join(wrong_identities)}"
 3. 不要代表其他角色发言
 4. 保持原始回复的主要内容和建议
 
 原回复:
-{response_content}"""
-                    response_content = await agent.openai_client.generate_completion([
+{content}"""
+            try:
+                with span("identity_correction", agent.name):
+                    content = await agent.openai_client.generate_completion([
                         {"role": "system", "content": agent.system_prompt},
                         {"role": "user", "content": correction_prompt}
-                    ])
-                    print(f"修正后回复: {response_content[:50]}...")
-                
-            response = {
-                "agent_name": agent.name,
-                "content": response_content
-            }
-            
-            # 添加到全局上下文
-            self.global_context.append({
-                "role": "assistant",
-                "name": agent.name,
-                "agent_role": agent.name,  # 添加自定义字段明确Agent角色
-                "content": response_content
-            })
-            
-            # 添加到Agent自己的私有上下文
-            agent.add_to_private_context({
-                "role": "assistant",
-                "agent_role": agent.name,
-                "content": response_content
-            })
-            
-            return response
-        except Exception as e:
-            logging.error(f"Agent {agent.name}响应处理错误: {str(e)}", exc_info=True)
-            return {
-                "agent_name": agent.name,
-                "content": f"处理响应时发生错误: {str(e)}"
-            }
\ No newline at end of file
+                    ], priority=Priority.BACKGROUND)
+                record_llm_rewrite(True)
+                print(f"修正后回复: {content[:50]}...")
+            except LLMError as e:
+                record_llm_rewrite(False)
+                print(f"重写{agent.name}的回复失败，改为本地修正: {e}")
+            # 重写后仍有残留时由本地替换兜底
+            if not self.identity_guard.find_wrong_identities(content, agent.name):
+                return content
+        
+        return self.identity_guard.rewrite_locally(content, agent.name)
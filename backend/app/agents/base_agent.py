@@ -1,50 +1,98 @@
-from typing import List, Dict, Optional, Any
+from typing import Deque, List, Dict, Optional
 from abc import ABC, abstractmethod
-from app.utils.openai_client import OpenAIClient
-import random
+from app.utils.openai_client import OpenAIClient, get_openai_client
+from app.utils.llm_scheduler import Priority
+from app.utils.stream_events import TokenCallback
+from app.utils.token_budget import message_tokens
+from app.utils.context_projection import ContextProjection
+from app.models.conversation_log import ConversationLog, Message
+from app.utils.novelty_scorer import novelty_scorer, speaking_rng
+from app.utils.identity_guard import identity_instruction
+from app.core.config import settings
 
 
 class BaseAgent(ABC):
-    def __init__(self, name: str, system_prompt: str):
+    # 讨论后续轮次中发言所需的最低新颖度，子类按角色覆盖
+    NOVELTY_THRESHOLD = 0.5
+
+    def __init__(self, name: str, system_prompt: str, openai_client: Optional[OpenAIClient] = None):
         self.name = name
         self.system_prompt = system_prompt
-        self.private_context: List[Dict[str, Any]] = []
-        self.openai_client = OpenAIClient()
+        # 默认使用进程内共享的客户端，复用同一个连接池
+        self.openai_client = openai_client or get_openai_client()
+        # 构建提示时上下文的token预算（包含系统提示）
+        self.context_token_budget = settings.AGENT_TOKEN_BUDGETS.get(name, settings.AGENT_CONTEXT_TOKEN_BUDGET)
+        # 本Agent视角的上下文投影，由AgentManager在追加消息时增量维护
+        self.projection = ContextProjection(name, settings.PRIVATE_CONTEXT_RETENTION)
+    
+    def get_projection(self, global_context: ConversationLog) -> ContextProjection:
+        """获取与global_context对应的投影；首次使用某个上下文时构建一次"""
+        if self.projection.source is not global_context:
+            self.projection.rebuild(global_context)
+        return self.projection
+    
+    def latest_user_message(self, global_context: ConversationLog) -> Optional[Message]:
+        """最新的用户消息"""
+        return self.get_projection(global_context).latest_user_message
     
-    def add_to_private_context(self, message: Dict[str, Any]):
-        """添加消息到私有上下文"""
-        self.private_context.append(message)
+    @property
+    def private_context(self) -> Deque[Message]:
+        """私有上下文：全局消息日志上的视图（用户消息和本Agent的回复），不单独复制消息"""
+        return self.projection.messages
     
-    def should_respond(self, global_context: List[Dict[str, Any]]) -> bool:
+    def should_respond(self, global_context: ConversationLog) -> bool:
         """判断当前Agent是否应该回应，根据自身特性"""
         # 默认实现，子类可以重写
         return True
     
-    def prepare_messages(self, global_context: List[Dict[str, Any]]) -> List[Dict[str, str]]:
-        """准备发送给API的消息列表，包含系统提示和上下文"""
-        messages = [{"role": "system", "content": self.system_prompt}]
+    def prepare_messages(self, global_context: ConversationLog) -> List[Dict[str, str]]:
+        """准备发送给API的消息列表，包含系统提示和上下文
         
-        # 添加全局上下文中的消息，但过滤出相关消息
-        for msg in global_context:
-            if msg["role"] == "user":
-                # 用户消息总是包含
-                messages.append({"role": "user", "content": msg["content"]})
-            elif msg["role"] == "assistant":
-                # 只包含当前Agent的回复或无Agent标识的回复
-                if "name" in msg and msg["name"] == self.name:
-                    messages.append({"role": "assistant", "content": msg["content"]})
-                # 也可以选择包含其他Agent的回复，但需要明确标识
-                # elif "name" in msg and msg["name"] != self.name:
-                #     messages.append({"role": "user", "content": f"{msg['name']}: {msg['content']}"})
+        系统提示和最新的用户消息总是保留，其余消息从新到旧依次加入，直到用完token预算。
+        已被滚动摘要覆盖的旧消息由摘要代替。
+        """
+        projection = self.get_projection(global_context)
+        system_prompt = self.system_prompt + identity_instruction(self.name)
+        budget = self.context_token_budget - message_tokens(system_prompt)
+        summary_message = self._rolling_summary_message(projection)
+        if summary_message:
+            budget -= message_tokens(summary_message["content"])
         
-        return messages
+        # 投影中只有用户消息和本Agent的回复，从新到旧依次加入
+        history = []
+        has_user_message = False
+        for item in reversed(projection.messages):
+            if self._is_compacted(item.seq, projection):
+                break
+            # 最新的用户消息是当前问题，即使超出预算也要保留
+            pinned = item.role == "user" and not has_user_message
+            if item.tokens > budget and not pinned:
+                break
+            budget -= item.tokens
+            history.append({"role": item.role, "content": item.content})
+            has_user_message = has_user_message or item.role == "user"
+        
+        messages = [{"role": "system", "content": system_prompt}]
+        if summary_message:
+            messages.append(summary_message)
+        return messages + list(reversed(history))
+    
+    def _rolling_summary_message(self, projection: ContextProjection) -> Optional[Dict[str, str]]:
+        """把最新的滚动摘要转换为提示中的消息"""
+        if not projection.rolling_summary:
+            return None
+        return {"role": "system", "content": f"之前对话的摘要:\n{projection.rolling_summary.content}"}
+    
+    def _is_compacted(self, seq: Optional[int], projection: ContextProjection) -> bool:
+        """消息是否已被滚动摘要覆盖"""
+        return seq is not None and seq <= projection.summary_until
     
-    async def generate_response(self, global_context: List[Dict[str, Any]]) -> Optional[str]:
-        """生成回应 - 由子类实现"""
+    async def generate_response(self, global_context: ConversationLog, on_token: Optional[TokenCallback] = None) -> Optional[str]:
+        """生成回应 - 由子类实现，传入on_token时以流式方式生成"""
         pass
 
     # 引入讨论
-    async def should_respond_in_discussion(self, global_context: List[Dict[str, Any]], current_round: int) -> bool:
+    async def should_respond_in_discussion(self, global_context: ConversationLog, current_round: int) -> bool:
         """判断Agent是否应该在讨论中回应
         Args:
         global_context: 全局上下文历史
@@ -53,25 +101,55 @@ class BaseAgent(ABC):
         Returns:
             bool: 是否应该回应
         """
-        # 默认实现：在第一轮所有人都回应，后续轮次有50%概率回应
+        # 默认实现：在第一轮所有人都回应，后续轮次只在有足够新内容时回应
         if current_round == 1:
             return True
-        return random.random() > 0.5
+        return self.has_novel_content(global_context, current_round)
 
-    async def generate_discussion_response(self, global_context: List[Dict[str, Any]], current_round: int) -> Optional[str]:
+    def discussion_novelty(self, global_context: ConversationLog, current_round: int) -> float:
+        """其他Agent最近的发言相对讨论主题和本Agent已有发言的新颖度
+
+        本次讨论（最新用户消息之后）中，其他Agent在上一轮及之后的发言视为新内容，
+        讨论主题、更早轮次的发言和本Agent自己的发言视为已有内容。
+        """
+        latest_user_message = self.latest_user_message(global_context)
+        since_seq = latest_user_message.seq if latest_user_message else 0
+        new_texts, seen_texts = [], []
+        if latest_user_message:
+            seen_texts.append(latest_user_message.content)
+        for msg in global_context.since(since_seq):
+            if msg.discussion_round is None:
+                continue
+            if msg.name != self.name and msg.discussion_round >= current_round - 1:
+                new_texts.append(msg.content)
+            else:
+                seen_texts.append(msg.content)
+        return novelty_scorer.novelty(new_texts, seen_texts)
+
+    def has_novel_content(self, global_context: ConversationLog, current_round: int) -> bool:
+        """新颖度是否达到本Agent的阈值；未达到时按探索概率仍可能发言"""
+        threshold = settings.NOVELTY_THRESHOLDS.get(self.name, self.NOVELTY_THRESHOLD)
+        novelty = self.discussion_novelty(global_context, current_round)
+        print(f"{self.name}第{current_round}轮新颖度: {novelty:.2f}（阈值{threshold}）")
+        if novelty >= threshold:
+            return True
+        return speaking_rng.random() < settings.SPEAKING_EXPLORATION_RATE
+
+    async def generate_discussion_response(self, global_context: ConversationLog, current_round: int, on_token: Optional[TokenCallback] = None) -> Optional[str]:
         """生成Agent在讨论中的回应
         Args:
         global_context: 全局上下文历史
         current_round: 当前讨论轮次
+        on_token: 可选的流式回调，用于逐段转发生成的文本
         
         Returns:
             str: 生成的回应内容
         """
         # 构建特殊提示，强调这是Agent间的讨论
         discussion_messages = self.prepare_discussion_messages(global_context, current_round)
-        return await self.openai_client.generate_completion(discussion_messages)
+        return await self.openai_client.generate_completion(discussion_messages, on_token=on_token, priority=Priority.DISCUSSION)
 
-    def prepare_discussion_messages(self, global_context: List[Dict[str, Any]], current_round: int) -> List[Dict[str, str]]:
+    def prepare_discussion_messages(self, global_context: ConversationLog, current_round: int) -> List[Dict[str, str]]:
         """准备用于讨论的消息列表
         Args:
         global_context: 全局上下文历史
@@ -96,19 +174,39 @@ class BaseAgent(ABC):
 
         messages = [{"role": "system", "content": system_prompt}]
 
+        projection = self.get_projection(global_context)
+        
         # 提取最后一条用户消息作为讨论主题
-        user_messages = [msg for msg in global_context if msg["role"] == "user"]
-        if user_messages:
-            latest_user_message = user_messages[-1]
-            messages.append({"role": "user", "content": f"讨论主题: {latest_user_message['content']}"})
-    
+        latest_user_message = projection.latest_user_message
+        if latest_user_message:
+            messages.append({"role": "user", "content": f"讨论主题: {latest_user_message.content}"})
         
         # 添加上下文中的内容，标记是谁说的
+        # 系统提示和讨论主题总是保留，讨论记录只保留最近几轮，并受token预算限制
+        summary_message = self._rolling_summary_message(projection)
+        budget = self.context_token_budget - sum(message_tokens(m["content"]) for m in messages) - message_tokens("之前的讨论:")
+        if summary_message:
+            budget -= message_tokens(summary_message["content"])
         discussion_history = []
-        for msg in global_context:
-            if msg["role"] == "assistant" and "name" in msg and msg.get("is_discussion", False):
-                agent_name = msg["name"]
-                discussion_history.append(f"{agent_name}: {msg['content']}")
+        rounds_seen = 0
+        last_round = object()
+        for item in reversed(projection.discussion):
+            # 更早的讨论由滚动摘要代替
+            if self._is_compacted(item.seq, projection):
+                break
+            if item.round != last_round:
+                rounds_seen += 1
+                last_round = item.round
+                if rounds_seen > settings.DISCUSSION_HISTORY_ROUNDS:
+                    break
+            if item.tokens > budget:
+                break
+            budget -= item.tokens
+            discussion_history.append(item.line)
+        discussion_history.reverse()
+        
+        if summary_message:
+            messages.insert(1, summary_message)
         
         if discussion_history:
             messages.append({
@@ -118,12 +216,13 @@ class BaseAgent(ABC):
         
         return messages
 
-    async def generate_discussion_summary(self, global_context: List[Dict[str, Any]], discussion_responses: List[Dict]) -> Optional[str]:
+    async def generate_discussion_summary(self, global_context: ConversationLog, discussion_responses: List[Dict], on_token: Optional[TokenCallback] = None) -> Optional[str]:
         """生成讨论总结
         
         Args:
             global_context: 全局上下文
             discussion_responses: 讨论中的所有回应
+            on_token: 可选的流式回调，用于逐段转发生成的文本
             
         Returns:
             str: 总结内容
@@ -1,9 +1,22 @@
-from typing import List, Dict, Optional, Any
+from typing import Optional
 from .base_agent import BaseAgent
-import random
+from app.models.conversation_log import ConversationLog
+from app.utils.openai_client import OpenAIClient
+from app.utils.stream_events import TokenCallback
+from app.utils.keyword_matcher import KeywordMatcher
+from app.utils.novelty_scorer import speaking_rng
 
 class CriticAgent(BaseAgent):
-    def __init__(self):
+    # 批评者在有新观点可以评论时参与
+    NOVELTY_THRESHOLD = 0.4
+
+    # 用户明确要求批评、反馈或评估的关键词
+    EXPLICIT_KEYWORDS = ["批评", "缺点", "问题", "风险", "不足", "评价", "评估", "反馈"]
+    # 用户在讨论计划、想法、观点或方案的关键词
+    IMPLICIT_KEYWORDS = ["计划", "想法", "方案", "观点", "认为", "如何", "怎么样", "可行性", "策略"]
+    KEYWORD_MATCHER = KeywordMatcher({"explicit": EXPLICIT_KEYWORDS, "implicit": IMPLICIT_KEYWORDS})
+
+    def __init__(self, openai_client: Optional[OpenAIClient] = None):
         system_prompt = """你是一位专业的批评者，名字就是"批评者"。
 你的角色是提供建设性批评和指出潜在问题，帮助用户看到他们可能忽略的盲点。
 当讨论进行时，你应该：
@@ -17,57 +30,52 @@ class CriticAgent(BaseAgent):
 请注意，你是多个AI助手中的一个，其他助手会提供支持和创新视角，
 所以你应专注于批评者角色，不需要扮演其他角色或提供全面解决方案。
 简明扼要地回答，不要太长。"""
-        super().__init__("批评者", system_prompt)
+        super().__init__("批评者", system_prompt, openai_client)
     
-    def should_respond(self, global_context: List[Dict[str, Any]]) -> bool:
+    def should_respond(self, global_context: ConversationLog) -> bool:
         # 批评者不是对每个问题都回应
         if not global_context:
             return False
             
         # 获取最新的用户消息
-        latest_user_messages = [msg for msg in reversed(global_context) if msg["role"] == "user"]
-        if not latest_user_messages:
+        latest_user_message = self.latest_user_message(global_context)
+        if not latest_user_message:
             return False
             
-        user_message = latest_user_messages[0]["content"].lower()
+        user_message = latest_user_message.content.lower()
+        labels = self.KEYWORD_MATCHER.match_labels(user_message)
         
         # 如果用户明确要求批评、反馈或评估，批评者应该回应
-        explicit_keywords = ["批评", "缺点", "问题", "风险", "不足", "评价", "评估", "反馈"]
-        if any(keyword in user_message for keyword in explicit_keywords):
+        if "explicit" in labels:
             return True
         
         # 如果用户在讨论计划、想法、观点或方案，批评者也可能回应
-        implicit_keywords = ["计划", "想法", "方案", "观点", "认为", "如何", "怎么样", "可行性", "策略"]
-        if any(keyword in user_message for keyword in implicit_keywords):
+        if "implicit" in labels:
             # 对于这类问题，70%的概率回应
-            import random
-            return random.random() < 0.7
+            return speaking_rng.random() < 0.7
         
         # 对于一般性问题，30%的概率回应
-        import random
-        return random.random() < 0.3
+        return speaking_rng.random() < 0.3
     
-    async def generate_response(self, global_context: List[Dict[str, Any]]) -> Optional[str]:
+    async def generate_response(self, global_context: ConversationLog, on_token: Optional[TokenCallback] = None) -> Optional[str]:
         if not global_context:
             return None
         
         messages = self.prepare_messages(global_context)
-        return await self.openai_client.generate_completion(messages)
+        return await self.openai_client.generate_completion(messages, on_token=on_token)
     
-    async def should_respond_in_discussion(self, global_context: List[Dict[str, Any]], current_round: int) -> bool:
+    async def should_respond_in_discussion(self, global_context: ConversationLog, current_round: int) -> bool:
         """批评者在讨论中的发言判断"""
         # 批评者更倾向于在有一些观点后再发表评论
         if current_round == 1:
             return True  # 第一轮也参与
         
-        # 检查之前的讨论是否已经有其他Agent发言
-        has_previous_responses = False
-        for msg in reversed(global_context):
-            if msg.get("is_discussion", False) and msg["role"] == "assistant" and msg.get("discussion_round") == current_round - 1:
-                has_previous_responses = True
-                break
+        # 检查本次讨论（最新用户消息之后）的上一轮是否已经有其他Agent发言
+        latest_user_message = self.latest_user_message(global_context)
+        since_seq = latest_user_message.seq if latest_user_message else 0
+        has_previous_responses = global_context.has_round_responses(current_round - 1, since_seq)
         
-        # 如果前一轮有发言，批评者更有可能回应
-        if has_previous_responses:
-            return random.random() > 0.3  # 70%概率回应
-        return random.random() > 0.7  # 否则只有30%概率回应
\ No newline at end of file
+        # 前一轮没有可以评论的发言时不回应，否则看新内容是否足够多
+        if not has_previous_responses:
+            return False
+        return self.has_novel_content(global_context, current_round)
\ No newline at end of file
@@ -1,9 +1,28 @@
-from typing import List, Dict, Optional, Any
+from typing import Optional
 from .base_agent import BaseAgent
-import random
+from app.models.conversation_log import ConversationLog
+from app.utils.openai_client import OpenAIClient
+from app.utils.stream_events import TokenCallback
+from app.utils.keyword_matcher import KeywordMatcher
+from app.utils.novelty_scorer import speaking_rng
 
 class InnovatorAgent(BaseAgent):
-    def __init__(self):
+    # 创新者在讨论出现新方向时参与
+    NOVELTY_THRESHOLD = 0.5
+
+    # 用户明确询问创新、新想法或不同思路的关键词
+    EXPLICIT_KEYWORDS = ["创新", "新想法", "创意", "突破", "不同思路", "新方法", "可能性", "创造性"]
+    # 用户在讨论解决方案、改进或设计的关键词
+    IMPLICIT_KEYWORDS = ["如何", "怎样", "解决", "改进", "设计", "开发", "构思", "灵感", "想象"]
+    # 问题性质的提问
+    QUESTION_KEYWORDS = ["为什么", "是什么", "可能吗"]
+    KEYWORD_MATCHER = KeywordMatcher({
+        "explicit": EXPLICIT_KEYWORDS,
+        "implicit": IMPLICIT_KEYWORDS,
+        "question": QUESTION_KEYWORDS
+    })
+
+    def __init__(self, openai_client: Optional[OpenAIClient] = None):
         system_prompt = """你是一位创新思维专家，名字就是"创新者"。
 你的角色是提供创新性的解决方案、新颖的视角和突破性的思路。
 当讨论进行时，你应该：
@@ -17,56 +36,49 @@ class InnovatorAgent(BaseAgent):
 请注意，你是多个AI助手中的一个，其他助手会提供支持和批判视角，
 所以你应专注于创新者角色，不需要扮演其他角色或评估风险。
 简明扼要地回答，不要太长。"""
-        super().__init__("创新者", system_prompt)
+        super().__init__("创新者", system_prompt, openai_client)
     
-    def should_respond(self, global_context: List[Dict[str, Any]]) -> bool:
+    def should_respond(self, global_context: ConversationLog) -> bool:
         # 创新者对创意相关问题更感兴趣
         if not global_context:
             return False
             
         # 获取最新的用户消息
-        latest_user_messages = [msg for msg in reversed(global_context) if msg["role"] == "user"]
-        if not latest_user_messages:
+        latest_user_message = self.latest_user_message(global_context)
+        if not latest_user_message:
             return False
             
-        user_message = latest_user_messages[0]["content"].lower()
+        user_message = latest_user_message.content.lower()
+        labels = self.KEYWORD_MATCHER.match_labels(user_message)
         
         # 如果用户明确询问创新、新想法或不同思路，创新者应该回应
-        explicit_keywords = ["创新", "新想法", "创意", "突破", "不同思路", "新方法", "可能性", "创造性"]
-        if any(keyword in user_message for keyword in explicit_keywords):
+        if "explicit" in labels:
             return True
         
         # 如果用户在讨论解决方案、改进或设计相关问题，创新者也可能回应
-        implicit_keywords = ["如何", "怎样", "解决", "改进", "设计", "开发", "构思", "灵感", "想象"]
-        if any(keyword in user_message for keyword in implicit_keywords):
+        if "implicit" in labels:
             # 对于这类问题，80%的概率回应
-            import random
-            return random.random() < 0.8
+            return speaking_rng.random() < 0.8
         
         # 对于问题性质的提问，创新者通常也会有新视角
-        question_keywords = ["为什么", "是什么", "可能吗"]
-        if any(keyword in user_message for keyword in question_keywords):
+        if "question" in labels:
             # 对于这类问题，50%的概率回应
-            import random
-            return random.random() < 0.5
+            return speaking_rng.random() < 0.5
             
         # 对于一般性问题，40%的概率回应
-        import random
-        return random.random() < 0.4
+        return speaking_rng.random() < 0.4
     
-    async def generate_response(self, global_context: List[Dict[str, Any]]) -> Optional[str]:
+    async def generate_response(self, global_context: ConversationLog, on_token: Optional[TokenCallback] = None) -> Optional[str]:
         if not global_context:
             return None
         
         messages = self.prepare_messages(global_context)
-        return await self.openai_client.generate_completion(messages)
+        return await self.openai_client.generate_completion(messages, on_token=on_token)
     
-    async def should_respond_in_discussion(self, global_context: List[Dict[str, Any]], current_round: int) -> bool:
+    async def should_respond_in_discussion(self, global_context: ConversationLog, current_round: int) -> bool:
         """创新者在讨论中的发言判断"""
         # 创新者喜欢在讨论初期和后期提供想法
         if current_round == 1:
             return True  # 第一轮总是参与
-        elif current_round >= 3:  # 在讨论后期
-            return random.random() > 0.3  # 70%概率参与
-        else:  # 中间轮次
-            return random.random() > 0.5  # 50%概率参与
\ No newline at end of file
+        # 后续轮次只在讨论中出现足够多新内容时参与
+        return self.has_novel_content(global_context, current_round)
\ No newline at end of file
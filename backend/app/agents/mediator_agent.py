@@ -1,9 +1,20 @@
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional
 from .base_agent import BaseAgent
-import random
+from app.models.conversation_log import ConversationLog, Message
+from app.utils.openai_client import OpenAIClient
+from app.utils.llm_scheduler import Priority
+from app.utils.stream_events import TokenCallback
+from app.utils.keyword_matcher import KeywordMatcher
 
 class MediatorAgent(BaseAgent):
-    def __init__(self):
+    # 协调者在中间轮次出现较多新观点时参与
+    NOVELTY_THRESHOLD = 0.5
+
+    # 用户要求总结或协调的关键词
+    KEYWORDS = ["总结", "协调", "意见", "建议", "综合", "折中", "共识"]
+    KEYWORD_MATCHER = KeywordMatcher({"summary": KEYWORDS})
+
+    def __init__(self, openai_client: Optional[OpenAIClient] = None):
         system_prompt = """你是一位协调者，名字就是"协调者"。
 你的角色是总结其他Agent的观点并寻找共识。
 当讨论进行时，你应该：
@@ -15,45 +26,37 @@ class MediatorAgent(BaseAgent):
 
 保持公正客观，不偏向任何一方观点。
 请注意，你是多个AI助手中的一个，专注于协调角色，简明扼要地回答。"""
-        super().__init__("协调者", system_prompt)
+        super().__init__("协调者", system_prompt, openai_client)
     
-    def should_respond(self, global_context: List[Dict[str, Any]]) -> bool:
+    def should_respond(self, global_context: ConversationLog) -> bool:
         # 协调者通常在其他Agent至少有两个回复后才回应
         if not global_context:
             return False
             
-        # 获取最近的消息
-        recent_messages = global_context[-10:] if len(global_context) > 10 else global_context
-        
-        # 计算不同Agent的回复数量
-        agent_responses = {}
-        for msg in recent_messages:
-            if msg["role"] == "assistant" and "name" in msg:
-                agent_name = msg["name"]
-                agent_responses[agent_name] = agent_responses.get(agent_name, 0) + 1
+        # 最近10条消息中回复过的不同Agent
+        recent_agents = global_context.distinct_agents_in_last(10)
         
         # 如果至少有两个不同的Agent回复，协调者应该回应
-        if len(agent_responses) >= 2:
+        if len(recent_agents) >= 2:
             return True
             
         # 如果用户明确要求总结或协调，也应回应
-        latest_user_messages = [msg for msg in reversed(global_context) if msg["role"] == "user"]
-        if not latest_user_messages:
+        latest_user_message = self.latest_user_message(global_context)
+        if not latest_user_message:
             return False
             
-        user_message = latest_user_messages[0]["content"].lower()
-        keywords = ["总结", "协调", "意见", "建议", "综合", "折中", "共识"]
+        user_message = latest_user_message.content.lower()
         
-        return any(keyword in user_message for keyword in keywords)
+        return "summary" in self.KEYWORD_MATCHER.match_labels(user_message)
     
-    async def generate_response(self, global_context: List[Dict[str, Any]]) -> Optional[str]:
+    async def generate_response(self, global_context: ConversationLog, on_token: Optional[TokenCallback] = None) -> Optional[str]:
         if not global_context:
             return None
         
         messages = self.prepare_messages(global_context)
-        return await self.openai_client.generate_completion(messages)
+        return await self.openai_client.generate_completion(messages, on_token=on_token)
     
-    async def should_respond_in_discussion(self, global_context: List[Dict[str, Any]], current_round: int) -> bool:
+    async def should_respond_in_discussion(self, global_context: ConversationLog, current_round: int) -> bool:
         """协调者在讨论中的发言判断"""
         # 协调者倾向于在讨论中后期或有分歧时发言
         if current_round == 1:
@@ -64,19 +67,18 @@ class MediatorAgent(BaseAgent):
         if current_round >= 3:
             return True
         
-        # 中间轮次，检查是否需要协调（例如有不同意见时）
-        # 这里可以添加更复杂的逻辑来检测分歧
-        return random.random() > 0.4  # 60%概率参与
+        # 中间轮次，只在出现足够多新观点（可能需要协调）时参与
+        return self.has_novel_content(global_context, current_round)
     
     # 总结讨论
-    async def generate_discussion_summary(self, global_context: List[Dict[str, Any]], discussion_responses: List[Dict]) -> Optional[str]:
+    async def generate_discussion_summary(self, global_context: ConversationLog, discussion_responses: List[Dict], on_token: Optional[TokenCallback] = None) -> Optional[str]:
         """协调者生成讨论总结"""
         # 找出最后一个用户消息作为讨论主题
-        user_messages = [msg for msg in global_context if msg["role"] == "user"]
-        if not user_messages:
+        latest_user_message = self.latest_user_message(global_context)
+        if not latest_user_message:
             return None
         
-        discussion_topic = user_messages[-1]["content"]
+        discussion_topic = latest_user_message.content
         
         # 收集讨论中的所有回复
         discussion_content = []
@@ -93,5 +95,39 @@ class MediatorAgent(BaseAgent):
         ]
         
         # 生成总结
-        summary = await self.openai_client.generate_completion(messages)
-        return summary
\ No newline at end of file
+        summary = await self.openai_client.generate_completion(messages, on_token=on_token, priority=Priority.BACKGROUND)
+        return summary
+    # 滚动摘要
+    async def generate_rolling_summary(self, previous_summary: Optional[str], messages: List[Message]) -> Optional[str]:
+        """把较早的对话折叠进滚动摘要
+        
+        Args:
+            previous_summary: 之前的滚动摘要，没有时为None
+            messages: 需要折叠的旧消息（按时间顺序）
+            
+        Returns:
+            str: 更新后的摘要内容
+        """
+        conversation = []
+        for msg in messages:
+            if msg.role == "user":
+                speaker = "用户"
+            else:
+                speaker = msg.name or "助手"
+                if msg.discussion_round:
+                    speaker = f"【轮次{msg.discussion_round}】{speaker}"
+                elif msg.is_summary:
+                    speaker = f"【讨论总结】{speaker}"
+            conversation.append(f"{speaker}: {msg.content}")
+        
+        if not conversation:
+            return None
+        
+        content = "之前的摘要:\n" + (previous_summary or "（无）") + "\n\n新的对话内容:\n" + "\n".join(conversation)
+        messages = [
+            {"role": "system", "content": "你负责维护多Agent对话的滚动摘要。请把新的对话内容合并进之前的摘要，保留用户的问题和需求、各角色的关键观点、已达成的共识和未解决的分歧，省略寒暄和重复内容。只返回更新后的摘要。"},
+            {"role": "user", "content": content}
+        ]
+        
+        summary = await self.openai_client.generate_completion(messages, priority=Priority.BACKGROUND)
+        return summary
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Dict, Optional
 import os
 from dotenv import load_dotenv
 
@@ -11,9 +11,90 @@ class Settings(BaseSettings):
     AGENTS: List[str] = ["顾问", "批评者", "创新者"]
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
-    
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")  # 为空时使用官方地址；压测时指向本地模拟服务
+
+    # LLM连接池配置（进程内所有Agent和分析器共享同一个连接池）
+    LLM_MAX_CONNECTIONS: int = 100            # 最大并发连接数
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20   # 保持活跃的空闲连接数
+    LLM_KEEPALIVE_EXPIRY: float = 30.0        # 空闲连接保留时间（秒）
+    LLM_CONNECT_TIMEOUT: float = 10.0         # 建立连接超时（秒）
+    LLM_REQUEST_TIMEOUT: float = 15.0         # 单次请求超时（秒），实际不超过AGENT_RESPONSE_TIMEOUT/(LLM_MAX_RETRIES+1)
+
+    # LLM调用失败重试和对冲请求
+    LLM_MAX_RETRIES: int = 2                  # 可重试错误的最大重试次数
+    LLM_RETRY_BASE_DELAY: float = 0.5         # 第一次重试的最大退避时间（秒），之后按2的幂增长
+    LLM_RETRY_MAX_DELAY: float = 8.0          # 单次退避时间上限（秒）
+    LLM_HEDGING: bool = False                 # 非流式调用超过近期p95耗时后是否发送对冲请求
+    LLM_HEDGE_MIN_SAMPLES: int = 20           # 计算p95所需的最少样本数
+    LLM_SINGLE_FLIGHT: bool = True            # 相同的非流式请求同时进行时是否合并为一次调用
+
+    # LLM服务熔断
+    CIRCUIT_BREAKER_FAILURE_RATE: float = 0.5         # 最近调用的错误率达到该值时熔断
+    CIRCUIT_BREAKER_SLOW_CALL_SECONDS: float = 30.0   # 耗时达到该值（秒）的调用视为慢调用
+    CIRCUIT_BREAKER_SLOW_CALL_RATE: float = 0.8       # 慢调用比例达到该值时熔断
+    CIRCUIT_BREAKER_WINDOW: int = 20                  # 统计的最近调用次数
+    CIRCUIT_BREAKER_MIN_CALLS: int = 10               # 开始判断所需的最少调用次数
+    CIRCUIT_BREAKER_OPEN_SECONDS: float = 30.0        # 熔断持续时间（秒），之后放行探测调用
+    CIRCUIT_BREAKER_HALF_OPEN_CALLS: int = 2          # 探测调用数，也是恢复所需的连续成功次数
+
+    # LLM请求调度（所有调用共享）
+    LLM_MAX_CONCURRENCY: int = 20             # 同时进行的LLM调用上限
+    LLM_RPM_LIMIT: int = 0                    # 每分钟请求数上限，为0时不限制
+    LLM_TPM_LIMIT: int = 0                    # 每分钟token数上限（按估计值），为0时不限制
+
+    # 本地快速路由：置信度不低于该阈值时不再调用LLM进行路由分析
+    LOCAL_ROUTER_CONFIDENCE_THRESHOLD: float = 0.8
+
+    # LLM回复缓存（仅对显式开启缓存的调用生效，如分类调用）
+    COMPLETION_CACHE_MAX_ENTRIES: int = 1024  # 内存中最多缓存的条目数
+    COMPLETION_CACHE_TTL: float = 3600.0      # 缓存有效期（秒）
+    COMPLETION_CACHE_PATH: str = ""           # 本地SQLite缓存文件路径，为空时只缓存在内存
+
+    # 身份混淆修正：默认在本地替换，同时自称多个其他角色时才调用LLM重写
+    IDENTITY_LLM_REWRITE: bool = True         # 是否允许调用LLM重写，关闭时总是本地替换
+
+    # 会话配置
+    SESSION_HEADER: str = "X-Session-Id"      # 携带会话ID的请求/响应头
+    SESSION_COOKIE: str = "session_id"        # 携带会话ID的Cookie
+    SESSION_IDLE_TIMEOUT: float = 1800.0      # 会话空闲超时（秒）
+    SESSION_MAX_COUNT: int = 1000             # 最多同时保存的会话数
+
+    # 对话持久化（SQLite，WAL模式）
+    CONVERSATION_DB_PATH: str = "conversations.db"  # 数据库文件路径，为空时不持久化
+    CONVERSATION_WRITE_BATCH_SIZE: int = 100        # 单个写事务最多包含的消息数
+    CONVERSATION_HYDRATE_LIMIT: int = 50            # 会话恢复时每个上下文加载的最近消息数
+    CONVERSATION_MEMORY_LIMIT: int = 200            # 已持久化会话在内存中保留的最近消息数
+    PRIVATE_CONTEXT_RETENTION: int = 200            # 每个Agent私有上下文视图保留的最近消息数
+
+    # 构建提示时的上下文窗口
+    AGENT_CONTEXT_TOKEN_BUDGET: int = 3000          # 每个Agent默认的上下文token预算
+    AGENT_TOKEN_BUDGETS: Dict[str, int] = {}        # 按Agent名称覆盖token预算，如 {"协调者": 4000}
+    DISCUSSION_HISTORY_ROUNDS: int = 2              # 讨论提示中保留的最近讨论轮数
+
+    # 并行调度的超时控制
+    AGENT_RESPONSE_TIMEOUT: float = 45.0            # 单个Agent一次回复的超时时间（秒），为0时不限制
+    REQUEST_DEADLINE: float = 180.0                 # 一次请求中所有Agent调用的截止时间（秒），为0时不限制
+
+    # 讨论策略
+    DISCUSSION_STRATEGY: str = "pipelined"          # 默认讨论策略：roundtable（逐轮同步）或 pipelined（流水线）
+    DISCUSSION_PIPELINE_QUORUM: float = 0.5         # 流水线策略中开始下一轮所需的上一轮回应比例
+
+    # 讨论中的发言决策：后续轮次只有新内容足够多时才调用LLM
+    NOVELTY_NGRAM: int = 2                          # 新颖度评分使用的字符n-gram长度
+    NOVELTY_THRESHOLDS: Dict[str, float] = {}       # 按Agent名称覆盖新颖度阈值，如 {"顾问": 0.3}
+    SPEAKING_EXPLORATION_RATE: float = 0.0          # 新颖度不足时仍然发言的概率
+    SPEAKING_RANDOM_SEED: Optional[int] = None      # 发言决策随机数种子，设置后结果可复现
+
+    # 讨论收敛检测：相邻两轮发言高度相似时提前结束讨论
+    CONVERGENCE_THRESHOLD: float = 0.6              # 相邻两轮shingle集合的Jaccard相似度阈值，为0时不检测
+    CONVERGENCE_SHINGLE_SIZE: int = 3               # shingle的字符长度
+
+    # 滚动压缩：未被摘要覆盖的消息超过阈值时，把最早的一批消息折叠为摘要
+    COMPACTION_THRESHOLD: int = 40                  # 触发压缩的消息数，为0时不压缩
+    COMPACTION_BATCH_SIZE: int = 20                 # 每次折叠的消息数
+
     class Config:
         env_file = ".env"
 
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -0,0 +1,238 @@
+# 会话日志：带序号和索引的消息存储
+import bisect
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from app.utils.token_budget import message_tokens
+
+
+class Message:
+    """一条会话消息（使用__slots__，内存占用远小于字典）"""
+
+    __slots__ = (
+        "seq", "role", "content", "name",
+        "is_discussion", "discussion_round", "is_summary",
+        "is_rolling_summary", "summary_until", "tokens",
+    )
+
+    def __init__(self, role: str, content: str, name: Optional[str] = None,
+                 is_discussion: bool = False, discussion_round: Optional[int] = None,
+                 is_summary: bool = False, is_rolling_summary: bool = False,
+                 summary_until: Optional[int] = None, seq: Optional[int] = None):
+        self.seq = seq
+        self.role = role
+        self.content = content
+        self.name = name                          # 发言的Agent名称，用户消息为None
+        self.is_discussion = is_discussion        # 是否是讨论中的发言（含讨论总结）
+        self.discussion_round = discussion_round  # 讨论轮次
+        self.is_summary = is_summary              # 是否是讨论总结
+        self.is_rolling_summary = is_rolling_summary  # 是否是滚动摘要
+        self.summary_until = summary_until        # 滚动摘要覆盖到的最后一条消息序号
+        self.tokens = message_tokens(content)     # token数，只计算一次
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典（用于API输出和持久化），只包含有意义的字段"""
+        data: Dict[str, Any] = {"seq": self.seq, "role": self.role, "content": self.content}
+        if self.name is not None:
+            data["name"] = self.name
+            data["agent_role"] = self.name
+        if self.is_discussion:
+            data["is_discussion"] = True
+        if self.discussion_round is not None:
+            data["discussion_round"] = self.discussion_round
+        if self.is_summary:
+            data["is_summary"] = True
+        if self.is_rolling_summary:
+            data["is_rolling_summary"] = True
+            data["summary_until"] = self.summary_until
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Message":
+        return cls(
+            role=data["role"],
+            content=data["content"],
+            name=data.get("name", data.get("agent_role")),
+            is_discussion=data.get("is_discussion", False),
+            discussion_round=data.get("discussion_round"),
+            is_summary=data.get("is_summary", False),
+            is_rolling_summary=data.get("is_rolling_summary", False),
+            summary_until=data.get("summary_until"),
+            seq=data.get("seq"),
+        )
+
+    def __repr__(self) -> str:
+        return f"Message(seq={self.seq}, role={self.role!r}, name={self.name!r}, content={self.content[:20]!r})"
+
+
+class ConversationLog:
+    """按序号递增保存会话消息，并维护按角色、Agent、讨论轮次和标记划分的索引
+
+    常用查询（最新用户消息、某轮是否有人发言、某序号之后的消息等）为O(1)或O(log n)。
+    支持len、迭代、反向迭代和下标/切片访问，可以像列表一样只读使用。
+    """
+
+    def __init__(self, messages: Optional[List[Message]] = None):
+        self._messages: List[Message] = []
+        self._seqs: List[int] = []
+        self._by_role: Dict[str, List[Message]] = {}
+        self._by_agent: Dict[str, List[Message]] = {}
+        self._by_round: Dict[int, List[Message]] = {}
+        self._discussion: List[Message] = []
+        self._discussion_counts: Dict[str, int] = {}  # 每个Agent的讨论发言数（不含讨论总结）
+        self._discussion_summaries = 0
+        self._listeners: List[Callable[[Message], None]] = []
+        self.rolling_summary: Optional[Message] = None  # 最新的滚动摘要
+        self.next_seq = 1
+        for message in sorted(messages or [], key=lambda m: m.seq or 0):
+            self._insert(message)
+
+    # ---- 写入 ----
+
+    def subscribe(self, listener: Callable[[Message], None]):
+        """注册追加消息时的回调"""
+        self._listeners.append(listener)
+
+    def append(self, message: Message) -> Message:
+        """追加消息并分配序号"""
+        message.seq = self.next_seq
+        self._insert(message)
+        for listener in self._listeners:
+            listener(message)
+        return message
+
+    def _insert(self, message: Message):
+        if message.seq is None:
+            message.seq = self.next_seq
+        self.next_seq = max(self.next_seq, message.seq + 1)
+        self._messages.append(message)
+        self._seqs.append(message.seq)
+        self._by_role.setdefault(message.role, []).append(message)
+        if message.name is not None:
+            self._by_agent.setdefault(message.name, []).append(message)
+        if message.discussion_round is not None:
+            self._by_round.setdefault(message.discussion_round, []).append(message)
+        if message.is_discussion:
+            self._discussion.append(message)
+            self._count_discussion(message, 1)
+        if message.is_rolling_summary:
+            self.rolling_summary = message
+
+    def trim(self, keep: int):
+        """只在内存中保留最近keep条消息（rolling_summary仍指向最新的滚动摘要）"""
+        if len(self._messages) <= keep:
+            return
+        cutoff = self._messages[-keep].seq
+        self._messages = self._messages[-keep:]
+        self._seqs = self._seqs[-keep:]
+
+        def drop_old(items: List[Message]) -> List[Message]:
+            return items[bisect.bisect_left(items, cutoff, key=lambda m: m.seq):]
+
+        self._by_role = {role: drop_old(items) for role, items in self._by_role.items()}
+        self._by_agent = {name: drop_old(items) for name, items in self._by_agent.items()}
+        self._by_round = {r: kept for r, items in self._by_round.items() if (kept := drop_old(items))}
+        kept_discussion = drop_old(self._discussion)
+        for message in self._discussion[:len(self._discussion) - len(kept_discussion)]:
+            self._count_discussion(message, -1)
+        self._discussion = kept_discussion
+
+    def _count_discussion(self, message: Message, delta: int):
+        if message.is_summary:
+            self._discussion_summaries += delta
+        elif message.name is not None:
+            count = self._discussion_counts.get(message.name, 0) + delta
+            if count:
+                self._discussion_counts[message.name] = count
+            else:
+                self._discussion_counts.pop(message.name, None)
+
+    # ---- 查询 ----
+
+    def latest(self, role: str) -> Optional[Message]:
+        """某个角色的最新消息"""
+        items = self._by_role.get(role)
+        return items[-1] if items else None
+
+    def latest_user_message(self) -> Optional[Message]:
+        return self.latest("user")
+
+    def by_agent(self, agent_name: str) -> List[Message]:
+        """某个Agent的所有发言（按序号排列，只读）"""
+        return self._by_agent.get(agent_name, [])
+
+    def round_messages(self, round_num: int, since_seq: int = 0) -> List[Message]:
+        """某一讨论轮次中序号大于since_seq的发言"""
+        items = self._by_round.get(round_num, [])
+        index = bisect.bisect_right(items, since_seq, key=lambda m: m.seq)
+        return items[index:]
+
+    def has_round_responses(self, round_num: int, since_seq: int = 0) -> bool:
+        """序号大于since_seq的消息中是否有人在某一轮发言"""
+        items = self._by_round.get(round_num)
+        return bool(items) and items[-1].seq > since_seq
+
+    def discussion_messages(self) -> List[Message]:
+        """所有讨论消息（含讨论总结，只读）"""
+        return self._discussion
+
+    def since(self, seq: int) -> List[Message]:
+        """序号大于seq的所有消息"""
+        return self._messages[bisect.bisect_right(self._seqs, seq):]
+
+    def page(self, since: int = 0, limit: Optional[int] = None,
+             discussion_only: bool = False) -> Tuple[List[Message], bool]:
+        """按序号分页：序号大于since的最多limit条消息，以及之后是否还有更多消息
+
+        Args:
+            since: 上次读取到的序号（游标），为0时从头读取
+            limit: 最多返回的条数，为None时不限制
+            discussion_only: 只返回讨论消息（含讨论总结）
+        """
+        items = self._discussion if discussion_only else self._messages
+        start = bisect.bisect_right(items, since, key=lambda m: m.seq)
+        end = len(items) if limit is None else min(len(items), start + limit)
+        return items[start:end], end < len(items)
+
+    @property
+    def first_seq(self) -> int:
+        """内存中最早一条消息的序号，没有消息时为next_seq"""
+        return self._seqs[0] if self._seqs else self.next_seq
+
+    def counts(self) -> Dict[str, Any]:
+        """内存中消息的数量统计：按角色、按Agent和按讨论轮次"""
+        return {
+            "total": len(self._messages),
+            "by_role": {role: len(items) for role, items in self._by_role.items() if items},
+            "by_agent": {name: len(items) for name, items in self._by_agent.items() if items},
+            "by_round": {r: len(items) for r, items in sorted(self._by_round.items())},
+            "discussion": len(self._discussion),
+        }
+
+    def discussion_counts(self) -> Dict[str, Any]:
+        """讨论消息的数量统计：按Agent和按轮次（讨论总结单独计数）"""
+        return {
+            "total": len(self._discussion),
+            "by_agent": dict(self._discussion_counts),
+            "by_round": {r: len(items) for r, items in sorted(self._by_round.items())},
+            "summaries": self._discussion_summaries,
+        }
+
+    def distinct_agents_in_last(self, count: int) -> Set[str]:
+        """最近count条消息中发言过的不同Agent"""
+        return {m.name for m in self._messages[-count:] if m.role == "assistant" and m.name is not None}
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [message.to_dict() for message in self._messages]
+
+    # ---- 只读序列接口 ----
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self) -> Iterator[Message]:
+        return iter(self._messages)
+
+    def __reversed__(self) -> Iterator[Message]:
+        return reversed(self._messages)
+
+    def __getitem__(self, index):
+        return self._messages[index]
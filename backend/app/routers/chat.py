@@ -1,19 +1,87 @@
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+import asyncio
+import json
+import math
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, ValidationError
+from typing import List, Dict, Any, Optional, Set
 from app.agents.agent_manager import AgentManager
 from app.utils.discussion_detector import DiscussionDetector
 from app.utils.discussion_manager import DiscussionManager
-from app.utils.openai_client import OpenAIClient
+from app.utils.openai_client import get_openai_client
+from app.utils.stream_events import EventEmitter
+from app.utils.session_store import Session, SessionStore
+from app.utils.conversation_store import ConversationStore
+from app.utils.context_compactor import ContextCompactor
+from app.utils.convergence import ConvergenceDetector
+from app.utils.fan_out import Deadline
+from app.utils.llm_scheduler import llm_session
+from app.utils.circuit_breaker import CircuitState
+from app.utils.metrics import registry, timed
+from app.utils import identity_guard
+from app.core.config import settings
 
 router = APIRouter(tags=["chat"])
 
-# 保存全局AgentManager实例
-agent_manager = AgentManager()
+# 讨论检测器是无状态的，所有会话共享
+discussion_detector = DiscussionDetector(openai_client=get_openai_client())
 
-# 创建讨论检测器和管理器
-discussion_detector = DiscussionDetector(openai_client=OpenAIClient())
-discussion_manager = DiscussionManager(agent_manager)
+
+# 对话持久化存储，会话首次访问时从中恢复最近的上下文
+conversation_store = (
+    ConversationStore(settings.CONVERSATION_DB_PATH, batch_size=settings.CONVERSATION_WRITE_BATCH_SIZE)
+    if settings.CONVERSATION_DB_PATH else None
+)
+
+
+# 讨论收敛检测只保存统计数据，所有会话共享
+convergence_detector = ConvergenceDetector(
+    threshold=settings.CONVERGENCE_THRESHOLD,
+    shingle_size=settings.CONVERGENCE_SHINGLE_SIZE
+)
+
+
+def _create_session(session_id: str) -> Session:
+    """为新会话创建独立的AgentManager和讨论管理器"""
+    agent_manager = AgentManager(session_id=session_id, store=conversation_store)
+    return Session(session_id, agent_manager, DiscussionManager(agent_manager, convergence_detector))
+
+
+# 在请求返回后把较早的对话折叠为滚动摘要
+context_compactor = ContextCompactor(
+    threshold=settings.COMPACTION_THRESHOLD,
+    batch_size=settings.COMPACTION_BATCH_SIZE
+)
+
+# 按会话隔离的Agent状态和上下文
+session_store = SessionStore(
+    _create_session,
+    idle_timeout=settings.SESSION_IDLE_TIMEOUT,
+    max_sessions=settings.SESSION_MAX_COUNT
+)
+
+
+@router.on_event("shutdown")
+def close_conversation_store():
+    # 写完排队中的消息后关闭数据库
+    if conversation_store:
+        conversation_store.close()
+
+
+def _attach_session(response: Response, session: Session):
+    """把会话ID写回响应头和Cookie，客户端后续请求带上即可继续同一会话"""
+    response.headers[settings.SESSION_HEADER] = session.session_id
+    response.set_cookie(settings.SESSION_COOKIE, session.session_id, httponly=True, samesite="lax")
+
+
+async def get_session(request: Request, response: Response) -> Session:
+    """从请求头或Cookie中读取会话ID并获取对应会话，没有时创建新会话"""
+    session_id = request.headers.get(settings.SESSION_HEADER) or request.cookies.get(settings.SESSION_COOKIE)
+    session = session_store.get_or_create(session_id)
+    await session.restore()
+    _attach_session(response, session)
+    return session
 
 
 class UserMessageRequest(BaseModel):
@@ -30,143 +98,113 @@ class AgentResponse(BaseModel):
 class ChatResponse(BaseModel):
     responses: List[AgentResponse]
     is_discussion: bool = False  # 标记是否是讨论模式
+    timed_out_agents: List[str] = []  # 超时被取消的Agent，其回复不在responses中
+    failed_agents: List[str] = []     # LLM调用重试后仍失败的Agent，其回复不在responses中
 
 # 支持用户直接请求Agent讨论
 class DiscussionRequest(BaseModel):
     topic: str
     max_rounds: int = 3
-    strategy: str = "roundtable"
+    strategy: Optional[str] = None  # 为None时使用配置中的默认策略
+
+
+def _messages_between(messages, since: int, until: int) -> List[Dict[str, Any]]:
+    """按序号排列的消息中 since < seq <= until 的部分，从尾部向前查找，只访问变化的部分"""
+    delta = []
+    for message in reversed(messages):
+        if message.seq <= since:
+            break
+        if message.seq <= until:
+            delta.append(message.to_dict())
+    delta.reverse()
+    return delta
+
 
 @router.get("/context")
-async def get_context():
-    """获取当前上下文状态"""
+async def get_context(
+    since: int = Query(0, ge=0, description="上次读取到的序号，只返回之后的消息"),
+    limit: Optional[int] = Query(None, ge=1, description="最多返回的全局消息条数"),
+    summary_only: bool = Query(False, description="只返回数量统计，不返回消息内容"),
+    session: Session = Depends(get_session)
+):
+    """获取当前会话的上下文状态
+
+    轮询时把返回的cursor作为下一次的since，只获取新增的消息；
+    has_more为true时还有未返回的消息，可以立即继续读取。
+    """
+    global_context = session.agent_manager.global_context
     context_info = {
-        "global_context_length": len(agent_manager.global_context),
-        "global_context": agent_manager.global_context,
+        "global_context_length": len(global_context),
+        "first_seq": global_context.first_seq,
+        "next_seq": global_context.next_seq,
+        # since之后的部分消息已被移出内存，客户端应从first_seq重新读取
+        "truncated": since + 1 < global_context.first_seq,
         "agents": {}
     }
-    
-    for agent in agent_manager.agents:
+    if summary_only:
+        context_info["counts"] = global_context.counts()
+        for agent in session.agent_manager.agents:
+            context_info["agents"][agent.name] = {"private_context_length": len(agent.private_context)}
+        return context_info
+
+    messages, has_more = global_context.page(since, limit)
+    cursor = messages[-1].seq if messages else max(since, global_context.next_seq - 1)
+    context_info.update({
+        "global_context": [message.to_dict() for message in messages],
+        "cursor": cursor,
+        "has_more": has_more,
+    })
+    # 私有上下文只返回与本页全局消息相同序号范围内的部分
+    for agent in session.agent_manager.agents:
         context_info["agents"][agent.name] = {
             "private_context_length": len(agent.private_context),
-            "private_context": agent.private_context
+            "private_context": _messages_between(agent.private_context, since, cursor)
         }
     
     return context_info
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(request: UserMessageRequest):
-    try:
-        # 检测用户意图
-        intent_result = await discussion_detector.detect_discussion_needed(request.content)
-        print(f"用户意图分析结果: {intent_result}")
-        
-        responses = []
-        is_discussion_mode = False
-
-        # 添加用户消息到全局上下文
-        agent_manager.add_user_message(request.content)
-        
-        if intent_result.get("needs_discussion", False):
-            # 讨论模式处理逻辑
-            print(f"检测到讨论需求")
-            is_discussion_mode = True
-
-            # 提取讨论主题
-            discussion_topic = request.content
-            if intent_result.get("extract_topic", True):
-                discussion_topic = await discussion_detector.extract_discussion_topic(request.content)
-                print(f"提取的讨论主题: {discussion_topic}")
-            
-            # 执行讨论流程
-            discussion_responses = await discussion_manager.run_discussion_cycle(
-                discussion_topic, 
-                max_rounds=intent_result.get("suggested_rounds", 3)
-            )
-            
-            # 转换为响应格式
-            for resp in discussion_responses:
-                responses.append(AgentResponse(
-                    agent_name=resp["agent_name"],
-                    content=resp["content"],
-                    round=resp.get("round"),
-                    is_summary=resp.get("is_summary", False)
-                ))
-            
-            # 可选：添加讨论总结
-            summary = await discussion_manager.maybe_add_summary(discussion_responses)
-            if summary:
-                responses.append(AgentResponse(
-                    agent_name=summary["agent_name"],
-                    content=summary["content"],
-                    is_summary=True
-                ))
-
-        elif len(intent_result.get("specified_agents", [])) > 0:
-            # 指定Agent回答模式
-            specified_agents = intent_result["specified_agents"]
-            print(f"用户指定的Agent: {specified_agents}")
-            
-            # 只调用指定的Agent
-            for agent in agent_manager.agents:
-                if agent.name in specified_agents:
-                    response = await agent_manager._process_agent_response(agent)
-                    if response:
-                        responses.append(AgentResponse(
-                            agent_name=response["agent_name"],
-                            content=response["content"]
-                        ))
-                
-        else:
-            # 原有的直接回复流程
-            agent_manager.add_user_message(request.content)
-            agent_responses = await agent_manager.get_responses()
-            
-            # 转换为响应格式
-            for resp in agent_responses:
-                responses.append(AgentResponse(
-                    agent_name=resp["agent_name"],
-                    content=resp["content"]
-                ))
-        
-        return ChatResponse(
-            responses=responses,
-            is_discussion=is_discussion_mode
-        )
-        
-    except Exception as e:
-        print(f"处理聊天请求时出错: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+@timed("chat_request")
+async def _run_chat(session: Session, content: str, emit: Optional[EventEmitter] = None,
+                    deadline: Optional[Deadline] = None) -> ChatResponse:
+    """执行一次聊天请求的完整流程，传入emit时各Agent以流式方式输出
 
+    deadline可由调用方传入，调用方取消它（deadline.cancel()）后流程中不再提交新的发言。
+    """
+    agent_manager = session.agent_manager
+    discussion_manager = session.discussion_manager
+    deadline = deadline or Deadline(settings.REQUEST_DEADLINE)
+    llm_session.set(session.session_id)  # 同一会话的LLM调用在调度器中一起公平排队
+    
+    # 一次调用完成讨论判断、主题提取和发言意图分析
+    available_agents = [agent.name for agent in agent_manager.agents]
+    intent_result = await discussion_detector.analyze_request(content, available_agents)
+    print(f"用户意图分析结果: {intent_result}")
+    
+    responses = []
+    is_discussion_mode = False
 
-@router.get("/discussion/status")
-async def get_discussion_status():
-    """获取当前讨论状态（用于调试）"""
-    discussion_messages = [
-        msg for msg in agent_manager.global_context 
-        if msg.get("is_discussion", False)
-    ]
+    # 添加用户消息到全局上下文
+    agent_manager.add_user_message(content)
     
-    return {
-        "discussion_count": len(discussion_messages),
-        "discussion_messages": discussion_messages
-    }
+    if intent_result.get("needs_discussion", False):
+        # 讨论模式处理逻辑
+        print(f"检测到讨论需求")
+        is_discussion_mode = True
 
-# 支持用户直接请求Agent讨论
-@router.post("/discussion", response_model=ChatResponse)
-async def start_discussion(request: DiscussionRequest):
-    """启动一个Agent讨论"""
-    try:
-        # 直接启动讨论，无需检测
+        # 讨论主题已由路由分析一并提取
+        discussion_topic = intent_result.get("topic") or content
+        print(f"提取的讨论主题: {discussion_topic}")
+        
+        # 执行讨论流程
         discussion_responses = await discussion_manager.run_discussion_cycle(
-            request.topic, 
-            strategy_type=request.strategy,
-            max_rounds=request.max_rounds
+            discussion_topic, 
+            max_rounds=intent_result.get("suggested_rounds", 3),
+            emit=emit,
+            deadline=deadline
         )
         
         # 转换为响应格式
-        responses = []
         for resp in discussion_responses:
             responses.append(AgentResponse(
                 agent_name=resp["agent_name"],
@@ -176,19 +214,341 @@ async def start_discussion(request: DiscussionRequest):
             ))
         
         # 可选：添加讨论总结
-        summary = await discussion_manager.maybe_add_summary(discussion_responses)
+        summary = await discussion_manager.maybe_add_summary(discussion_responses, emit, deadline)
         if summary:
             responses.append(AgentResponse(
                 agent_name=summary["agent_name"],
                 content=summary["content"],
                 is_summary=True
             ))
+
+    elif len(intent_result.get("specified_agents", [])) > 0:
+        # 指定Agent回答模式
+        specified_agents = intent_result["specified_agents"]
+        print(f"用户指定的Agent: {specified_agents}")
+        
+        # 只调用指定的Agent（并行）
+        agents = [agent for agent in agent_manager.agents if agent.name in specified_agents]
+        for response in await agent_manager.dispatch(agents, emit, deadline):
+            responses.append(AgentResponse(
+                agent_name=response["agent_name"],
+                content=response["content"]
+            ))
             
-        return ChatResponse(
-            responses=responses,
-            is_discussion=True
+    else:
+        # 原有的直接回复流程
+        agent_manager.add_user_message(content)
+        agent_responses = await agent_manager.get_responses(emit, intent_result, deadline)
+        
+        # 转换为响应格式
+        for resp in agent_responses:
+            responses.append(AgentResponse(
+                agent_name=resp["agent_name"],
+                content=resp["content"]
+            ))
+    
+    return ChatResponse(
+        responses=responses,
+        is_discussion=is_discussion_mode,
+        timed_out_agents=deadline.timed_out_agents,
+        failed_agents=deadline.failed_agents
+    )
+
+
+def _done_event(result: ChatResponse) -> Dict[str, Any]:
+    """流程结束时发送的事件"""
+    return {
+        "type": "done",
+        "is_discussion": result.is_discussion,
+        "timed_out_agents": result.timed_out_agents,
+        "failed_agents": result.failed_agents
+    }
+
+
+async def _stream_events(session: Session, run) -> StreamingResponse:
+    """把流程中产生的事件以NDJSON格式流式返回
+
+    Args:
+        session: 当前会话，流程执行期间持有会话锁
+        run: 接收emit回调并执行流程的协程函数，返回最终的ChatResponse
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def produce():
+        try:
+            async with session.lock:
+                result = await run(queue.put)
+            await queue.put(_done_event(result))
+        except Exception as e:
+            print(f"流式处理请求时出错: {e}")
+            await queue.put({"type": "error", "detail": str(e)})
+        finally:
+            await queue.put(done)
+
+    async def event_lines():
+        task = asyncio.create_task(produce())
+        try:
+            while True:
+                event = await queue.get()
+                if event is done:
+                    break
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        finally:
+            # 客户端断开时取消仍在进行的Agent调用
+            if not task.done():
+                task.cancel()
+
+    response = StreamingResponse(
+        event_lines(),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(context_compactor.maybe_compact, session.agent_manager)
+    )
+    _attach_session(response, session)
+    return response
+
+
+# WebSocket通道中调度的后台任务（上下文压缩），保留引用直到完成
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _run_in_background(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+@router.websocket("/ws")
+async def session_channel(websocket: WebSocket):
+    """会话的WebSocket通道：推送Agent的输出，并随时接受用户插话
+
+    客户端发送:
+        {"type": "message", "content": "..."}               发送消息（插话），按/chat的流程处理
+        {"type": "discussion", "topic": "...", ...}         直接发起讨论，字段同/discussion
+        {"type": "cancel"}                                  取消正在进行的流程
+    服务端推送:
+        {"type": "session", "session_id": "..."}            连接建立后首先发送
+        token/message/done/error 事件                        与流式接口相同
+        {"type": "cancelled"}                               正在进行的流程被插话或取消打断
+
+    新消息到达时，正在进行的流程（包括未完成的讨论轮次和其中的LLM调用）立即被取消，
+    取消完成后才发送cancelled，此后不会再收到旧流程的事件；已提交的发言保留在上下文中，
+    新消息随即在新的流程中处理。
+    """
+    session_id = (websocket.query_params.get("session_id")
+                  or websocket.headers.get(settings.SESSION_HEADER)
+                  or websocket.cookies.get(settings.SESSION_COOKIE))
+    session = session_store.get_or_create(session_id)
+    await websocket.accept()
+    await session.restore()
+
+    # 所有推送经同一个队列由单独的任务发送，避免多个Agent同时写入连接
+    queue: asyncio.Queue = asyncio.Queue()
+    current: Optional[asyncio.Task] = None
+    deadline: Optional[Deadline] = None  # 当前流程的截止时间，打断时标记为已取消，此后流程不再提交或推送
+
+    async def send_events():
+        while True:
+            await websocket.send_json(await queue.get())
+
+    async def run_cycle(run, deadline: Deadline):
+        async def emit(event: Dict[str, Any]):
+            if not deadline.cancelled:
+                await queue.put(event)
+
+        try:
+            async with session.lock:
+                result = await run(emit, deadline)
+            await emit(_done_event(result))
+            _run_in_background(context_compactor.maybe_compact(session.agent_manager))
+        except Exception as e:
+            print(f"WebSocket处理消息时出错: {e}")
+            await emit({"type": "error", "detail": str(e)})
+
+    async def cancel_current():
+        if current is not None and not current.done():
+            deadline.cancel()
+            current.cancel()
+            # 等待取消完成：会话锁释放，讨论中的Agent任务和LLM调用都已结束，之后不会再有旧流程的提交
+            await asyncio.gather(current, return_exceptions=True)
+            queue.put_nowait({"type": "cancelled"})
+
+    sender = asyncio.create_task(send_events())
+    queue.put_nowait({"type": "session", "session_id": session.session_id})
+    try:
+        while True:
+            data = await websocket.receive_json()
+            kind = data.get("type")
+            session_store.touch(session.session_id)
+            if kind == "cancel":
+                await cancel_current()
+                continue
+            if kind == "message":
+                content = str(data.get("content", "")).strip()
+                if not content:
+                    queue.put_nowait({"type": "error", "detail": "消息内容不能为空"})
+                    continue
+                run = lambda emit, deadline, content=content: _run_chat(session, content, emit, deadline)
+            elif kind == "discussion":
+                try:
+                    request = DiscussionRequest(**{k: v for k, v in data.items() if k != "type"})
+                except ValidationError as e:
+                    queue.put_nowait({"type": "error", "detail": str(e)})
+                    continue
+                run = lambda emit, deadline, request=request: _run_discussion(session, request, emit, deadline)
+            else:
+                queue.put_nowait({"type": "error", "detail": f"未知的消息类型: {kind}"})
+                continue
+
+            breaker = get_openai_client().breaker
+            if breaker.state is CircuitState.OPEN:
+                queue.put_nowait({"type": "error", "detail": "AI服务暂时不可用，请稍后再试",
+                                  "retry_after": math.ceil(breaker.retry_after())})
+                continue
+            # 插话：打断正在进行的流程，用新消息开始新的流程
+            await cancel_current()
+            deadline = Deadline(settings.REQUEST_DEADLINE)
+            current = asyncio.create_task(run_cycle(run, deadline))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await cancel_current()
+        sender.cancel()
+
+
+@router.get("/stats")
+async def get_stats():
+    """获取运行统计（用于调优）"""
+    return {
+        "local_router": discussion_detector.local_router.get_stats(),
+        "sessions": session_store.get_stats(),
+        "compaction": context_compactor.get_stats(),
+        "convergence": convergence_detector.get_stats(),
+        "identity_guard": identity_guard.get_stats(),
+        "completion_cache": get_openai_client().cache.get_stats(),
+        "llm_scheduler": get_openai_client().scheduler.get_stats(),
+        "llm_client": get_openai_client().get_stats()
+    }
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus格式的运行指标：各阶段耗时、LLM调用次数、耗时和token用量"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def require_llm_available():
+    """LLM服务熔断中时直接返回503，不再让请求逐个等待调用失败"""
+    breaker = get_openai_client().breaker
+    if breaker.state is CircuitState.OPEN:
+        raise HTTPException(
+            status_code=503,
+            detail="AI服务暂时不可用，请稍后再试",
+            headers={"Retry-After": str(math.ceil(breaker.retry_after()))}
         )
+
+
+@router.post("/chat", response_model=ChatResponse, dependencies=[Depends(require_llm_available)])
+async def chat(request: UserMessageRequest, background_tasks: BackgroundTasks, session: Session = Depends(get_session)):
+    try:
+        async with session.lock:
+            result = await _run_chat(session, request.content)
+        # 上下文压缩在响应返回后进行
+        background_tasks.add_task(context_compactor.maybe_compact, session.agent_manager)
+        return result
+    except Exception as e:
+        print(f"处理聊天请求时出错: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/chat/stream", dependencies=[Depends(require_llm_available)])
+async def chat_stream(request: UserMessageRequest, session: Session = Depends(get_session)):
+    """流式聊天：各Agent的增量输出按到达顺序交错写入同一个NDJSON流"""
+    return await _stream_events(session, lambda emit: _run_chat(session, request.content, emit))
+
+
+@router.get("/discussion/status")
+async def get_discussion_status(
+    since: int = Query(0, ge=0, description="上次读取到的序号，只返回之后的讨论消息"),
+    limit: Optional[int] = Query(None, ge=1, description="最多返回的讨论消息条数"),
+    summary_only: bool = Query(False, description="只返回按Agent和轮次的数量统计"),
+    session: Session = Depends(get_session)
+):
+    """获取当前会话的讨论状态（用于调试），用法与/context相同"""
+    global_context = session.agent_manager.global_context
+    status = {"discussion_count": len(session.agent_manager.discussion_messages)}
+    if summary_only:
+        status["counts"] = global_context.discussion_counts()
+        return status
+
+    messages, has_more = global_context.page(since, limit, discussion_only=True)
+    status.update({
+        "discussion_messages": [message.to_dict() for message in messages],
+        "cursor": messages[-1].seq if messages else max(since, global_context.next_seq - 1),
+        "has_more": has_more,
+    })
+    return status
+
+# 支持用户直接请求Agent讨论
+@timed("discussion_request")
+async def _run_discussion(session: Session, request: DiscussionRequest, emit: Optional[EventEmitter] = None,
+                          deadline: Optional[Deadline] = None) -> ChatResponse:
+    """执行一次Agent讨论，传入emit时各Agent以流式方式输出（deadline同_run_chat）"""
+    discussion_manager = session.discussion_manager
+    deadline = deadline or Deadline(settings.REQUEST_DEADLINE)
+    llm_session.set(session.session_id)
+    
+    # 直接启动讨论，无需检测
+    discussion_responses = await discussion_manager.run_discussion_cycle(
+        request.topic, 
+        strategy_type=request.strategy,
+        max_rounds=request.max_rounds,
+        emit=emit,
+        deadline=deadline
+    )
+    
+    # 转换为响应格式
+    responses = []
+    for resp in discussion_responses:
+        responses.append(AgentResponse(
+            agent_name=resp["agent_name"],
+            content=resp["content"],
+            round=resp.get("round"),
+            is_summary=resp.get("is_summary", False)
+        ))
+    
+    # 可选：添加讨论总结
+    summary = await discussion_manager.maybe_add_summary(discussion_responses, emit, deadline)
+    if summary:
+        responses.append(AgentResponse(
+            agent_name=summary["agent_name"],
+            content=summary["content"],
+            is_summary=True
+        ))
         
+    return ChatResponse(
+        responses=responses,
+        is_discussion=True,
+        timed_out_agents=deadline.timed_out_agents,
+        failed_agents=deadline.failed_agents
+    )
+
+
+@router.post("/discussion", response_model=ChatResponse, dependencies=[Depends(require_llm_available)])
+async def start_discussion(request: DiscussionRequest, background_tasks: BackgroundTasks, session: Session = Depends(get_session)):
+    """启动一个Agent讨论"""
+    try:
+        async with session.lock:
+            result = await _run_discussion(session, request)
+        # 上下文压缩在响应返回后进行
+        background_tasks.add_task(context_compactor.maybe_compact, session.agent_manager)
+        return result
     except Exception as e:
         print(f"启动讨论时出错: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/discussion/stream", dependencies=[Depends(require_llm_available)])
+async def start_discussion_stream(request: DiscussionRequest, session: Session = Depends(get_session)):
+    """流式讨论：逐段返回每轮各Agent的发言和最终总结"""
+    return await _stream_events(session, lambda emit: _run_discussion(session, request, emit))
\ No newline at end of file
@@ -0,0 +1,151 @@
+# LLM服务熔断：上游持续出错或变慢时暂停调用，快速失败
+import logging
+import time
+from collections import deque
+from enum import Enum
+from typing import Deque, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"        # 正常调用
+    OPEN = "open"            # 熔断中，所有调用立即失败
+    HALF_OPEN = "half_open"  # 熔断时间已过，放行少量探测调用
+
+
+class CircuitBreaker:
+    """按最近调用的错误率和慢调用比例决定是否熔断
+
+    - 关闭状态下记录最近window次调用的结果，样本不少于min_calls且错误率或慢调用比例超过阈值时打开
+    - 打开open_seconds秒后进入半开状态，同时最多放行half_open_calls个探测调用
+    - 半开状态下探测调用连续成功half_open_calls次后关闭，任一次失败或过慢则重新打开
+    """
+
+    def __init__(self, failure_rate: float = 0.5, slow_call_seconds: float = 30.0, slow_call_rate: float = 0.8,
+                 window: int = 20, min_calls: int = 10, open_seconds: float = 30.0, half_open_calls: int = 2):
+        """
+        Args:
+            failure_rate: 触发熔断的错误率
+            slow_call_seconds: 耗时达到该值的调用视为慢调用
+            slow_call_rate: 触发熔断的慢调用比例
+            window: 统计的最近调用次数
+            min_calls: 开始判断所需的最少调用次数
+            open_seconds: 熔断持续时间（秒），之后进入半开状态
+            half_open_calls: 半开状态下的探测调用数，也是恢复所需的连续成功次数
+        """
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window)  # (是否失败, 是否过慢)
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._probes = 0        # 半开状态下正在进行的探测调用数
+        self._probe_successes = 0
+        # 统计
+        self.opens = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state is CircuitState.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = CircuitState.HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+            logger.info("LLM熔断时间已过，进入半开状态")
+        return self._state
+
+    @property
+    def is_closed(self) -> bool:
+        """是否正常工作；非关闭状态下，可选的调用（如意图分类）应改用本地方案"""
+        return self.state is CircuitState.CLOSED
+
+    def retry_after(self) -> float:
+        """距离进入半开状态的秒数"""
+        if self.state is not CircuitState.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def allow_request(self) -> bool:
+        """是否放行一次调用；放行后必须调用record_success、record_failure、record_cancelled或release之一"""
+        state = self.state
+        if state is CircuitState.CLOSED:
+            return True
+        if state is CircuitState.HALF_OPEN and self._probes < self.half_open_calls:
+            self._probes += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self, seconds: float):
+        slow = seconds >= self.slow_call_seconds
+        if self._state is CircuitState.HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            if slow:
+                self._open()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_calls:
+                self._close()
+        elif self._state is CircuitState.CLOSED:
+            self._outcomes.append((False, slow))
+            self._evaluate()
+
+    def record_failure(self):
+        if self._state is CircuitState.HALF_OPEN:
+            self._open()
+        elif self._state is CircuitState.CLOSED:
+            self._outcomes.append((True, False))
+            self._evaluate()
+
+    def record_cancelled(self, seconds: float):
+        """放行的调用被取消；已耗时达到慢调用阈值的视为失败且过慢（上游挂起时调用只会被超时取消），否则不计入统计"""
+        if seconds < self.slow_call_seconds:
+            self.release()
+            return
+        if self._state is CircuitState.HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            self._open()
+        elif self._state is CircuitState.CLOSED:
+            self._outcomes.append((True, True))
+            self._evaluate()
+
+    def release(self):
+        """放行的调用被取消或因与服务健康无关的原因失败，不计入统计"""
+        if self._state is CircuitState.HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+
+    def _evaluate(self):
+        total = len(self._outcomes)
+        if total < self.min_calls:
+            return
+        failures = sum(1 for failed, _ in self._outcomes if failed)
+        slow = sum(1 for _, is_slow in self._outcomes if is_slow)
+        if failures / total >= self.failure_rate or slow / total >= self.slow_call_rate:
+            self._open()
+
+    def _open(self):
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.opens += 1
+        logger.warning(f"LLM调用错误率或延迟过高，熔断{self.open_seconds}秒")
+
+    def _close(self):
+        self._state = CircuitState.CLOSED
+        self._outcomes.clear()
+        logger.info("LLM探测调用成功，熔断恢复")
+
+    def get_stats(self) -> dict:
+        total = len(self._outcomes)
+        return {
+            "state": self.state.value,
+            "opens": self.opens,
+            "rejected": self.rejected,
+            "retry_after": self.retry_after(),
+            "failure_rate": sum(1 for failed, _ in self._outcomes if failed) / total if total else 0.0,
+            "slow_call_rate": sum(1 for _, slow in self._outcomes if slow) / total if total else 0.0,
+        }
@@ -0,0 +1,217 @@
+# LLM回复缓存
+import asyncio
+import hashlib
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 磁盘缓存清理过期条目的最长间隔（秒），不超过有效期
+PURGE_INTERVAL = 600.0
+
+
+class CompletionCache:
+    """按规范化请求缓存LLM回复，内存中使用LRU + TTL淘汰，可选落盘到本地SQLite
+
+    只在调用方显式开启时使用（如确定性的分类调用），创造性的Agent回复不走缓存。
+    磁盘写入由后台线程批量完成，磁盘读取通过aget在线程池中进行，都不阻塞事件循环；
+    过期条目在启动时和写入线程中定期删除。
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600, path: Optional[str] = None):
+        """
+        Args:
+            max_entries: 内存中最多保存的条目数，超出时淘汰最久未使用的条目
+            ttl_seconds: 条目有效期（秒）
+            path: 可选的SQLite文件路径，为空时只使用内存缓存
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()  # 线程池中的读取与close()互斥
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completion_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_completion_cache_created_at ON completion_cache (created_at)"
+            )
+            self._db.commit()
+            self._purge_expired(self._db)
+            self._writer = threading.Thread(target=self._write_loop, name="completion-cache-writer", daemon=True)
+            self._writer.start()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, max_tokens: int, messages: List[Dict[str, str]]) -> str:
+        """根据模型参数和规范化后的消息列表计算稳定的缓存键"""
+        normalized = [
+            {"role": msg["role"], "content": " ".join(str(msg.get("content", "")).split())}
+            for msg in messages
+        ]
+        payload = json.dumps(
+            {"model": model, "temperature": temperature, "max_tokens": max_tokens, "messages": normalized},
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，过期或不存在时返回None；会同步读取磁盘，事件循环中应使用aget"""
+        value = self._get_from_memory(key)
+        if value is None:
+            value = self._finish_lookup(key, self._load_from_disk(key))
+        return value
+
+    async def aget(self, key: str) -> Optional[str]:
+        """读取缓存，内存未命中时在线程池中读取磁盘，过期或不存在时返回None"""
+        value = self._get_from_memory(key)
+        if value is None:
+            loaded = None
+            if self._db is not None:
+                loaded = await asyncio.get_running_loop().run_in_executor(None, self._load_from_disk, key)
+            value = self._finish_lookup(key, loaded)
+        return value
+
+    def set(self, key: str, value: str):
+        """写入缓存（磁盘写入在后台线程中进行）"""
+        self._remember(key, value, time.monotonic())
+        if self._writer is not None:
+            self._queue.put((key, value, time.time()))
+
+    def flush(self):
+        """阻塞直到所有已排队的磁盘写入完成"""
+        self._queue.join()
+
+    def close(self):
+        """写完排队中的条目并关闭数据库"""
+        if self._writer is None:
+            return
+        self._queue.put(None)
+        self._writer.join()
+        self._writer = None
+        with self._db_lock:
+            self._db.close()
+            self._db = None
+
+    def _purge_expired(self, conn: sqlite3.Connection):
+        """删除磁盘上已过期的条目"""
+        try:
+            with conn:
+                deleted = conn.execute(
+                    "DELETE FROM completion_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+                ).rowcount
+            if deleted:
+                logger.info(f"清理过期的回复缓存{deleted}条")
+        except sqlite3.Error as e:
+            logger.warning(f"清理回复缓存失败: {e}")
+
+    def _write_loop(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        purge_interval = max(1.0, min(PURGE_INTERVAL, self.ttl_seconds))
+        next_purge = time.monotonic() + purge_interval
+        stopping = False
+        while not stopping:
+            try:
+                batch = [self._queue.get(timeout=max(0.0, next_purge - time.monotonic()))]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < 100:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [item for item in batch if item is not None]
+            stopping = len(rows) < len(batch)
+            try:
+                if rows:
+                    with conn:
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO completion_cache (key, value, created_at) VALUES (?, ?, ?)", rows
+                        )
+            except sqlite3.Error as e:
+                logger.warning(f"写入回复缓存失败: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if time.monotonic() >= next_purge:
+                self._purge_expired(conn)
+                next_purge = time.monotonic() + purge_interval
+        conn.close()
+
+    def _get_from_memory(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created_at, value = entry
+        if time.monotonic() - created_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def _finish_lookup(self, key: str, loaded: Optional[Tuple[str, float]]) -> Optional[str]:
+        """记录内存未命中后磁盘读取的结果"""
+        if loaded is None:
+            self.misses += 1
+            return None
+        value, age = loaded
+        # 保留磁盘条目的原始写入时间，避免重新加载后延长有效期
+        self._remember(key, value, time.monotonic() - age)
+        self.hits += 1
+        return value
+
+    def _remember(self, key: str, value: str, created_at: float):
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _load_from_disk(self, key: str) -> Optional[Tuple[str, float]]:
+        try:
+            with self._db_lock:
+                if self._db is None:
+                    return None
+                row = self._db.execute(
+                    "SELECT value, created_at FROM completion_cache WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"读取回复缓存失败: {e}")
+            return None
+        if row is None:
+            return None
+        value, created_at = row
+        age = time.time() - created_at
+        if age > self.ttl_seconds:
+            return None
+        return value, age
+
+    def get_stats(self) -> dict:
+        """返回缓存命中统计"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "persistent": self._db is not None,
+        }
@@ -0,0 +1,83 @@
+# 上下文压缩：把较早的对话折叠为滚动摘要
+import logging
+from typing import Set
+from app.utils.llm_scheduler import llm_session
+from app.utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+
+class ContextCompactor:
+    """当会话中未被摘要覆盖的消息超过阈值时，把最早的一批消息折叠进滚动摘要
+
+    在请求返回之后以后台任务运行，不增加用户请求的延迟。
+    """
+
+    def __init__(self, threshold: int = 40, batch_size: int = 20):
+        """
+        Args:
+            threshold: 未被摘要覆盖的消息数超过该值时触发压缩，为0时不压缩
+            batch_size: 每次折叠的最早消息数
+        """
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self._running: Set[int] = set()  # 正在压缩的AgentManager，避免同一会话并发压缩
+        self.compactions = 0
+        self.failures = 0
+
+    async def maybe_compact(self, agent_manager):
+        """必要时压缩会话上下文"""
+        if not self.threshold or agent_manager.uncompacted_count() <= self.threshold:
+            return
+        key = id(agent_manager)
+        if key in self._running:
+            return
+
+        self._running.add(key)
+        llm_session.set(agent_manager.session_id)
+        try:
+            await self._compact(agent_manager)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"上下文压缩失败: {e}", exc_info=True)
+        finally:
+            self._running.discard(key)
+
+    async def _compact(self, agent_manager):
+        mediator = agent_manager.get_agent("协调者")
+        if mediator is None:
+            return
+
+        previous = agent_manager.rolling_summary
+        summary_until = previous.summary_until if previous else 0
+
+        # 收集最早的一批尚未覆盖的消息（在调用LLM之前确定范围，期间新追加的消息不受影响）
+        batch = []
+        for msg in agent_manager.global_context.since(summary_until):
+            if msg.is_rolling_summary:
+                continue
+            batch.append(msg)
+            if len(batch) >= self.batch_size:
+                break
+        if not batch:
+            return
+
+        with span("rolling_summary", mediator.name):
+            summary = await mediator.generate_rolling_summary(previous.content if previous else None, batch)
+        if not summary:
+            return
+
+        # 压缩期间若已有更新的摘要写入，放弃本次结果
+        if agent_manager.rolling_summary is not previous:
+            return
+        agent_manager.add_rolling_summary(summary, batch[-1].seq)
+        self.compactions += 1
+        print(f"已将{len(batch)}条旧消息折叠进滚动摘要（覆盖至序号{batch[-1].seq}）")
+
+    def get_stats(self) -> dict:
+        return {
+            "compactions": self.compactions,
+            "failures": self.failures,
+            "threshold": self.threshold,
+            "batch_size": self.batch_size,
+        }
@@ -0,0 +1,62 @@
+# Agent视角的上下文投影：随消息追加增量维护，构建提示时无需重新扫描全局上下文
+from collections import deque
+from typing import Deque, NamedTuple, Optional
+from app.models.conversation_log import ConversationLog, Message
+from app.utils.token_budget import message_tokens
+
+
+class DiscussionLine(NamedTuple):
+    seq: Optional[int]
+    round: Optional[int]
+    line: str
+    tokens: int
+
+
+class ContextProjection:
+    """单个Agent对全局上下文的投影
+
+    - messages: 该Agent的私有上下文视图（所有用户消息和它自己的回复，引用日志中的同一条记录）
+    - discussion: 所有Agent在讨论中的发言（已格式化为"名称: 内容"）
+    - latest_user_message / rolling_summary: 最新的用户消息和滚动摘要
+
+    每条消息的token数在加入投影时计算一次；投影只保留最近max_messages条，
+    构建提示的代价只与新增消息和token预算有关，与历史总长度无关。
+    """
+
+    def __init__(self, agent_name: str, max_messages: int = 200):
+        self.agent_name = agent_name
+        self.max_messages = max_messages
+        self.source: Optional[ConversationLog] = None
+        self.messages: Deque[Message] = deque(maxlen=max_messages)
+        self.discussion: Deque[DiscussionLine] = deque(maxlen=max_messages)
+        self.latest_user_message: Optional[Message] = None
+        self.rolling_summary: Optional[Message] = None
+
+    def rebuild(self, global_context: ConversationLog):
+        """绑定到新的全局上下文并从头构建投影（仅在创建或恢复会话时调用）"""
+        self.source = global_context
+        self.messages.clear()
+        self.discussion.clear()
+        self.latest_user_message = None
+        self.rolling_summary = None
+        for msg in global_context:
+            self.observe(msg)
+
+    def observe(self, msg: Message):
+        """处理一条新追加到全局上下文的消息"""
+        if msg.is_rolling_summary:
+            self.rolling_summary = msg
+        elif msg.role == "user":
+            self.latest_user_message = msg
+            self.messages.append(msg)
+        elif msg.role == "assistant" and msg.name is not None:
+            if msg.name == self.agent_name:
+                self.messages.append(msg)
+            if msg.is_discussion:
+                line = f"{msg.name}: {msg.content}"
+                self.discussion.append(DiscussionLine(msg.seq, msg.discussion_round, line, message_tokens(line)))
+
+    @property
+    def summary_until(self) -> int:
+        """滚动摘要覆盖到的最后一条消息的序号"""
+        return self.rolling_summary.summary_until if self.rolling_summary else 0
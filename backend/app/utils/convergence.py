@@ -0,0 +1,68 @@
+# 讨论收敛检测：相邻两轮发言内容高度相似时提前结束讨论
+from functools import lru_cache
+from typing import FrozenSet, List
+
+
+@lru_cache(maxsize=4096)
+def shingles(text: str, size: int = 3) -> FrozenSet[str]:
+    """文本的字符shingle集合（忽略标点和空白）"""
+    normalized = "".join(ch.lower() for ch in text if ch.isalnum())
+    if len(normalized) <= size:
+        return frozenset([normalized]) if normalized else frozenset()
+    return frozenset(normalized[i:i + size] for i in range(len(normalized) - size + 1))
+
+
+class ConvergenceDetector:
+    """比较相邻两轮讨论的发言（shingle集合的Jaccard相似度），达到阈值即视为已收敛
+
+    检测完全在本地进行；同时统计提前结束节省的轮数和估计节省的token数，用于调优阈值。
+    """
+
+    def __init__(self, threshold: float = 0.6, shingle_size: int = 3):
+        """
+        Args:
+            threshold: 相邻两轮相似度达到该值时结束讨论，为0时不检测
+            shingle_size: shingle的字符长度
+        """
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.early_stops = 0
+        self.rounds_saved = 0
+        self.tokens_saved = 0
+
+    def similarity(self, previous: List[str], current: List[str]) -> float:
+        """两轮发言的Jaccard相似度"""
+        previous_set = frozenset().union(*(shingles(text, self.shingle_size) for text in previous))
+        current_set = frozenset().union(*(shingles(text, self.shingle_size) for text in current))
+        if not previous_set or not current_set:
+            return 0.0
+        return len(previous_set & current_set) / len(previous_set | current_set)
+
+    def has_converged(self, previous: List[str], current: List[str]) -> bool:
+        """当前一轮相对上一轮是否已没有足够的新内容"""
+        if not self.threshold or not previous or not current:
+            return False
+        similarity = self.similarity(previous, current)
+        print(f"相邻两轮讨论相似度: {similarity:.2f}（阈值{self.threshold}）")
+        return similarity >= self.threshold
+
+    def record_early_stop(self, rounds_saved: int, tokens_per_round: int):
+        """记录一次提前结束
+
+        Args:
+            rounds_saved: 相比最大轮数少进行的轮数
+            tokens_per_round: 已进行轮次平均每轮生成的token数，用于估计节省的token
+        """
+        if rounds_saved <= 0:
+            return
+        self.early_stops += 1
+        self.rounds_saved += rounds_saved
+        self.tokens_saved += rounds_saved * tokens_per_round
+
+    def get_stats(self) -> dict:
+        return {
+            "early_stops": self.early_stops,
+            "rounds_saved": self.rounds_saved,
+            "tokens_saved": self.tokens_saved,
+            "threshold": self.threshold,
+        }
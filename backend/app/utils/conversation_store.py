@@ -0,0 +1,122 @@
+# 对话持久化：基于SQLite（WAL模式）的追加写日志
+import json
+import logging
+import queue
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# 全局上下文在存储中的作用域名（Agent私有上下文是全局上下文的视图，不单独存储）
+GLOBAL_SCOPE = "global"
+# 滚动摘要的作用域名
+SUMMARY_SCOPE = "summary"
+
+
+class ConversationStore:
+    """把会话中的每条消息追加写入SQLite
+
+    写入在后台线程中按批次合并为一个事务，不阻塞事件循环；
+    读取只加载会话最近的若干条消息，用于会话的懒加载恢复。
+    """
+
+    def __init__(self, path: str, batch_size: int = 100):
+        """
+        Args:
+            path: SQLite数据库文件路径
+            batch_size: 单个事务最多写入的消息数
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        # 每个会话已排队、尚未写入的消息数；读取时只有该会话有待写入的消息才需要等待
+        self._pending: Counter = Counter()
+        self._pending_lock = threading.Lock()
+
+        self._reader = sqlite3.connect(path, check_same_thread=False)
+        self._reader.execute("PRAGMA journal_mode=WAL")
+        self._reader.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "session_id TEXT NOT NULL, "
+            "scope TEXT NOT NULL, "
+            "data TEXT NOT NULL)"
+        )
+        self._reader.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_session_scope ON messages (session_id, scope, id)"
+        )
+        self._reader.commit()
+        self._read_lock = threading.Lock()
+
+        self._writer = threading.Thread(target=self._write_loop, name="conversation-store-writer", daemon=True)
+        self._writer.start()
+
+    def append(self, session_id: str, scope: str, message: Dict[str, Any]):
+        """追加一条消息（异步批量写入）"""
+        if self._closed:
+            return
+        with self._pending_lock:
+            self._pending[session_id] += 1
+        self._queue.put((session_id, scope, json.dumps(message, ensure_ascii=False)))
+
+    def load_tail(self, session_id: str, scope: str, limit: int) -> List[Dict[str, Any]]:
+        """读取某个作用域最近的limit条消息，按写入顺序返回（同步读取，在事件循环中应放到线程池执行）"""
+        # 刚被淘汰又重新访问的会话可能还有排队中的写入，等它们落盘后再读
+        with self._pending_lock:
+            has_pending = self._pending[session_id] > 0
+        if has_pending:
+            self.flush()
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT data FROM messages WHERE session_id = ? AND scope = ? ORDER BY id DESC LIMIT ?",
+                (session_id, scope, limit)
+            ).fetchall()
+        return [json.loads(data) for (data,) in reversed(rows)]
+
+    def flush(self):
+        """阻塞直到所有已排队的消息写入完成"""
+        self._queue.join()
+
+    def close(self):
+        """写完剩余消息并关闭数据库"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        self._reader.close()
+
+    def _write_loop(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [item for item in batch if item is not None]
+            stopping = len(rows) < len(batch)
+            try:
+                if rows:
+                    with conn:
+                        conn.executemany(
+                            "INSERT INTO messages (session_id, scope, data) VALUES (?, ?, ?)", rows
+                        )
+            except sqlite3.Error as e:
+                logger.error(f"写入对话记录失败: {e}", exc_info=True)
+            finally:
+                with self._pending_lock:
+                    for session_id, _, _ in rows:
+                        self._pending[session_id] -= 1
+                        if not self._pending[session_id]:
+                            del self._pending[session_id]
+                for _ in batch:
+                    self._queue.task_done()
+        conn.close()
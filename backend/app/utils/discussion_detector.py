@@ -1,74 +1,29 @@
 import json
 import re
+from typing import List
+from app.core.config import settings
 from app.utils.openai_client import OpenAIClient
+from app.utils.keyword_matcher import KeywordMatcher
+from app.utils.metrics import timed
+from app.utils.local_router import LocalIntentRouter, DISCUSSION_KEYWORDS, REJECT_KEYWORDS
+
+# 退化方案使用的关键词自动机
+_FALLBACK_MATCHER = KeywordMatcher({"discussion": DISCUSSION_KEYWORDS, "reject": REJECT_KEYWORDS})
 
 class DiscussionDetector:
-    def __init__(self, openai_client=None):
+    def __init__(self, openai_client=None, local_router: LocalIntentRouter = None):
         self.openai_client = openai_client
+        self.local_router = local_router or LocalIntentRouter(settings.LOCAL_ROUTER_CONFIDENCE_THRESHOLD)
     
-    async def detect_discussion_needed(self, user_input: str) -> dict:
-        """判断用户输入是否需要Agent间讨论"""
-        
-        if self.openai_client:
-            prompt = f"""
-        请仔细分析以下用户输入，判断用户意图并评估话题复杂性。
-
-    用户输入: "{user_input}"
-
-    可能的AI助手角色: ["顾问", "批评者", "创新者", "协调者"]
-
-    请分析:
-    1. 用户是否希望AI助手之间进行讨论?
-    2. 用户是否明确指定了特定角色回答?
-    3. 如果指定了特定角色，是哪个角色?
-    4. 话题的复杂性程度（影响讨论轮数）
-
-    对于复杂性评估，请考虑:
-    - 话题是否有争议性/多角度
-    - 是否需要深入探讨
-    - 是否涉及多领域知识
-    - 是否需要辩证思考
-
-    基于复杂性，建议讨论轮数:
-    - 简单话题: 2轮
-    - 中等复杂: 3轮
-    - 较复杂话题: 4轮
-    - 非常复杂: 5轮（最大值）
-
-    请以JSON格式返回分析结果:
-    {{
-    "needs_discussion": true/false,       // 是否需要讨论
-    "specified_agents": ["角色名"],        // 指定回答角色
-    "excluded_agents": ["角色名"],         // 排除角色
-    "topic_complexity": "简单/中等/较复杂/非常复杂", // 话题复杂性评估
-    "suggested_rounds": 2-5,              // 建议讨论轮数(2-5)
-    "confidence": 0.1-1.0,                // 判断置信度
-    "reason": "简要解释判断理由",          // 判断理由
-    "extract_topic": true/false           // 是否需要提取主题
-    }}
-    """
-            try:
-                response = await self.openai_client.generate_completion([
-                    {"role": "system", "content": "你是一个专门分析用户意图的助手，只返回JSON格式回复，不要有其他内容。"},
-                    {"role": "user", "content": prompt}
-                ])
-                
-                import json
-                import re
-                
-                json_match = re.search(r'\{.*\}', response, re.DOTALL)
-                if json_match:
-                    result = json.loads(json_match.group(0))
-                    return result
-                    
-            except Exception as e:
-                print(f"AI判断讨论需求失败: {e}")
-        
-        # 退化方案：简单的关键词检测（仅在AI分析失败时使用）
-        discussion_keywords = ["讨论", "商量", "你们商量", "你们讨论", "内部沟通"]
-        reject_keywords = ["不要讨论", "不需要讨论", "无需讨论", "直接回答"]
+    def _llm_available(self) -> bool:
+        """有AI客户端且服务未熔断；熔断期间直接使用本地关键词方案，不再等待调用失败"""
+        return self.openai_client is not None and self.openai_client.breaker.is_closed
+    
+    def _keyword_detect(self, user_input: str) -> dict:
+        """简单的关键词检测，作为AI路由分析不可用或失败时的退化方案"""
+        labels = _FALLBACK_MATCHER.match_labels(user_input)
         
-        if any(keyword in user_input for keyword in reject_keywords):
+        if "reject" in labels:
             return {
                 "needs_discussion": False,
                 "confidence": 0.7,
@@ -76,7 +31,7 @@ class DiscussionDetector:
                 "suggested_rounds": 0
             }
         
-        if any(keyword in user_input for keyword in discussion_keywords):
+        if "discussion" in labels:
             return {
                 "needs_discussion": True,
                 "confidence": 0.7,
@@ -92,34 +47,102 @@ class DiscussionDetector:
             "suggested_rounds": 0
         }
     
-    # 主题提取
-    async def extract_discussion_topic(self, user_input: str) -> str:
-        """从用户输入中提取真正的讨论主题"""
-        if not self.openai_client:
-            # 如果没有AI客户端，简单处理：移除常见的讨论请求词
-            remove_patterns = [
-                "请讨论", "你们讨论", "讨论一下", "商量一下", 
-                "一起分析", "达成共识"
-            ]
-            topic = user_input
-            for pattern in remove_patterns:
-                topic = topic.replace(pattern, "")
-            return topic.strip()
+    def _strip_discussion_words(self, user_input: str) -> str:
+        """移除常见的讨论请求词，得到粗略的讨论主题"""
+        remove_patterns = [
+            "请讨论", "你们讨论", "讨论一下", "商量一下", 
+            "一起分析", "达成共识"
+        ]
+        topic = user_input
+        for pattern in remove_patterns:
+            topic = topic.replace(pattern, "")
+        return topic.strip()
+    
+    # 合并的路由分析
+    @timed("route")
+    async def analyze_request(self, user_input: str, available_agents: List[str]) -> dict:
+        """用一次AI调用同时完成讨论判断、主题提取和发言意图分析
         
-        prompt = f"""
-    提取以下用户输入中的真正讨论主题，忽略讨论指令部分。
+        Args:
+            user_input: 用户输入
+            available_agents: 可用的Agent名称列表
+            
+        Returns:
+            dict: 合并后的路由结果，包含needs_discussion、topic、suggested_rounds、
+                  specified_agents、should_speak、should_not_speak等字段
+        """
+        # 高置信度的情况由本地路由直接决定，无需网络调用
+        local_result = self.local_router.try_route(user_input, available_agents)
+        if local_result is not None:
+            if local_result["needs_discussion"]:
+                local_result["topic"] = self._strip_discussion_words(user_input) or user_input
+            return self._normalize_route(local_result, user_input, available_agents)
+        
+        if self._llm_available():
+            prompt = f"""
+        请仔细分析以下用户输入，一次性完成路由判断。
 
     用户输入: "{user_input}"
 
-    例如，如果输入是"请大家讨论一下气候变化的影响"，应该提取的主题是"气候变化的影响"。
-    请直接返回提取的主题，无需其他解释。
+    可用的AI助手角色: {json.dumps(available_agents, ensure_ascii=False)}
+    每个助手的职责:
+    - 顾问：提供建议和支持性反馈
+    - 批评者：提供批判性思考和指出潜在问题
+    - 创新者：提供创新性解决方案和新颖视角
+    - 协调者：总结其他Agent观点并寻找共识
+
+    请分析:
+    1. 用户是否希望AI助手之间进行讨论?
+    2. 如果需要讨论，真正的讨论主题是什么（忽略"请大家讨论一下"之类的指令部分）?
+    3. 话题的复杂性程度，并据此建议讨论轮数:
+       简单话题2轮，中等复杂3轮，较复杂4轮，非常复杂5轮（最大值）
+    4. 用户希望哪些助手回复、哪些助手不要回复:
+       - "只有X"表示只允许X回复，其他所有助手都不应回复
+       - "X不要说话"表示X明确不应回复
+       - 如果不确定，两个列表都返回空
+
+    请以JSON格式返回分析结果:
+    {{
+    "needs_discussion": true/false,       // 是否需要讨论
+    "topic": "提取的讨论主题",             // 不需要讨论时返回原始输入
+    "topic_complexity": "简单/中等/较复杂/非常复杂", // 话题复杂性评估
+    "suggested_rounds": 2-5,              // 建议讨论轮数(2-5)，不需要讨论时为0
+    "specified_agents": ["角色名"],        // 用户明确指定回答的角色
+    "should_speak": ["角色名"],            // 应该回复的角色
+    "should_not_speak": ["角色名"],        // 不应回复的角色
+    "confidence": 0.1-1.0,                // 判断置信度
+    "reason": "简要解释判断理由"           // 判断理由
+    }}
     """
+            try:
+                response = await self.openai_client.generate_completion([
+                    {"role": "system", "content": "你是一个专门分析用户意图并进行路由的助手，只返回JSON格式回复，不要有其他内容。"},
+                    {"role": "user", "content": prompt}
+                ], use_cache=True)
+                
+                json_match = re.search(r'\{.*\}', response, re.DOTALL)
+                if json_match:
+                    return self._normalize_route(json.loads(json_match.group(0)), user_input, available_agents)
+                    
+            except Exception as e:
+                print(f"AI路由分析失败: {e}")
+        
+        # 退化方案：关键词检测 + 本地主题提取
+        result = self._keyword_detect(user_input)
+        if result["needs_discussion"]:
+            result["topic"] = self._strip_discussion_words(user_input) or user_input
+        return self._normalize_route(result, user_input, available_agents)
+    
+    def _normalize_route(self, result: dict, user_input: str, available_agents: List[str]) -> dict:
+        """补全路由结果中的缺省字段，并过滤掉不存在的Agent名称"""
+        for key in ("specified_agents", "should_speak", "should_not_speak"):
+            names = result.get(key) or []
+            result[key] = [name for name in names if name in available_agents]
+        result["needs_discussion"] = bool(result.get("needs_discussion", False))
+        result["topic"] = (result.get("topic") or "").strip() or user_input
         try:
-            topic = await self.openai_client.generate_completion([
-                {"role": "system", "content": "你是一个专门提取讨论主题的助手，只返回提取的主题，不要有其他内容。"},
-                {"role": "user", "content": prompt}
-            ])
-            return topic.strip()
-        except Exception as e:
-            print(f"提取讨论主题失败: {e}")
-            return user_input
\ No newline at end of file
+            rounds = int(result.get("suggested_rounds") or 3)
+        except (TypeError, ValueError):
+            rounds = 3
+        result["suggested_rounds"] = max(2, min(rounds, 5)) if result["needs_discussion"] else 0
+        return result
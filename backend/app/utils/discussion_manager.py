@@ -1,29 +1,41 @@
 import asyncio
 from typing import List, Dict, Any, Optional
-from app.utils.discussion_strategies import DiscussionStrategy, DiscussionStrategyFactory
+from app.utils.discussion_strategies import DiscussionStrategyFactory
+from app.utils.convergence import ConvergenceDetector
+from app.utils.fan_out import Deadline, fan_out
+from app.utils.stream_events import EventEmitter, make_token_callback, emit_message
+from app.utils.metrics import span
+from app.core.config import settings
 
 class DiscussionManager:
     """讨论管理器：负责执行和管理Agent之间的讨论流程"""
     
-    def __init__(self, agent_manager):
+    def __init__(self, agent_manager, convergence: Optional[ConvergenceDetector] = None):
         """初始化讨论管理器
         
         Args:
             agent_manager: Agent管理器实例，用于访问agents和上下文
+            convergence: 可选的收敛检测器（可在会话间共享），讨论收敛时提前结束
         """
         self.agent_manager = agent_manager
+        self.convergence = convergence
     
-    async def run_discussion_cycle(self, user_input: str, strategy_type: str = DiscussionStrategy.ROUNDTABLE.value, max_rounds: int = 3):
+    async def run_discussion_cycle(self, user_input: str, strategy_type: Optional[str] = None, max_rounds: int = 3,
+                                   emit: Optional[EventEmitter] = None, deadline: Optional[Deadline] = None):
         """执行一个完整的讨论周期
         
         Args:
             user_input: 用户输入，将作为讨论的主题
-            strategy_type: 讨论策略类型
+            strategy_type: 讨论策略类型，为None时使用配置中的默认策略
             max_rounds: 最大讨论轮数
+            emit: 可选的事件回调，传入时各Agent以流式方式输出
+            deadline: 请求的截止时间，超时的Agent被取消并记录在其中；被调用方取消后不再提交新的回应
             
         Returns:
-            List[Dict]: 所有回复的列表，包含讨论中所有Agent的发言
+            List[Dict]: 所有回复的列表，包含讨论中所有Agent的发言（只含按时完成的发言）
         """
+        strategy_type = strategy_type or settings.DISCUSSION_STRATEGY
+        
         # 将用户输入添加到上下文
         self.agent_manager.add_user_message(user_input)
         
@@ -33,63 +45,38 @@ class DiscussionManager:
         strategy = DiscussionStrategyFactory.create_strategy(
             strategy_type, 
             self.agent_manager.agents,
-            max_rounds=max_rounds
+            max_rounds=max_rounds,
+            convergence=self.convergence
         )
         
         all_responses = []
-        discussion_ended = False
         
-        # 执行多轮讨论
-        while not discussion_ended:
-            # 执行一轮讨论
-            round_responses, discussion_ended = await strategy.next_round(
-                self.agent_manager.global_context
-            )
+        async def commit(response: Dict):
+            """把一条回应添加到全局上下文（Agent私有视图随之更新）并推送"""
+            if deadline is not None and deadline.cancelled:
+                return  # 讨论已被打断（如用户插话），取消生效前完成的回应也不再提交
+            agent = self.agent_manager.get_agent(response["agent_name"])
+            if agent:
+                self.agent_manager.add_agent_message(agent, response["content"], round_num=response["round"])
             
-            if not round_responses:
-                print("本轮无Agent回应，讨论结束")
-                break
-                
-            print(f"第{strategy.current_round}轮讨论收到{len(round_responses)}个回应")
-                
-            # 将本轮回应添加到全局上下文和Agent私有上下文
-            for response in round_responses:
-                agent_name = response["agent_name"]
-                content = response["content"]
-                round_num = response["round"]
-                
-                # 添加到全局上下文
-                self.agent_manager.global_context.append({
-                    "role": "assistant",
-                    "name": agent_name,
-                    "agent_role": agent_name,
-                    "content": content,
-                    "is_discussion": True,  # 标记这是讨论中的回应
-                    "discussion_round": round_num
-                })
-                
-                # 添加到相应Agent的私有上下文
-                for agent in self.agent_manager.agents:
-                    if agent.name == agent_name:
-                        agent.add_to_private_context({
-                            "role": "assistant",
-                            "agent_role": agent_name,
-                            "content": content,
-                            "is_discussion": True,
-                            "discussion_round": round_num
-                        })
-                
-                # 添加到返回的响应列表
-                all_responses.append(response)
+            # 添加到返回的响应列表
+            all_responses.append(response)
+            await emit_message(emit, response["agent_name"], response["content"], response["round"])
+        
+        # 执行多轮讨论，由策略决定何时提交各条回应
+        await strategy.run(self.agent_manager.global_context, commit, emit, deadline)
         
         print(f"讨论结束，共产生{len(all_responses)}个回应")
         return all_responses
     
-    async def maybe_add_summary(self, discussion_responses: List[Dict]) -> Optional[Dict]:
+    async def maybe_add_summary(self, discussion_responses: List[Dict], emit: Optional[EventEmitter] = None,
+                                deadline: Optional[Deadline] = None) -> Optional[Dict]:
         """可选：在讨论结束后添加总结
         
         Args:
             discussion_responses: 讨论中的所有回应
+            emit: 可选的事件回调，传入时以流式方式输出总结
+            deadline: 请求的截止时间，总结超时时放弃总结并记录在其中
             
         Returns:
             Dict|None: 总结回应，如果不需要总结则返回None
@@ -100,30 +87,23 @@ class DiscussionManager:
             if agent.name == "协调者":
                 # 由协调者生成总结
                 try:
-                    summary = await agent.generate_discussion_summary(
-                        self.agent_manager.global_context,
-                        discussion_responses
-                    )
+                    with span("discussion_summary", agent.name):
+                        result = await fan_out(
+                            [(agent.name, agent.generate_discussion_summary(
+                                self.agent_manager.global_context,
+                                discussion_responses,
+                                on_token=make_token_callback(emit, agent.name, is_summary=True)
+                            ))],
+                            agent_timeout=settings.AGENT_RESPONSE_TIMEOUT,
+                            deadline=deadline
+                        )
+                    summary = result.results[0][1] if result.results else None
                     
                     if summary:
-                        # 添加到全局上下文
-                        self.agent_manager.global_context.append({
-                            "role": "assistant",
-                            "name": agent.name,
-                            "agent_role": agent.name,
-                            "content": summary,
-                            "is_discussion": True,
-                            "is_summary": True
-                        })
+                        # 添加到全局上下文和Agent私有上下文
+                        self.agent_manager.add_agent_message(agent, summary, is_summary=True)
                         
-                        # 添加到Agent私有上下文
-                        agent.add_to_private_context({
-                            "role": "assistant",
-                            "agent_role": agent.name,
-                            "content": summary,
-                            "is_discussion": True,
-                            "is_summary": True
-                        })
+                        await emit_message(emit, agent.name, summary, is_summary=True)
                         
                         return {
                             "agent_name": agent.name,
@@ -1,9 +1,22 @@
 from enum import Enum
-from typing import List, Dict, Any, Tuple
+from collections import defaultdict
+from typing import List, Dict, Any, Tuple, Callable, Awaitable, Optional
 import asyncio
+import math
+import time
+from app.utils.stream_events import make_token_callback
+from app.utils.convergence import ConvergenceDetector
+from app.utils.fan_out import Deadline, fan_out, run_with_timeout
+from app.utils.token_budget import count_tokens
+from app.utils.metrics import span, stage_seconds
+from app.core.config import settings
+
+# 提交一条讨论回应（写入上下文并推送给前端）的回调
+CommitCallback = Callable[[Dict], Awaitable[None]]
 
 class DiscussionStrategy(Enum):
     ROUNDTABLE = "roundtable"  # 轮询式讨论
+    PIPELINED = "pipelined"    # 流水线式讨论
     # 未来可扩展更多策略
     # DEBATE = "debate"        # 辩论式讨论
     # COLLABORATIVE = "collaborative"  # 协作式讨论
@@ -11,21 +24,55 @@ class DiscussionStrategy(Enum):
 class DiscussionStrategyFactory:
     @staticmethod
     def create_strategy(strategy_type: str, agents, **kwargs):
+        kwargs.setdefault("agent_timeout", settings.AGENT_RESPONSE_TIMEOUT)
         if strategy_type == DiscussionStrategy.ROUNDTABLE.value:
             return RoundtableDiscussionStrategy(agents, **kwargs)
+        if strategy_type == DiscussionStrategy.PIPELINED.value:
+            kwargs.setdefault("quorum", settings.DISCUSSION_PIPELINE_QUORUM)
+            return PipelinedDiscussionStrategy(agents, **kwargs)
         # 未来添加其他策略
         raise ValueError(f"未支持的讨论策略: {strategy_type}")
 
 class RoundtableDiscussionStrategy:
     """轮询式讨论策略：每个Agent在每轮中至多发言一次"""
     
-    def __init__(self, agents, max_rounds=3):
+    def __init__(self, agents, max_rounds=3, convergence: Optional[ConvergenceDetector] = None,
+                 agent_timeout: Optional[float] = None):
         self.agents = agents
         self.max_rounds = max_rounds
+        self.convergence = convergence  # 可选的收敛检测，相邻两轮高度相似时提前结束
+        self.agent_timeout = agent_timeout  # 单个Agent每次发言的超时时间
         self.current_round = 0
     
-    async def next_round(self, global_context) -> Tuple[List[Dict], bool]:
-        """执行下一轮讨论，返回回复列表和讨论是否结束"""
+    async def run(self, global_context, commit: CommitCallback, emit=None, deadline: Optional[Deadline] = None):
+        """执行整个讨论：逐轮进行，每轮所有回应完成后再依次提交"""
+        previous_texts: List[str] = []
+        all_texts: List[str] = []
+        discussion_ended = False
+        while not discussion_ended:
+            round_responses, discussion_ended = await self.next_round(global_context, emit, deadline)
+            
+            if not round_responses:
+                print("本轮无Agent回应，讨论结束")
+                break
+            
+            print(f"第{self.current_round}轮讨论收到{len(round_responses)}个回应")
+            for response in round_responses:
+                await commit(response)
+            
+            current_texts = [response["content"] for response in round_responses]
+            all_texts.extend(current_texts)
+            if not discussion_ended and self.convergence and self.convergence.has_converged(previous_texts, current_texts):
+                print(f"第{self.current_round}轮与上一轮内容高度相似，讨论提前结束")
+                _record_early_stop(self.convergence, self.current_round, self.max_rounds, all_texts)
+                break
+            previous_texts = current_texts
+    
+    async def next_round(self, global_context, emit=None, deadline: Optional[Deadline] = None) -> Tuple[List[Dict], bool]:
+        """执行下一轮讨论，返回回复列表和讨论是否结束；传入emit时各Agent以流式方式输出
+
+        超时或失败的Agent视为本轮未发言，本轮只保留按时完成的回复；到达请求截止时间后讨论结束。
+        """
         self.current_round += 1
         if self.current_round > self.max_rounds:
             return [], True  # 返回空回复列表和讨论结束标志
@@ -37,38 +84,183 @@ class RoundtableDiscussionStrategy:
         has_response = False
         
         # 收集所有应回应的Agent的任务
-        tasks = []
+        jobs = []
         for agent in self.agents:
             if await agent.should_respond_in_discussion(global_context, self.current_round):
-                task = self._get_agent_response(agent, global_context)
-                tasks.append(task)
+                jobs.append((agent.name, self._get_agent_response(agent, global_context, emit)))
         
         # 并行等待所有回应
-        if tasks:
-            agent_responses = await asyncio.gather(*tasks)
-            responses = [r for r in agent_responses if r]
+        if jobs:
+            with span("discussion_round"):
+                result = await fan_out(jobs, self.agent_timeout, deadline)
+            responses = [response for _, response in result.results]
             has_response = len(responses) > 0
         
-        # 如果没有任何Agent回应，或者已达到最大轮次，结束讨论
-        discussion_ended = (not has_response) or (self.current_round >= self.max_rounds)
+        # 如果没有任何Agent回应，已达到最大轮次，或已到请求截止时间，结束讨论
+        out_of_time = deadline is not None and deadline.remaining() == 0
+        discussion_ended = (not has_response) or (self.current_round >= self.max_rounds) or out_of_time
         
         if discussion_ended:
             print(f"讨论结束，总共进行了{self.current_round}轮")
         
         return responses, discussion_ended
     
-    async def _get_agent_response(self, agent, global_context):
+    async def _get_agent_response(self, agent, global_context, emit=None):
         """获取单个Agent在讨论中的回应"""
+        return await get_discussion_response(agent, global_context, self.current_round, emit)
+
+
+class PipelinedDiscussionStrategy:
+    """流水线式讨论策略：每个Agent独立推进自己的轮次，不等待本轮最慢的Agent
+    
+    Agent的回应生成后立即提交到上下文；上一轮已有quorum条回应（或上一轮所有Agent都已结束）时，
+    Agent即可开始下一轮，此时它能看到所有已提交的发言。各Agent之间最多相差一轮。每条回应仍标记所属轮次，
+    某一轮所有Agent都没有发言时讨论结束，轮数不超过max_rounds。
+    """
+    
+    def __init__(self, agents, max_rounds=3, quorum: float = 0.5, convergence: Optional[ConvergenceDetector] = None,
+                 agent_timeout: Optional[float] = None):
+        """
+        Args:
+            agents: 参与讨论的Agent
+            max_rounds: 最大讨论轮数
+            quorum: 开始下一轮前，上一轮至少需要的回应数占Agent数的比例
+            convergence: 可选的收敛检测，某一轮结束时与上一轮高度相似则不再开始新的轮次
+            agent_timeout: 单个Agent每次发言的超时时间，超时的发言被取消并视为未发言
+        """
+        self.agents = agents
+        self.max_rounds = max_rounds
+        self.quorum = max(1, math.ceil(len(agents) * quorum))
+        self.current_round = 0  # 已开始的最大轮次
+        self._finished = defaultdict(int)   # 每轮已结束（发言或放弃）的Agent数
+        self._responded = defaultdict(int)  # 每轮已提交的回应数
+        self._round_texts = defaultdict(list)  # 每轮已提交的回应内容
+        self.convergence = convergence
+        self._converged_round: Optional[int] = None  # 检测到收敛的轮次
+        self.agent_timeout = agent_timeout
+        self._generating = set()  # 正在生成回应的Agent
+        self._round_started: Dict[int, float] = {}  # 每轮第一个Agent开始的时间，用于统计每轮耗时
+        self._deadline: Optional[Deadline] = None
+        self._progress: Optional[asyncio.Condition] = None
+        self._stopped = False  # run()结束后置位，此后各Agent不再开始新的轮次或提交回应
+    
+    async def run(self, global_context, commit: CommitCallback, emit=None, deadline: Optional[Deadline] = None):
+        """执行整个讨论：每个Agent一个协程，各自按轮次推进；到达请求截止时间时取消仍在进行的发言"""
+        self._progress = asyncio.Condition()
+        self._deadline = deadline
+        tasks = [
+            asyncio.create_task(self._agent_loop(agent, global_context, commit, emit))
+            for agent in self.agents
+        ]
         try:
-            response_content = await agent.generate_discussion_response(global_context, self.current_round)
-            if not response_content:
-                return None
-                
-            return {
-                "agent_name": agent.name,
-                "content": response_content,
-                "round": self.current_round
-            }
-        except Exception as e:
-            print(f"获取Agent {agent.name}在讨论中的回应失败: {e}")
-            return None
\ No newline at end of file
+            _, pending = await asyncio.wait(tasks, timeout=deadline.remaining() if deadline else None)
+            if pending:
+                print(f"讨论到达截止时间，取消正在发言的Agent: {sorted(self._generating)}")
+                for agent_name in self._generating:
+                    deadline.record_timeout(agent_name)
+        finally:
+            # 请求被取消时不留下仍在运行的Agent，并等待它们真正结束：
+            # wait_for可能在内部调用恰好完成时丢失取消，只取消不等待的话，Agent会在返回后继续提交
+            self._stopped = True
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if self._converged_round is not None:
+            print(f"第{self._converged_round}轮与上一轮内容高度相似，讨论提前结束")
+            all_texts = [text for texts in self._round_texts.values() for text in texts]
+            _record_early_stop(self.convergence, self.current_round, self.max_rounds, all_texts)
+        print(f"讨论结束，总共进行了{self.current_round}轮")
+    
+    def _can_start(self, round_num: int) -> bool:
+        """是否可以开始round_num轮：上一轮已有足够的回应，且再上一轮所有Agent都已结束
+        
+        后一个条件把各Agent之间的差距限制在一轮以内，收敛检测结果能及时阻止新的轮次。
+        """
+        if self._converged_round is not None:
+            return True
+        previous = round_num - 1
+        if round_num > 2 and self._finished[previous - 1] < len(self.agents):
+            return False
+        return self._responded[previous] >= self.quorum or self._finished[previous] >= len(self.agents)
+    
+    async def _agent_loop(self, agent, global_context, commit: CommitCallback, emit=None):
+        for round_num in range(1, self.max_rounds + 1):
+            if round_num > 1:
+                async with self._progress:
+                    await self._progress.wait_for(lambda: self._can_start(round_num))
+                if self._converged_round is not None and round_num > self._converged_round:
+                    return  # 讨论已收敛，不再开始新的轮次
+                if self._responded[round_num - 1] == 0:
+                    return  # 上一轮所有Agent都没有发言，讨论结束
+            if self._stopped:
+                return  # 讨论已结束（被取消或到达截止时间），不再开始新的轮次
+            
+            if round_num > self.current_round:
+                self.current_round = round_num
+                self._round_started[round_num] = time.perf_counter()
+                print(f"开始执行第{round_num}轮讨论...")
+            
+            response = None
+            if await agent.should_respond_in_discussion(global_context, round_num):
+                self._generating.add(agent.name)
+                try:
+                    response = await run_with_timeout(
+                        get_discussion_response(agent, global_context, round_num, emit),
+                        self.agent_timeout
+                    )
+                except asyncio.TimeoutError:
+                    print(f"Agent {agent.name}第{round_num}轮发言超时，已取消")
+                    if self._deadline:
+                        self._deadline.record_timeout(agent.name)
+                except Exception as e:
+                    # 视为本轮未发言，其他Agent照常推进
+                    print(f"获取Agent {agent.name}第{round_num}轮的回应失败: {e}")
+                    if self._deadline:
+                        self._deadline.record_failure(agent.name)
+                finally:
+                    self._generating.discard(agent.name)
+            if self._stopped:
+                return  # 生成期间讨论已结束，不再提交
+            if response:
+                self._round_texts[round_num].append(response["content"])
+                await commit(response)
+            
+            async with self._progress:
+                self._finished[round_num] += 1
+                if response:
+                    self._responded[round_num] += 1
+                if self._finished[round_num] == len(self.agents):
+                    stage_seconds.observe(time.perf_counter() - self._round_started[round_num], stage="discussion_round")
+                    self._check_convergence(round_num)
+                self._progress.notify_all()
+    
+    def _check_convergence(self, round_num: int):
+        """某一轮所有Agent都结束后，与上一轮比较是否已收敛"""
+        if not self.convergence or self._converged_round is not None or round_num >= self.max_rounds:
+            return
+        if self.convergence.has_converged(self._round_texts[round_num - 1], self._round_texts[round_num]):
+            self._converged_round = round_num
+
+
+def _record_early_stop(convergence: ConvergenceDetector, rounds_run: int, max_rounds: int, texts: List[str]):
+    """记录因收敛提前结束节省的轮数，按已进行轮次的平均输出估计节省的token"""
+    tokens_per_round = sum(count_tokens(text) for text in texts) // max(rounds_run, 1)
+    convergence.record_early_stop(max_rounds - rounds_run, tokens_per_round)
+
+
+async def get_discussion_response(agent, global_context, round_num: int, emit=None) -> Optional[Dict[str, Any]]:
+    """获取单个Agent在某一轮讨论中的回应，无内容时返回None；LLM调用失败时抛出LLMError"""
+    with span("discussion_turn", agent.name):
+        response_content = await agent.generate_discussion_response(
+            global_context,
+            round_num,
+            on_token=make_token_callback(emit, agent.name, round_num)
+        )
+    if not response_content:
+        return None
+        
+    return {
+        "agent_name": agent.name,
+        "content": response_content,
+        "round": round_num
+    }
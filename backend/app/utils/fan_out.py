@@ -0,0 +1,111 @@
+# 并行调度多个Agent：单个Agent超时和整个请求的截止时间
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Deadline:
+    """一次请求的截止时间，同时记录本次请求中超时和失败的Agent"""
+
+    def __init__(self, seconds: Optional[float] = None):
+        """
+        Args:
+            seconds: 距离截止的秒数，为None或0时不限制
+        """
+        self.expires_at = time.monotonic() + seconds if seconds else None
+        self.timed_out_agents: List[str] = []
+        self.failed_agents: List[str] = []
+        self.cancelled = False  # 请求被取消（如客户端断开或被插话打断）
+
+    def cancel(self):
+        self.cancelled = True
+
+    def expired(self) -> bool:
+        """请求已被取消或已到截止时间，此后不应再提交结果"""
+        return self.cancelled or self.remaining() == 0
+
+    def remaining(self) -> Optional[float]:
+        """剩余秒数，不限制时为None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def record_timeout(self, agent_name: str):
+        if agent_name not in self.timed_out_agents:
+            self.timed_out_agents.append(agent_name)
+
+    def record_failure(self, agent_name: str):
+        if agent_name not in self.failed_agents:
+            self.failed_agents.append(agent_name)
+
+
+class FanOutResult(NamedTuple):
+    results: List[Tuple[str, Any]]  # 按提交顺序排列的(名称, 结果)，不含None结果
+    timed_out: List[str]            # 超时被取消的名称
+    failed: List[str]               # 抛出异常的名称
+
+
+async def run_with_timeout(awaitable: Awaitable, timeout: Optional[float] = None):
+    """带超时地等待，timeout为None或0时不限制"""
+    if timeout:
+        return await asyncio.wait_for(awaitable, timeout)
+    return await awaitable
+
+
+async def fan_out(jobs: List[Tuple[str, Awaitable]], agent_timeout: Optional[float] = None,
+                  deadline: Optional[Deadline] = None) -> FanOutResult:
+    """并行执行多个Agent的任务，返回按时完成的结果
+
+    单个任务超过agent_timeout，或到达请求截止时间仍未完成时被取消并标记为超时；
+    其余任务的结果照常返回。任务抛出的其他异常（如重试后仍失败的LLM调用）记录日志并标记为失败。
+
+    Args:
+        jobs: (Agent名称, 待执行的协程) 列表
+        agent_timeout: 单个Agent的超时时间（秒）
+        deadline: 请求的截止时间，超时和失败的Agent也会记录在其中；调用方被取消时标记为已取消，
+            任务据此跳过提交（见Deadline.expired）
+    """
+    if not jobs:
+        return FanOutResult([], [], [])
+
+    tasks = [(name, asyncio.ensure_future(run_with_timeout(job, agent_timeout))) for name, job in jobs]
+    try:
+        _, pending = await asyncio.wait([task for _, task in tasks], timeout=deadline.remaining() if deadline else None)
+    except asyncio.CancelledError:
+        if deadline:
+            deadline.cancel()
+        raise
+    finally:
+        # 到达截止时间或调用方被取消时，不留下仍在运行的任务，并等待它们真正结束：
+        # wait_for可能在内部调用恰好完成时丢失取消，任务中的提交不能晚于本函数返回
+        leftover = [task for _, task in tasks if not task.done()]
+        for task in leftover:
+            task.cancel()
+        await asyncio.gather(*leftover, return_exceptions=True)
+
+    results, timed_out, failed = [], [], []
+    for name, task in tasks:
+        if task in pending or task.cancelled():
+            timed_out.append(name)
+            continue
+        error = task.exception()
+        if isinstance(error, asyncio.TimeoutError):
+            timed_out.append(name)
+        elif error:
+            logger.error(f"Agent {name}执行失败: {error}", exc_info=error)
+            failed.append(name)
+        elif task.result() is not None:
+            results.append((name, task.result()))
+
+    if timed_out:
+        print(f"以下Agent超时，已取消: {timed_out}")
+        if deadline:
+            for name in timed_out:
+                deadline.record_timeout(name)
+    if failed and deadline:
+        for name in failed:
+            deadline.record_failure(name)
+    return FanOutResult(results, timed_out, failed)
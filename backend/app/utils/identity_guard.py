@@ -0,0 +1,68 @@
+# 身份混淆处理：Agent在回复中自称其他角色时在本地改写，只在本地改写不可靠时才调用LLM重写
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import List, Tuple
+
+# 各处理方式的次数，所有会话共享
+_stats: Counter = Counter()
+
+
+def identity_instruction(name: str) -> str:
+    """追加在系统提示后的身份约束，从源头上减少身份混淆"""
+    return f"\n\n记住你是{name}：只以{name}的身份发言，不要自称其他助手（不要说“作为某某”或“我是某某”），也不要代替其他助手发言。"
+
+
+class IdentityGuard:
+    """检测并修正回复中“作为X”“我是X”形式的身份混淆（X为其他Agent）
+
+    所有Agent名称编译成一个正则，每条回复只扫描一次。
+    只自称了一个其他角色时直接把名称替换为自己的名称；
+    同时自称多个其他角色时回复多半是在替别人发言，替换无法保证语义，需要LLM重写。
+    """
+
+    def __init__(self, agent_names: Tuple[str, ...]):
+        # 长名称优先，避免一个名称是另一个名称前缀时匹配不完整
+        names = sorted(set(agent_names), key=len, reverse=True)
+        self.pattern = re.compile("(作为|我是)(" + "|".join(re.escape(name) for name in names) + ")")
+
+    def find_wrong_identities(self, text: str, own_name: str) -> List[str]:
+        """回复中自称的其他角色（按出现顺序去重）"""
+        _stats["checked"] += 1
+        wrong = []
+        for match in self.pattern.finditer(text):
+            name = match.group(2)
+            if name != own_name and name not in wrong:
+                wrong.append(name)
+        return wrong
+
+    @staticmethod
+    def needs_llm_rewrite(wrong_identities: List[str]) -> bool:
+        return len(wrong_identities) > 1
+
+    def rewrite_locally(self, text: str, own_name: str) -> str:
+        """把自称的其他角色替换为自己的名称"""
+        _stats["local_rewrites"] += 1
+        return self.pattern.sub(
+            lambda match: match.group(0) if match.group(2) == own_name else match.group(1) + own_name,
+            text
+        )
+
+
+@lru_cache(maxsize=16)
+def get_identity_guard(agent_names: Tuple[str, ...]) -> IdentityGuard:
+    """同一组Agent共享一个编译好的IdentityGuard"""
+    return IdentityGuard(agent_names)
+
+
+def record_llm_rewrite(succeeded: bool):
+    _stats["llm_rewrites" if succeeded else "llm_rewrite_failures"] += 1
+
+
+def get_stats() -> dict:
+    return {
+        "checked": _stats["checked"],
+        "local_rewrites": _stats["local_rewrites"],
+        "llm_rewrites": _stats["llm_rewrites"],
+        "llm_rewrite_failures": _stats["llm_rewrite_failures"],
+    }
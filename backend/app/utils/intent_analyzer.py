@@ -1,12 +1,18 @@
 # 用户意图分析
-from app.utils.openai_client import OpenAIClient
+from typing import Optional
+from app.utils.openai_client import OpenAIClient, get_openai_client
+from app.utils.metrics import timed
 
 class IntentAnalyzer:
-    def __init__(self):
-        self.openai_client = OpenAIClient()
+    def __init__(self, openai_client: Optional[OpenAIClient] = None):
+        self.openai_client = openai_client or get_openai_client()
     
+    @timed("intent_analysis")
     async def analyze_speaker_intent(self, user_message, available_agents):
         """分析用户消息中关于哪些Agent应该说话的意图"""
+        if not self.openai_client.breaker.is_closed:
+            # 服务熔断中，不发起分析调用，由各Agent本地的should_respond判断是否回复
+            return {"should_speak": [], "should_not_speak": [], "confidence": 0}
         prompt = f"""
 你是一个精确的意图分析助手。请仔细分析以下用户消息，判断用户希望哪些AI助手回复。
 
@@ -39,7 +45,7 @@ class IntentAnalyzer:
             response = await self.openai_client.generate_completion([
                 {"role": "system", "content": "你是一个意图分析助手，专门分析用户希望哪些AI助手回复。只返回JSON格式。"},
                 {"role": "user", "content": prompt}
-            ])
+            ], use_cache=True)
             
             import json
             # 提取JSON部分
@@ -0,0 +1,73 @@
+# 多模式关键词匹配（Aho-Corasick自动机）
+from collections import deque
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+class KeywordMatcher:
+    """把多组关键词编译成一个Aho-Corasick自动机，一次扫描文本即可找出所有命中
+
+    每个关键词都带有一个标签（通常是关键词所属的分组名），同一关键词可以属于多个分组。
+    """
+
+    def __init__(self, groups: Dict[str, Iterable[str]]):
+        """
+        Args:
+            groups: 标签 -> 关键词列表
+        """
+        # 每个状态: 转移表、失败指针、输出（(关键词, 标签)列表）
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, str]]] = [[]]
+
+        for label, keywords in groups.items():
+            for keyword in keywords:
+                if keyword:
+                    self._add(keyword, label)
+        self._build()
+
+    def _add(self, keyword: str, label: str):
+        state = 0
+        for ch in keyword:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][ch] = next_state
+            state = next_state
+        self._output[state].append((keyword, label))
+
+    def _build(self):
+        """按广度优先计算失败指针，并合并后缀状态的输出"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_all(self, text: str) -> List[Tuple[int, str, str]]:
+        """找出文本中所有命中的关键词
+
+        Returns:
+            List[Tuple]: (起始位置, 关键词, 标签) 列表，按关键词结束位置排序
+        """
+        matches = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for keyword, label in self._output[state]:
+                matches.append((i - len(keyword) + 1, keyword, label))
+        return matches
+
+    def match_labels(self, text: str) -> Set[str]:
+        """返回文本中命中的所有标签"""
+        return {label for _, _, label in self.find_all(text)}
@@ -0,0 +1,68 @@
+# LLM调用的错误类型
+from typing import Optional
+import httpx
+import openai
+
+
+class LLMError(Exception):
+    """LLM调用失败（重试后仍失败时由OpenAIClient抛出）"""
+    retryable = False
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMTimeoutError(LLMError):
+    """请求超时"""
+    retryable = True
+
+
+class LLMConnectionError(LLMError):
+    """无法连接到服务"""
+    retryable = True
+
+
+class LLMRateLimitError(LLMError):
+    """触发服务端限流（429）"""
+    retryable = True
+
+
+class LLMServerError(LLMError):
+    """服务端错误（5xx）"""
+    retryable = True
+
+
+class LLMRequestError(LLMError):
+    """请求本身有误或无权限（4xx），重试没有意义"""
+
+
+class LLMEmptyResponseError(LLMError):
+    """服务返回了空内容"""
+    retryable = True
+
+
+class LLMCircuitOpenError(LLMError):
+    """熔断中，调用未发出"""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after  # 距离熔断进入半开状态的秒数
+
+
+def classify_error(error: Exception) -> LLMError:
+    """把OpenAI SDK和httpx的异常转换为LLMError"""
+    if isinstance(error, LLMError):
+        return error
+    message = str(error) or error.__class__.__name__
+    if isinstance(error, (openai.APITimeoutError, httpx.TimeoutException)):
+        return LLMTimeoutError(message)
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        return LLMConnectionError(message)
+    if isinstance(error, openai.RateLimitError):
+        return LLMRateLimitError(message, error.status_code)
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code >= 500:
+            return LLMServerError(message, error.status_code)
+        return LLMRequestError(message, error.status_code)
+    return LLMError(message)
@@ -0,0 +1,193 @@
+# LLM请求调度：全局并发上限、按请求数/token数限速、优先级和会话间公平排队
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Deque, Dict, List, Optional
+from app.utils.token_budget import message_tokens
+
+# 当前请求所属的会话，用于会话间公平排队（由路由在处理请求时设置）
+llm_session: ContextVar[Optional[str]] = ContextVar("llm_session", default=None)
+
+
+class Priority(IntEnum):
+    """LLM调用的优先级，数值越小越先调度"""
+    INTERACTIVE = 0  # 分类调用和直接回复，用户正在等待
+    DISCUSSION = 1   # 讨论中的发言
+    BACKGROUND = 2   # 讨论总结、身份修正、滚动摘要等
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: int) -> int:
+    """估计一次调用消耗的token数（输入加上最大输出）"""
+    return sum(message_tokens(str(msg.get("content", ""))) for msg in messages) + max_tokens
+
+
+class TokenBucket:
+    """令牌桶：每分钟补充rate_per_minute个令牌，最多积累一分钟的量"""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = rate_per_minute
+        self.rate = rate_per_minute / 60.0
+        self.tokens = rate_per_minute
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """距离能取出amount个令牌还需等待的秒数（超过容量的请求按容量计算）"""
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+
+class _Waiter:
+    __slots__ = ("future", "priority", "session_id", "tokens", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, priority: Priority, session_id: str, tokens: int):
+        self.future = future
+        self.priority = priority
+        self.session_id = session_id
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """所有LLM调用都经过的调度器
+
+    - 全局并发上限，以及按请求数（RPM）和估计token数（TPM）的令牌桶限速
+    - 优先级高的调用先获得执行机会
+    - 同一优先级内按会话轮流调度，一个会话的大量讨论调用不会让其他会话长时间等待
+    """
+
+    def __init__(self, max_concurrency: int = 20, rpm_limit: float = 0, tpm_limit: float = 0):
+        """
+        Args:
+            max_concurrency: 同时进行的LLM调用上限
+            rpm_limit: 每分钟请求数上限，为0时不限制
+            tpm_limit: 每分钟token数上限（按估计值），为0时不限制
+        """
+        self.max_concurrency = max_concurrency
+        self.request_bucket = TokenBucket(rpm_limit) if rpm_limit else None
+        self.token_bucket = TokenBucket(tpm_limit) if tpm_limit else None
+        # 每个优先级一个队列：会话ID -> 该会话的等待者，会话按轮转顺序排列
+        self._queues: Dict[Priority, "OrderedDict[str, Deque[_Waiter]]"] = {p: OrderedDict() for p in Priority}
+        self._active = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # 统计
+        self.granted = {p: 0 for p in Priority}
+        self.total_wait = {p: 0.0 for p in Priority}
+        self.max_wait = {p: 0.0 for p in Priority}
+        self.rate_limited = 0
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.INTERACTIVE, tokens: int = 0):
+        """获取一次LLM调用的执行机会，退出时释放"""
+        await self.acquire(priority, tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE, tokens: int = 0):
+        session_id = llm_session.get() or ""
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), priority, session_id, tokens)
+        self._queues[priority].setdefault(session_id, deque()).append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 已分配到执行机会但调用方被取消，归还
+                self.release()
+            else:
+                self._remove(waiter)
+            raise
+
+    def release(self):
+        self._active -= 1
+        self._dispatch()
+
+    def _remove(self, waiter: _Waiter):
+        queue = self._queues[waiter.priority]
+        waiters = queue.get(waiter.session_id)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del queue[waiter.session_id]
+
+    def _peek(self) -> Optional[_Waiter]:
+        """下一个应调度的等待者：最高优先级中轮到的会话的最早请求"""
+        for priority in Priority:
+            queue = self._queues[priority]
+            if queue:
+                return next(iter(queue.values()))[0]
+        return None
+
+    def _pop(self, waiter: _Waiter):
+        queue = self._queues[waiter.priority]
+        waiters = queue.pop(waiter.session_id)
+        waiters.popleft()
+        if waiters:
+            # 该会话还有等待的请求，排到本优先级的队尾
+            queue[waiter.session_id] = waiters
+
+    def _dispatch(self):
+        while self._active < self.max_concurrency:
+            waiter = self._peek()
+            if waiter is None:
+                return
+            if waiter.future.done():
+                self._pop(waiter)
+                continue
+
+            delay = max(
+                self.request_bucket.wait_time(1) if self.request_bucket else 0.0,
+                self.token_bucket.wait_time(waiter.tokens) if self.token_bucket else 0.0,
+            )
+            if delay > 0:
+                # 令牌不足，等补充后再调度（同一时间只保留一个定时器）
+                if self._timer is None:
+                    self.rate_limited += 1
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+                return
+
+            if self.request_bucket:
+                self.request_bucket.consume(1)
+            if self.token_bucket:
+                self.token_bucket.consume(waiter.tokens)
+            self._pop(waiter)
+            self._active += 1
+            waited = time.monotonic() - waiter.enqueued_at
+            self.granted[waiter.priority] += 1
+            self.total_wait[waiter.priority] += waited
+            self.max_wait[waiter.priority] = max(self.max_wait[waiter.priority], waited)
+            waiter.future.set_result(None)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def get_stats(self) -> dict:
+        stats = {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "rate_limited": self.rate_limited,
+            "priorities": {},
+        }
+        for priority in Priority:
+            granted = self.granted[priority]
+            stats["priorities"][priority.name.lower()] = {
+                "queue_depth": sum(len(waiters) for waiters in self._queues[priority].values()),
+                "granted": granted,
+                "avg_wait": self.total_wait[priority] / granted if granted else 0.0,
+                "max_wait": self.max_wait[priority],
+            }
+        return stats
@@ -0,0 +1,144 @@
+# 本地快速路由：无需调用LLM即可判断高置信度的用户意图
+import re
+from typing import Dict, List, Tuple
+from app.utils.keyword_matcher import KeywordMatcher
+
+# 讨论相关关键词
+DISCUSSION_KEYWORDS = ["讨论", "商量", "你们商量", "你们讨论", "内部沟通"]
+# 明确的讨论请求（命中时置信度较高）
+STRONG_DISCUSSION_KEYWORDS = ["你们讨论", "你们商量", "讨论一下", "商量一下", "内部沟通", "请讨论", "一起讨论"]
+# 拒绝讨论关键词
+REJECT_KEYWORDS = ["不要讨论", "不需要讨论", "无需讨论", "直接回答"]
+# "只有X回答"类的限定词
+ONLY_MARKERS = ["只有", "只要", "只让", "只需要", "只请", "仅让", "仅由"]
+# "X不要说话"类的禁言词
+SILENCE_MARKERS = ["不要说话", "不要回答", "不要发言", "别说话", "别回答", "别发言", "不用回答", "不用说话", "闭嘴"]
+
+# 禁言词与Agent名称之间允许的最大间隔字符数（如"批评者就不要说话了"）
+SILENCE_MAX_GAP = 3
+# 连接并列Agent名称的词（如"批评者和创新者不要说话"中的"和"，也可以直接相连），并列的名称共享后面的禁言词
+LIST_JOINER = re.compile(r"\s*(和|与|跟|及|以及|还有|、|,|，)?\s*")
+
+
+class LocalIntentRouter:
+    """把讨论/拒绝关键词、Agent名称和限定词编译进同一个自动机，本地判断高置信度的路由
+
+    只有当本地判断的置信度不低于阈值时才直接采用，否则交给LLM路由分析。
+    """
+
+    def __init__(self, confidence_threshold: float = 0.8):
+        self.confidence_threshold = confidence_threshold
+        self.hits = 0    # 本地直接决定的次数
+        self.misses = 0  # 置信度不足、交给LLM的次数
+        self._matchers: Dict[Tuple[str, ...], KeywordMatcher] = {}
+
+    def _get_matcher(self, available_agents: List[str]) -> KeywordMatcher:
+        """按Agent名单编译（并缓存）自动机"""
+        key = tuple(available_agents)
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            groups = {
+                "discussion": DISCUSSION_KEYWORDS,
+                "strong_discussion": STRONG_DISCUSSION_KEYWORDS,
+                "reject": REJECT_KEYWORDS,
+                "only": ONLY_MARKERS,
+                "silence": SILENCE_MARKERS,
+            }
+            for name in available_agents:
+                groups[f"agent:{name}"] = [name]
+            matcher = KeywordMatcher(groups)
+            self._matchers[key] = matcher
+        return matcher
+
+    def route(self, user_input: str, available_agents: List[str]) -> dict:
+        """本地分析用户输入
+
+        Returns:
+            dict: 与LLM路由分析相同结构的结果，confidence表示本地判断的可信程度
+        """
+        matches = self._get_matcher(available_agents).find_all(user_input)
+        labels = {label for _, _, label in matches}
+
+        # 按出现位置整理Agent名称、限定词和禁言词
+        mentions = sorted((pos, label[len("agent:"):], keyword) for pos, keyword, label in matches if label.startswith("agent:"))
+        only_positions = [pos for pos, _, label in matches if label == "only"]
+        silence_positions = [pos for pos, _, label in matches if label == "silence"]
+
+        should_not_speak = []
+        group: List[str] = []  # 以连接词并列的一组名称，到最后一个名称后才判断禁言
+        for index, (pos, name, keyword) in enumerate(mentions):
+            group.append(name)
+            end = pos + len(keyword)
+            next_mention = mentions[index + 1][0] if index + 1 < len(mentions) else len(user_input)
+            if next_mention < len(user_input) and LIST_JOINER.fullmatch(user_input[end:next_mention]):
+                continue
+            if any(end <= s <= min(end + SILENCE_MAX_GAP, next_mention) for s in silence_positions):
+                should_not_speak.extend(group)
+            group = []
+
+        specified_agents = []
+        if only_positions:
+            first_only = min(only_positions)
+            specified_agents = [name for pos, name, _ in mentions if pos > first_only and name not in should_not_speak]
+        specified_agents = list(dict.fromkeys(specified_agents))
+        should_not_speak = list(dict.fromkeys(should_not_speak))
+
+        result = {
+            "needs_discussion": False,
+            "topic": user_input,
+            "suggested_rounds": 0,
+            "specified_agents": [],
+            "should_speak": [],
+            "should_not_speak": should_not_speak,
+            "confidence": 0.3,
+            "reason": "本地路由：无明确意图",
+        }
+
+        wants_discussion = "discussion" in labels and "reject" not in labels
+        if specified_agents:
+            result["specified_agents"] = specified_agents
+            result["should_speak"] = specified_agents
+            result["should_not_speak"] = [name for name in available_agents if name not in specified_agents]
+            # 限定角色的同时又要求讨论，交给LLM判断
+            result["confidence"] = 0.6 if wants_discussion else 0.95
+            result["reason"] = "本地路由：用户限定了回答角色"
+        elif "reject" in labels:
+            result["confidence"] = 0.9
+            result["reason"] = "本地路由：用户拒绝讨论"
+        elif "strong_discussion" in labels and not should_not_speak:
+            result["needs_discussion"] = True
+            result["suggested_rounds"] = 3
+            result["confidence"] = 0.85
+            result["reason"] = "本地路由：明确的讨论请求"
+        elif should_not_speak:
+            result["confidence"] = 0.6 if wants_discussion else 0.9
+            result["reason"] = "本地路由：用户要求部分角色不要发言"
+        elif wants_discussion:
+            result["needs_discussion"] = True
+            result["suggested_rounds"] = 3
+            result["confidence"] = 0.6
+            result["reason"] = "本地路由：包含讨论关键词"
+        elif mentions:
+            result["confidence"] = 0.5
+            result["reason"] = "本地路由：提及了角色但意图不明确"
+
+        return result
+
+    def try_route(self, user_input: str, available_agents: List[str]):
+        """尝试本地路由，置信度达到阈值时返回结果，否则返回None，并记录命中/未命中"""
+        result = self.route(user_input, available_agents)
+        if result["confidence"] >= self.confidence_threshold:
+            self.hits += 1
+            return result
+        self.misses += 1
+        return None
+
+    def get_stats(self) -> dict:
+        """返回命中统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "confidence_threshold": self.confidence_threshold,
+        }
@@ -0,0 +1,67 @@
+# 讨论发言的新颖度评分：用本地的字符n-gram TF-IDF判断是否值得调用LLM
+import math
+import random
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List
+from app.core.config import settings
+
+# 发言决策使用的随机数生成器，配置了种子时结果可复现（用于基准测试）
+speaking_rng = random.Random(settings.SPEAKING_RANDOM_SEED)
+
+
+@lru_cache(maxsize=4096)
+def char_ngrams(text: str, n: int = 2) -> Counter:
+    """文本的字符n-gram计数（忽略标点和空白，适用于不分词的中文）
+
+    结果按文本缓存，调用方不要修改返回的Counter。
+    """
+    normalized = "".join(ch.lower() for ch in text if ch.isalnum())
+    if len(normalized) < n:
+        return Counter([normalized]) if normalized else Counter()
+    return Counter(normalized[i:i + n] for i in range(len(normalized) - n + 1))
+
+
+def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(weight * b.get(gram, 0.0) for gram, weight in a.items())
+    norm = math.sqrt(sum(w * w for w in a.values())) * math.sqrt(sum(w * w for w in b.values()))
+    return dot / norm if norm else 0.0
+
+
+class NoveltyScorer:
+    """计算新发言相对已有内容的新颖度（0为完全重复，1为全新）
+
+    每条文本视为一个文档，在这些文档上计算TF-IDF向量；
+    每条新文本的新颖度是1减去它与已有文本的最大余弦相似度，结果取平均。
+    """
+
+    def __init__(self, n: int = 2):
+        """
+        Args:
+            n: 字符n-gram的长度
+        """
+        self.n = n
+
+    def novelty(self, new_texts: List[str], seen_texts: List[str]) -> float:
+        """new_texts相对seen_texts的新颖度；没有新文本时为0，没有已有文本时为1"""
+        if not new_texts:
+            return 0.0
+        if not seen_texts:
+            return 1.0
+
+        docs = [char_ngrams(text, self.n) for text in new_texts + seen_texts]
+        df = Counter()
+        for doc in docs:
+            df.update(doc.keys())
+        total = len(docs)
+        idf = {gram: math.log((1 + total) / (1 + count)) + 1 for gram, count in df.items()}
+        vectors = [{gram: tf * idf[gram] for gram, tf in doc.items()} for doc in docs]
+
+        new_vectors, seen_vectors = vectors[:len(new_texts)], vectors[len(new_texts):]
+        scores = [1 - max(_cosine(vector, seen) for seen in seen_vectors) for vector in new_vectors]
+        return sum(scores) / len(scores)
+
+
+novelty_scorer = NoveltyScorer(settings.NOVELTY_NGRAM)
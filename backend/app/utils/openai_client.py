@@ -1,35 +1,316 @@
 import asyncio
 import logging
-import openai
-from openai import OpenAI
+import random
+import time
+from collections import deque
+from typing import Optional, Callable, Awaitable, Deque, List
+import httpx
+from openai import AsyncOpenAI
 from app.core.config import settings
+from app.utils.completion_cache import CompletionCache
+from app.utils.llm_scheduler import LLMScheduler, Priority, estimate_tokens
+from app.utils.llm_errors import LLMError, LLMEmptyResponseError, LLMCircuitOpenError, classify_error
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.single_flight import SingleFlight
+from app.utils.metrics import current_stage, llm_queue_seconds, llm_request_seconds, llm_requests_total, llm_tokens_total
+from app.utils.token_budget import count_tokens, message_tokens
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def request_timeout() -> float:
+    """单次请求的超时：不超过Agent回复超时按尝试次数均分后的时间，保证超时后还有机会重试"""
+    timeout = settings.LLM_REQUEST_TIMEOUT
+    if settings.AGENT_RESPONSE_TIMEOUT:
+        timeout = min(timeout, settings.AGENT_RESPONSE_TIMEOUT / (settings.LLM_MAX_RETRIES + 1))
+    return timeout
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """创建带连接池和keep-alive的异步HTTP客户端"""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            request_timeout(),
+            connect=settings.LLM_CONNECT_TIMEOUT,
+        ),
+    )
+
+
+class LatencyWindow:
+    """最近若干次调用的耗时，用于计算对冲请求的触发时间"""
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float, min_samples: int = 20) -> Optional[float]:
+        """第q百分位的耗时，样本不足时返回None"""
+        if len(self.samples) < min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
 class OpenAIClient:
-    def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None, cache: Optional[CompletionCache] = None,
+                 scheduler: Optional[LLMScheduler] = None, breaker: Optional[CircuitBreaker] = None):
+        self.http_client = http_client or create_http_client()
+        self.scheduler = scheduler or LLMScheduler(
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            rpm_limit=settings.LLM_RPM_LIMIT,
+            tpm_limit=settings.LLM_TPM_LIMIT
+        )
+        self.cache = cache or CompletionCache(
+            max_entries=settings.COMPLETION_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.COMPLETION_CACHE_TTL,
+            path=settings.COMPLETION_CACHE_PATH or None
+        )
+        self.client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL or None,
+            http_client=self.http_client,
+            max_retries=0,  # 重试由generate_completion统一处理
+        )
+        self.breaker = breaker or CircuitBreaker(
+            failure_rate=settings.CIRCUIT_BREAKER_FAILURE_RATE,
+            slow_call_seconds=settings.CIRCUIT_BREAKER_SLOW_CALL_SECONDS,
+            slow_call_rate=settings.CIRCUIT_BREAKER_SLOW_CALL_RATE,
+            window=settings.CIRCUIT_BREAKER_WINDOW,
+            min_calls=settings.CIRCUIT_BREAKER_MIN_CALLS,
+            open_seconds=settings.CIRCUIT_BREAKER_OPEN_SECONDS,
+            half_open_calls=settings.CIRCUIT_BREAKER_HALF_OPEN_CALLS
+        )
+        self.latency = LatencyWindow()
+        self.single_flight = SingleFlight()
+        self.retries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
         logger.info(f"OpenAI客户端初始化，API密钥长度: {len(settings.OPENAI_API_KEY) if settings.OPENAI_API_KEY else 0}")
-        
-    async def generate_completion(self, messages, model=None):
-        """异步包装同步API调用"""
+
+    async def generate_completion(self, messages, model=None, on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+                                  temperature: float = 0.7, max_tokens: int = 500, use_cache: bool = False,
+                                  priority: Priority = Priority.INTERACTIVE):
+        """调用原生异步API生成回复
+
+        可重试的错误（超时、连接失败、限流、5xx）按指数退避加随机抖动重试；
+        开启对冲时，非流式调用超过近期p95耗时仍未返回，会再发一个相同请求并采用先返回的结果。
+        上游持续出错或过慢导致熔断时，调用立即以LLMCircuitOpenError失败。
+        相同的非流式请求同时进行时合并为一次上游调用。
+
+        Args:
+            messages: 发送给API的消息列表
+            model: 使用的模型，默认取配置
+            on_token: 可选的流式回调，传入时以流式方式调用API，每收到一段增量文本就回调一次
+            temperature: 采样温度
+            max_tokens: 最大生成长度
+            use_cache: 是否使用回复缓存，适合确定性的分类调用，创造性回复不应开启
+            priority: 调度优先级，限速或并发已满时优先级高的调用先执行
+
+        Returns:
+            str: 完整的回复内容
+
+        Raises:
+            LLMError: 重试后仍然失败
+        """
+        model = model or settings.OPENAI_MODEL
+        cache_key = None
+        if use_cache:
+            cache_key = self.cache.make_key(model, temperature, max_tokens, messages)
+            cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                if on_token is not None:
+                    await on_token(cached)
+                return cached
+
+        streamed = []  # 已转发给调用方的流式片段，有内容后不能再重试
+
+        async def attempt() -> str:
+            stage = current_stage.get()
+            if not self.breaker.allow_request():
+                llm_requests_total.inc(stage=stage, outcome="circuit_open")
+                raise LLMCircuitOpenError("LLM服务暂时不可用（熔断中）", retry_after=self.breaker.retry_after())
+            started = None
+            usage = None
+            try:
+                queued = time.monotonic()
+                async with self.scheduler.slot(priority, estimate_tokens(messages, max_tokens)):
+                    logger.info(f"开始调用OpenAI API, 模型: {model}")
+                    started = time.monotonic()
+                    llm_queue_seconds.observe(started - queued, priority=priority.name.lower())
+                    try:
+                        if on_token is not None:
+                            content = await self._stream_completion(messages, model, on_token, temperature, max_tokens, streamed)
+                        else:
+                            response = await self.client.chat.completions.create(
+                                model=model,
+                                messages=messages,
+                                temperature=temperature,
+                                max_tokens=max_tokens
+                            )
+                            content = response.choices[0].message.content
+                            usage = response.usage
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        raise classify_error(e) from e
+                    if not content:
+                        raise LLMEmptyResponseError("API返回了空内容")
+                    elapsed = time.monotonic() - started
+            except LLMError as e:
+                # 只有上游的问题（可重试的错误）计入熔断统计，请求本身有误的不计入
+                if e.retryable:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release()
+                self._record_call(stage, e.__class__.__name__, started)
+                raise
+            except BaseException:
+                # 被超时取消的调用若已挂起足够久，同样说明上游异常
+                self.breaker.record_cancelled(time.monotonic() - started if started is not None else 0.0)
+                self._record_call(stage, "cancelled", started)
+                raise
+            self.breaker.record_success(elapsed)
+            if on_token is None:
+                self.latency.add(elapsed)
+            self._record_call(stage, "success", started)
+            self._record_tokens(stage, messages, content, usage)
+            return content
+
+        async def call() -> str:
+            for retry in range(settings.LLM_MAX_RETRIES + 1):
+                try:
+                    content = await (attempt() if on_token is not None else self._hedged(attempt))
+                    break
+                except LLMError as e:
+                    if not e.retryable or retry >= settings.LLM_MAX_RETRIES or streamed:
+                        logger.error(f"OpenAI API调用失败: {e}")
+                        raise
+                    # 指数退避加全抖动，避免大量调用同时重试
+                    delay = random.uniform(0, min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * 2 ** retry))
+                    self.retries += 1
+                    logger.warning(f"OpenAI API调用失败（{e.__class__.__name__}: {e}），{delay:.2f}秒后重试")
+                    await asyncio.sleep(delay)
+            return content
+
+        if on_token is None and settings.LLM_SINGLE_FLIGHT:
+            # 相同的非流式请求正在进行时等待它的结果，不重复调用上游
+            flight_key = cache_key or self.cache.make_key(model, temperature, max_tokens, messages)
+            content = await self.single_flight.do(flight_key, call)
+        else:
+            content = await call()
+
+        logger.info("OpenAI API调用成功")
+        if cache_key is not None:
+            self.cache.set(cache_key, content)
+        return content
+
+    @staticmethod
+    def _record_call(stage: str, outcome: str, started: Optional[float]):
+        llm_requests_total.inc(stage=stage, outcome=outcome)
+        if started is not None:
+            llm_request_seconds.observe(time.monotonic() - started, stage=stage, outcome=outcome)
+
+    @staticmethod
+    def _record_tokens(stage: str, messages, content: str, usage):
+        """记录token用量；流式调用没有usage，按本地估计值记录"""
+        if usage is not None:
+            prompt_tokens, completion_tokens, source = usage.prompt_tokens, usage.completion_tokens, "usage"
+        else:
+            prompt_tokens = sum(message_tokens(str(msg.get("content", ""))) for msg in messages)
+            completion_tokens, source = count_tokens(content), "estimate"
+        llm_tokens_total.inc(prompt_tokens, stage=stage, type="prompt", source=source)
+        llm_tokens_total.inc(completion_tokens, stage=stage, type="completion", source=source)
+
+    async def _hedged(self, attempt: Callable[[], Awaitable[str]]) -> str:
+        """执行一次调用；超过近期p95耗时仍未完成时再发一个相同请求，采用先成功的结果"""
+        delay = self.latency.percentile(0.95, settings.LLM_HEDGE_MIN_SAMPLES) if settings.LLM_HEDGING else None
+        if delay is None:
+            return await attempt()
+
+        primary = asyncio.ensure_future(attempt())
+        tasks = [primary]
         try:
-            logger.info(f"开始调用OpenAI API, 模型: {model or settings.OPENAI_MODEL}")
-            # 使用线程池执行器来非阻塞地运行同步API调用
-            loop = asyncio.get_running_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.client.chat.completions.create(
-                    model=model or settings.OPENAI_MODEL,
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=500
-                )
-            )
-            logger.info("OpenAI API调用成功")
-            return response.choices[0].message.content
-        except Exception as e:
-            logger.error(f"OpenAI API调用错误: {str(e)}", exc_info=True)
-            return f"抱歉，生成回复时发生错误: {str(e)}"
\ No newline at end of file
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedged += 1
+                tasks.append(asyncio.ensure_future(attempt()))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # 取消较慢的请求，并等待其释放调度器的执行机会
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "retries": self.retries,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "p95_latency": self.latency.percentile(0.95, 1),
+            "circuit_breaker": self.breaker.get_stats(),
+            "single_flight": self.single_flight.get_stats(),
+        }
+
+    async def _stream_completion(self, messages, model, on_token: Callable[[str], Awaitable[None]],
+                                 temperature: float, max_tokens: int, parts: List[str]) -> str:
+        """以流式方式调用API，逐段转发增量文本（同时记入parts）并返回拼接后的完整内容"""
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                await on_token(delta)
+        return "".join(parts)
+
+    async def close(self):
+        """关闭底层连接池和回复缓存"""
+        await self.client.close()
+        self.cache.close()
+
+
+# 进程内共享的客户端实例
+_shared_client: Optional[OpenAIClient] = None
+
+
+def get_openai_client() -> OpenAIClient:
+    """获取进程内共享的OpenAI客户端（懒加载）"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = OpenAIClient()
+    return _shared_client
+
+
+async def close_openai_client():
+    """关闭共享客户端，在应用退出时调用"""
+    global _shared_client
+    if _shared_client is not None:
+        await _shared_client.close()
+        _shared_client = None
@@ -0,0 +1,116 @@
+# 会话管理：每个用户会话拥有独立的Agent状态和上下文
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class Session:
+    """单个会话的状态：独立的AgentManager、讨论管理器和会话锁"""
+
+    def __init__(self, session_id: str, agent_manager, discussion_manager):
+        self.session_id = session_id
+        self.agent_manager = agent_manager
+        self.discussion_manager = discussion_manager
+        # 同一会话内的请求串行执行，避免并发请求交错写入上下文
+        self.lock = asyncio.Lock()
+        self.last_access = time.monotonic()
+        # 客户端带来的会话ID可能有持久化的历史，首次使用前需要恢复；服务端新生成的ID不需要
+        self.needs_restore = False
+        self._restore_task: Optional[asyncio.Future] = None
+
+    async def restore(self):
+        """首次使用前从存储恢复上下文，同时到达的请求共享同一次恢复；恢复失败时下一个请求重试"""
+        if not self.needs_restore:
+            return
+        if self._restore_task is None:
+            self._restore_task = asyncio.ensure_future(self.agent_manager.restore())
+        task = self._restore_task
+        try:
+            await asyncio.shield(task)
+        except Exception:
+            if self._restore_task is task:
+                self._restore_task = None
+            raise
+        self.needs_restore = False
+
+
+class SessionStore:
+    """按会话ID保存会话，支持空闲超时淘汰和最大会话数限制（按最近访问顺序淘汰）"""
+
+    def __init__(self, session_factory: Callable[[str], Session], idle_timeout: float = 1800, max_sessions: int = 1000):
+        """
+        Args:
+            session_factory: 根据会话ID创建新会话的工厂函数
+            idle_timeout: 会话空闲超过该时间（秒）后被淘汰
+            max_sessions: 最多同时保存的会话数
+        """
+        self.session_factory = session_factory
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        # 按最近访问时间排序，最久未访问的在最前面
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.created = 0
+        self.evicted = 0
+
+    @staticmethod
+    def new_session_id() -> str:
+        return uuid.uuid4().hex
+
+    def get_or_create(self, session_id: Optional[str] = None) -> Session:
+        """获取会话，不存在时创建；每次访问都会刷新会话的最近访问时间
+
+        按客户端给出的ID新建的会话需要在使用前调用restore()恢复持久化的上下文。
+        """
+        now = time.monotonic()
+        self._evict_idle(now)
+
+        restore = session_id is not None
+        session_id = session_id or self.new_session_id()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self.session_factory(session_id)
+            session.needs_restore = restore
+            self._sessions[session_id] = session
+            self.created += 1
+            self._evict_overflow()
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_access = now
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """获取已存在的会话，不会创建新会话"""
+        return self._sessions.get(session_id)
+
+    def touch(self, session_id: str):
+        """刷新会话的最近访问时间并移到LRU队尾，用于长连接上不经过get_or_create的访问"""
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+            session.last_access = time.monotonic()
+
+    def _evict_idle(self, now: float):
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access <= self.idle_timeout:
+                break
+            self._remove(session_id)
+
+    def _evict_overflow(self):
+        while len(self._sessions) > self.max_sessions:
+            session_id = next(iter(self._sessions))
+            self._remove(session_id)
+
+    def _remove(self, session_id: str):
+        # 正在处理中的请求仍持有会话引用，可以正常完成
+        self._sessions.pop(session_id, None)
+        self.evicted += 1
+
+    def get_stats(self) -> dict:
+        return {
+            "active": len(self._sessions),
+            "created": self.created,
+            "evicted": self.evicted,
+        }
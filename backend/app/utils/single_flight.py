@@ -0,0 +1,62 @@
+# 合并相同的进行中请求：同一个键同时只有一次上游调用，其他调用方等待它的结果
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """按键合并并发的相同调用
+
+    第一个调用方启动任务，之后相同键的调用方等待同一个任务；结果或异常由所有调用方共享。
+    某个调用方被取消不影响其他调用方，所有调用方都离开后任务才被取消。
+    任务结束后键立即释放，之后的调用会重新发起。
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.started = 0    # 实际发起的调用数
+        self.coalesced = 0  # 合并到进行中调用的次数
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """执行factory()，已有相同键的调用在进行时等待它的结果"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.started += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            # shield：一个调用方被取消时不取消共享的任务
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # 没有调用方再等待，取消任务，新的调用重新发起
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def get_stats(self) -> dict:
+        total = self.started + self.coalesced
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / total if total else 0.0,
+        }
@@ -0,0 +1,49 @@
+# 流式输出事件
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+# 事件回调：接收一个事件字典
+EventEmitter = Callable[[Dict[str, Any]], Awaitable[None]]
+# 增量文本回调：接收一段增量文本
+TokenCallback = Callable[[str], Awaitable[None]]
+
+
+def make_token_callback(emit: Optional[EventEmitter], agent_name: str,
+                        round_num: Optional[int] = None, is_summary: bool = False) -> Optional[TokenCallback]:
+    """为单个Agent的一次回复创建增量文本回调，把增量文本包装成带标签的token事件
+
+    Args:
+        emit: 事件回调，为None时表示非流式模式
+        agent_name: 发言的Agent名称
+        round_num: 讨论轮次，直接回复时为None
+        is_summary: 是否是讨论总结
+
+    Returns:
+        TokenCallback|None: 增量文本回调，非流式模式下返回None
+    """
+    if emit is None:
+        return None
+
+    async def on_token(delta: str):
+        await emit({
+            "type": "token",
+            "agent_name": agent_name,
+            "round": round_num,
+            "is_summary": is_summary,
+            "content": delta
+        })
+
+    return on_token
+
+
+async def emit_message(emit: Optional[EventEmitter], agent_name: str, content: str,
+                       round_num: Optional[int] = None, is_summary: bool = False):
+    """发送一条完整回复事件，客户端应以此内容替换之前拼接的token（身份修正后内容可能变化）"""
+    if emit is None:
+        return
+    await emit({
+        "type": "message",
+        "agent_name": agent_name,
+        "round": round_num,
+        "is_summary": is_summary,
+        "content": content
+    })
@@ -0,0 +1,33 @@
+# 上下文token预算
+from functools import lru_cache
+
+# 每条消息在API请求中的固定开销（角色、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def _is_cjk(ch: str) -> bool:
+    code = ord(ch)
+    return (
+        0x4E00 <= code <= 0x9FFF      # 中日韩统一表意文字
+        or 0x3400 <= code <= 0x4DBF   # 扩展A
+        or 0x3000 <= code <= 0x303F   # 中日韩标点
+        or 0xFF00 <= code <= 0xFFEF   # 全角字符
+    )
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """粗略估计文本的token数：中日韩字符约每字1个token，其余字符约每4个字符1个token
+
+    结果按文本缓存，同一条消息在多轮构建提示时只计算一次。
+    """
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if _is_cjk(ch))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def message_tokens(content: str) -> int:
+    """单条消息的token数（含固定开销）"""
+    return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
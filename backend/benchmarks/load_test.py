@@ -0,0 +1,143 @@
+"""端到端压测：按固定并发驱动后端接口，统计延迟分位数、吞吐量和每个请求的LLM调用次数
+
+需要先启动模拟服务和指向它的后端（见mock_llm_server），然后在backend目录下运行:
+    python -m benchmarks.load_test --concurrency 8 --requests 40 --scenarios direct,specified,discussion
+
+场景:
+    direct      普通聊天，由各Agent自行判断是否回复（/api/chat）
+    specified   指定某个Agent回答（/api/chat）
+    discussion  直接发起讨论（/api/discussion）
+
+每个并发用户使用独立的会话；各场景依次运行，LLM调用次数取自模拟服务的 /stats。
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+import httpx
+
+_DIRECT_PROMPTS = ["最近工作压力很大，有什么建议？", "怎样提高团队的沟通效率？", "我想学一门新的编程语言"]
+_SPECIFIED_PROMPTS = ["请顾问回答：如何制定学习计划？", "请批评者说说这个方案的问题：每天加班两小时", "只有创新者回答：周末可以做什么？"]
+_DISCUSSION_TOPICS = ["远程办公的利弊", "是否应该在项目早期引入自动化测试", "城市应该优先发展公共交通吗"]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """最近秩法计算分位数"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, min(len(ordered), round(q * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def build_request(scenario: str, index: int, repeat: bool, rounds: int) -> Tuple[str, Dict]:
+    """第index个请求的路径和请求体；repeat为False时在内容后加编号，避免命中缓存或被合并"""
+    suffix = "" if repeat else f"（{index}）"
+    if scenario == "direct":
+        return "/api/chat", {"content": _DIRECT_PROMPTS[index % len(_DIRECT_PROMPTS)] + suffix}
+    if scenario == "specified":
+        return "/api/chat", {"content": _SPECIFIED_PROMPTS[index % len(_SPECIFIED_PROMPTS)] + suffix}
+    if scenario == "discussion":
+        topic = _DISCUSSION_TOPICS[index % len(_DISCUSSION_TOPICS)] + suffix
+        return "/api/discussion", {"topic": topic, "max_rounds": rounds}
+    raise ValueError(f"未知的场景: {scenario}")
+
+
+async def _mock_calls(mock_url: Optional[str]) -> Optional[int]:
+    if not mock_url:
+        return None
+    async with httpx.AsyncClient(base_url=mock_url) as client:
+        response = await client.get("/stats")
+        return response.json()["calls"]
+
+
+async def run_scenario(base_url: str, scenario: str, concurrency: int, total: int, repeat: bool = False,
+                       rounds: int = 3, timeout: float = 300.0, mock_url: Optional[str] = None) -> Dict:
+    """以concurrency个并发用户发送total个请求，返回统计结果"""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    agent_replies = 0
+    counter = iter(range(total))
+
+    async def user():
+        nonlocal agent_replies
+        # 每个并发用户一个客户端，Cookie保存会话ID
+        async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+            for index in counter:
+                path, body = build_request(scenario, index, repeat, rounds)
+                started = time.monotonic()
+                try:
+                    response = await client.post(path, json=body)
+                    status = str(response.status_code)
+                    if response.status_code == 200:
+                        agent_replies += len(response.json().get("responses", []))
+                except httpx.HTTPError as e:
+                    status = e.__class__.__name__
+                latencies.append(time.monotonic() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    calls_before = await _mock_calls(mock_url)
+    started = time.monotonic()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.monotonic() - started
+    calls_after = await _mock_calls(mock_url)
+
+    return {
+        "scenario": scenario,
+        "requests": total,
+        "concurrency": concurrency,
+        "statuses": statuses,
+        "elapsed": elapsed,
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "replies_per_request": agent_replies / total if total else 0.0,
+        "llm_calls_per_request": (calls_after - calls_before) / total if calls_before is not None and total else None,
+    }
+
+
+def format_report(results: List[Dict]) -> str:
+    header = f"{'场景':<12}{'请求数':>8}{'并发':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'LLM调用/请求':>14}{'回复/请求':>10}  状态码"
+    lines = [header, "-" * len(header)]
+    for result in results:
+        calls = result["llm_calls_per_request"]
+        lines.append(
+            f"{result['scenario']:<12}{result['requests']:>8}{result['concurrency']:>6}{result['rps']:>9.2f}"
+            f"{result['p50']:>9.3f}{result['p95']:>9.3f}{result['p99']:>9.3f}"
+            f"{(f'{calls:.2f}' if calls is not None else '-'):>14}{result['replies_per_request']:>10.2f}  {result['statuses']}"
+        )
+    return "\n".join(lines)
+
+
+async def main_async(args):
+    results = []
+    for scenario in args.scenarios.split(","):
+        print(f"运行场景 {scenario} ...")
+        results.append(await run_scenario(
+            args.base_url, scenario.strip(), args.concurrency, args.requests,
+            repeat=args.repeat, rounds=args.rounds, timeout=args.timeout, mock_url=args.mock_url or None
+        ))
+    print(format_report(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多Agent后端的端到端压测")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="后端地址")
+    parser.add_argument("--mock-url", default="http://127.0.0.1:9000", help="模拟服务地址，为空时不统计LLM调用次数")
+    parser.add_argument("--scenarios", default="direct,specified,discussion", help="逗号分隔的场景列表")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发用户数")
+    parser.add_argument("--requests", type=int, default=40, help="每个场景的请求总数")
+    parser.add_argument("--rounds", type=int, default=3, help="讨论场景的最大轮数")
+    parser.add_argument("--repeat", action="store_true", help="重复发送相同内容（测试缓存和请求合并）")
+    parser.add_argument("--timeout", type=float, default=300.0, help="单个请求的超时（秒）")
+    parser.add_argument("--output", default="", help="结果另存为JSON文件")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""本地的OpenAI兼容模拟服务，压测时代替真实的模型服务
+
+只实现 POST /v1/chat/completions（含流式），延迟、输出速度和错误率可配置；
+路由、意图分析等分类调用返回与提示匹配的JSON，其余调用返回确定性的中文文本。
+配置了种子时，相同的请求总是得到相同的延迟、错误和回复。
+
+用法（在backend目录下）:
+    python -m benchmarks.mock_llm_server --port 9000 --latency lognormal:0.8,0.5 --tokens-per-second 40
+    OPENAI_BASE_URL=http://127.0.0.1:9000/v1 OPENAI_API_KEY=mock uvicorn main:app --port 8000
+
+GET /stats 返回按调用类型统计的调用次数，POST /stats/reset 清零。
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.utils.token_budget import count_tokens
+
+AGENT_NAMES = ["顾问", "批评者", "创新者", "协调者"]
+DISCUSSION_WORDS = ["讨论", "商量", "辩论", "一起分析", "各自看法", "达成共识"]
+REJECT_WORDS = ["不要讨论", "不需要讨论", "别讨论"]
+
+# 生成普通回复使用的语句
+_PHRASES = [
+    "从整体来看，这个问题需要分阶段处理。",
+    "首先要明确目标和约束条件。",
+    "现有方案的主要风险在于成本和时间。",
+    "可以先做一个小范围的试点，再根据反馈调整。",
+    "数据表明用户更关心稳定性而不是新功能。",
+    "换一个角度，也许可以把问题拆成两个独立的部分。",
+    "需要注意的是，过早优化可能带来额外的维护负担。",
+    "综合各方观点，建议优先解决影响最大的环节。",
+    "这里还有一个容易被忽视的前提假设。",
+    "如果资源有限，可以先保证核心流程可用。",
+]
+
+
+class LatencyModel:
+    """首个token之前的延迟分布
+
+    支持的格式：fixed:秒、uniform:最小,最大、normal:均值,标准差、lognormal:中位数,sigma
+    """
+
+    def __init__(self, spec: str = "fixed:0.2"):
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(value) for value in params.split(",") if value]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if kind not in expected or len(self.params) != expected[kind]:
+            raise ValueError(f"无法解析的延迟分布: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(*self.params))
+        median, sigma = self.params
+        return rng.lognormvariate(0.0, sigma) * median
+
+
+class MockLLMConfig:
+    def __init__(self, latency: str = "fixed:0.2", tokens_per_second: float = 0.0, reply_tokens: int = 120,
+                 error_rate: float = 0.0, error_status: int = 500, hang_rate: float = 0.0, hang_seconds: float = 120.0,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            latency: 首个token之前的延迟分布，格式见LatencyModel
+            tokens_per_second: 输出速度，为0时不模拟生成耗时
+            reply_tokens: 普通回复的长度（约等于汉字数），不超过请求的max_tokens
+            error_rate: 返回错误状态码的比例
+            error_status: 注入的错误状态码（500、503、429等）
+            hang_rate: 长时间不响应的比例，用于测试客户端超时
+            hang_seconds: 不响应的时长（秒）
+            seed: 随机种子，为None时每次运行结果不同
+        """
+        self.latency = LatencyModel(latency)
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.seed = seed
+
+
+def _user_input(prompt: str) -> str:
+    """从分类提示中取出引用的用户输入"""
+    match = re.search(r'用户(?:输入|消息): "(.*?)"', prompt, re.DOTALL)
+    return match.group(1) if match else prompt
+
+
+def _route_reply(user_input: str) -> Dict:
+    """按关键词给出与真实模型相近的路由结果"""
+    needs_discussion = (any(word in user_input for word in DISCUSSION_WORDS)
+                        and not any(word in user_input for word in REJECT_WORDS))
+    specified = [name for name in AGENT_NAMES if name in user_input]
+    excluded = [name for name in specified if f"{name}不要" in user_input or f"{name}别" in user_input]
+    speak = [name for name in specified if name not in excluded]
+    topic = user_input
+    for word in DISCUSSION_WORDS + ["请大家", "一下", "请"]:
+        topic = topic.replace(word, "")
+    return {
+        "needs_discussion": needs_discussion,
+        "topic": topic.strip("：:，, ") or user_input,
+        "topic_complexity": "中等",
+        "suggested_rounds": 3 if needs_discussion else 0,
+        "specified_agents": speak,
+        "should_speak": speak,
+        "should_not_speak": excluded,
+        "confidence": 0.9,
+        "reason": "模拟服务的关键词判断",
+    }
+
+
+def classify_call(messages: List[Dict]) -> str:
+    """按系统提示判断调用类型，用于选择回复和分类统计"""
+    system = messages[0].get("content", "") if messages else ""
+    if "路由" in system:
+        return "route"
+    if "意图分析" in system:
+        return "intent"
+    if "滚动摘要" in system:
+        return "rolling_summary"
+    if "总结以下" in system:
+        return "discussion_summary"
+    if "重写以下回复" in messages[-1].get("content", ""):
+        return "identity_rewrite"
+    return "agent"
+
+
+def scripted_reply(kind: str, messages: List[Dict], rng: random.Random, reply_tokens: int) -> str:
+    prompt = messages[-1].get("content", "") if messages else ""
+    if kind in ("route", "intent"):
+        return json.dumps(_route_reply(_user_input(prompt)), ensure_ascii=False)
+    parts = []
+    while sum(len(part) for part in parts) < reply_tokens:
+        parts.append(rng.choice(_PHRASES))
+    return "".join(parts)[:reply_tokens]
+
+
+def _request_rng(seed: Optional[int], body: Dict, seen: Counter) -> random.Random:
+    """每个请求独立的随机数生成器
+
+    有种子时由请求内容和该内容第几次出现决定，与其他请求的到达顺序无关；
+    重试的相同请求会得到新的随机结果，注入的错误不会在重试时必然重现。
+    """
+    if seed is None:
+        return random.Random()
+    digest = hashlib.sha256(json.dumps(body, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+    seen[digest] += 1
+    return random.Random(f"{seed}:{digest}:{seen[digest]}")
+
+
+def _split(text: str, size: int = 2) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def create_app(config: MockLLMConfig) -> FastAPI:
+    app = FastAPI(title="Mock LLM")
+    calls: Counter = Counter()
+    errors: Counter = Counter()
+    seen: Counter = Counter()  # 每种请求内容出现的次数
+    started_at = [time.monotonic()]
+
+    def _chunk(model: str, delta: Dict, finish_reason: Optional[str] = None) -> str:
+        payload = {
+            "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model", "mock")
+        kind = classify_call(messages)
+        calls[kind] += 1
+        rng = _request_rng(config.seed, body, seen)
+
+        await asyncio.sleep(config.latency.sample(rng))
+        roll = rng.random()
+        if roll < config.hang_rate:
+            errors["hang"] += 1
+            await asyncio.sleep(config.hang_seconds)
+        elif roll < config.hang_rate + config.error_rate:
+            errors[str(config.error_status)] += 1
+            return JSONResponse(
+                status_code=config.error_status,
+                content={"error": {"message": "模拟服务注入的错误", "type": "mock_error", "code": config.error_status}}
+            )
+
+        text = scripted_reply(kind, messages, rng, min(config.reply_tokens, body.get("max_tokens") or config.reply_tokens))
+        prompt_tokens = sum(count_tokens(str(msg.get("content", ""))) for msg in messages)
+        completion_tokens = count_tokens(text)
+
+        if body.get("stream"):
+            async def events():
+                yield _chunk(model, {"role": "assistant", "content": ""})
+                for piece in _split(text):
+                    if config.tokens_per_second:
+                        await asyncio.sleep(count_tokens(piece) / config.tokens_per_second)
+                    yield _chunk(model, {"content": piece})
+                yield _chunk(model, {}, "stop")
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        if config.tokens_per_second:
+            await asyncio.sleep(completion_tokens / config.tokens_per_second)
+        return {
+            "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {
+            "calls": sum(calls.values()),
+            "by_kind": dict(calls),
+            "errors": dict(errors),
+            "uptime": time.monotonic() - started_at[0],
+        }
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        calls.clear()
+        errors.clear()
+        started_at[0] = time.monotonic()
+        return {"ok": True}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地的OpenAI兼容模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", default="fixed:0.2", help="首个token前的延迟分布，如 lognormal:0.8,0.5")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="输出速度，为0时不模拟生成耗时")
+    parser.add_argument("--reply-tokens", type=int, default=120, help="普通回复的长度")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回错误状态码的比例")
+    parser.add_argument("--error-status", type=int, default=500, help="注入的错误状态码")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="长时间不响应的比例")
+    parser.add_argument("--hang-seconds", type=float, default=120.0, help="不响应的时长（秒）")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子，配置后结果可复现")
+    args = parser.parse_args()
+
+    import uvicorn
+    config = MockLLMConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
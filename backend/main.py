@@ -2,6 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import chat
 from app.core.config import settings
+from app.utils.openai_client import close_openai_client
 
 app = FastAPI(title="Multi-Agent Chat API")
 
@@ -12,11 +13,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[settings.SESSION_HEADER],  # 允许前端读取会话ID
 )
 
 # 包含路由
 app.include_router(chat.router, prefix="/api")
 
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # 关闭共享的LLM连接池
+    await close_openai_client()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -9,7 +9,7 @@ load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
 print(f"API密钥长度: {len(api_key) if api_key else 0}")
 
-client = OpenAI(api_key=api_key)
+client = OpenAI(api_key=api_key, base_url=os.getenv("OPENAI_BASE_URL") or None)
 
 try:
     response = client.chat.completions.create(
@@ -0,0 +1,6 @@
+import os
+
+# 测试不访问真实的模型服务，也不写入对话数据库；需在导入app.core.config之前设置
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["CONVERSATION_DB_PATH"] = ""
+os.environ["COMPLETION_CACHE_PATH"] = ""
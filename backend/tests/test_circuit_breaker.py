@@ -0,0 +1,89 @@
+import logging
+import time
+from app.utils.circuit_breaker import CircuitBreaker, CircuitState
+
+
+def _breaker(**kwargs):
+    options = dict(failure_rate=0.5, slow_call_seconds=1.0, slow_call_rate=0.8, window=4, min_calls=4,
+                   open_seconds=0.05, half_open_calls=2)
+    options.update(kwargs)
+    return CircuitBreaker(**options)
+
+
+def test_failures_open_then_half_open_probes_close(caplog):
+    breaker = _breaker()
+    caplog.set_level(logging.INFO, logger="app.utils.circuit_breaker")
+    for _ in range(2):
+        breaker.record_success(0.1)
+    breaker.record_failure()
+    assert breaker.state is CircuitState.CLOSED  # 样本不足
+    breaker.record_failure()
+    assert breaker.state is CircuitState.OPEN
+    assert not breaker.allow_request()
+    assert breaker.retry_after() > 0
+    assert breaker.get_stats()["rejected"] == 1
+
+    time.sleep(0.06)
+    assert breaker.state is CircuitState.HALF_OPEN
+    assert breaker.allow_request() and breaker.allow_request()
+    assert not breaker.allow_request()  # 探测调用数已满
+    breaker.record_success(0.1)
+    assert breaker.state is CircuitState.HALF_OPEN
+    breaker.record_success(0.1)
+    assert breaker.state is CircuitState.CLOSED
+    assert breaker.opens == 1
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert any("熔断" in message and "秒" in message for message in messages)
+    assert any("半开" in message for message in messages)
+    assert any("恢复" in message for message in messages)
+
+
+def test_slow_calls_open_the_breaker():
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record_success(2.0)
+    assert breaker.state is CircuitState.CLOSED
+    breaker.record_success(2.0)
+    assert breaker.state is CircuitState.OPEN
+
+
+def test_failed_or_slow_probe_reopens():
+    breaker = _breaker(min_calls=1, window=1)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state is CircuitState.OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_success(2.0)  # 探测调用过慢
+    assert breaker.state is CircuitState.OPEN
+    assert breaker.opens == 3
+
+
+def test_released_probe_frees_its_slot():
+    breaker = _breaker(min_calls=1, window=1, half_open_calls=1)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.release()
+    assert breaker.allow_request()
+
+
+def test_cancelled_calls_count_only_when_slow():
+    breaker = _breaker(min_calls=2)
+    breaker.record_cancelled(0.1)
+    breaker.record_cancelled(0.2)
+    assert breaker.state is CircuitState.CLOSED
+    assert breaker.get_stats()["failure_rate"] == 0.0  # 很快被取消的调用不计入
+    breaker.record_cancelled(1.5)
+    breaker.record_cancelled(2.0)
+    assert breaker.state is CircuitState.OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_cancelled(1.0)
+    assert breaker.state is CircuitState.OPEN
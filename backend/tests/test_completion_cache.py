@@ -0,0 +1,78 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from app.utils.completion_cache import CompletionCache
+
+
+def test_make_key_normalizes_whitespace():
+    messages = [{"role": "user", "content": "你好  世界"}]
+    same = [{"role": "user", "content": " 你好 世界 "}]
+    assert CompletionCache.make_key("m", 0.0, 10, messages) == CompletionCache.make_key("m", 0.0, 10, same)
+    assert CompletionCache.make_key("m", 0.0, 10, messages) != CompletionCache.make_key("m", 0.5, 10, messages)
+
+
+def test_memory_lru_and_ttl():
+    cache = CompletionCache(max_entries=2, ttl_seconds=0.05)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")  # 淘汰最久未使用的b
+    assert cache.get("b") is None
+    assert cache.evictions == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = CompletionCache(path=path)
+    cache.set("k", "v")
+    cache.close()
+
+    reopened = CompletionCache(path=path)
+    assert reopened.get("k") == "v"
+    assert reopened.get_stats()["persistent"] is True
+    reopened.close()
+
+
+def test_async_get_reads_disk_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = CompletionCache(path=path)
+    cache.set("k", "v")
+    cache.close()
+
+    reopened = CompletionCache(path=path)
+    load_from_disk = reopened._load_from_disk
+    threads = []
+
+    def tracking_load(key):
+        threads.append(threading.current_thread())
+        return load_from_disk(key)
+
+    reopened._load_from_disk = tracking_load
+
+    async def lookup():
+        return await reopened.aget("k"), await reopened.aget("k"), await reopened.aget("missing")
+
+    assert asyncio.run(lookup()) == ("v", "v", None)
+    assert len(threads) == 2  # 第二次读取命中内存
+    assert all(thread is not threading.main_thread() for thread in threads)
+    assert reopened.get_stats()["hits"] == 2 and reopened.get_stats()["misses"] == 1
+    reopened.close()
+
+
+def test_expired_disk_rows_are_purged_on_startup(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = CompletionCache(ttl_seconds=60, path=path)
+    cache.set("fresh", "v")
+    cache.flush()
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO completion_cache (key, value, created_at) VALUES ('old', 'v', ?)", (time.time() - 120,))
+    cache.close()
+
+    reopened = CompletionCache(ttl_seconds=60, path=path)
+    with sqlite3.connect(path) as conn:
+        keys = [key for (key,) in conn.execute("SELECT key FROM completion_cache")]
+    assert keys == ["fresh"]
+    reopened.close()
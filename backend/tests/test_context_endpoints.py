@@ -0,0 +1,105 @@
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client():
+    # 这里的接口不调用LLM：在测试中才导入应用，让test_ws_channel先替换共享客户端；
+    # 也不触发应用的关闭事件，以免关闭其他测试共用的客户端
+    import main
+    return TestClient(main.app)
+
+
+def _session(client):
+    """新建会话并写入消息：序号1-4为普通对话，5-7为讨论（7为讨论总结）"""
+    from app.routers.chat import session_store
+    session_id = client.get("/api/context", params={"summary_only": True}).headers["X-Session-Id"]
+    manager = session_store.get(session_id).agent_manager
+    advisor, critic = manager.agents[0], manager.agents[1]
+    manager.add_user_message("怎么提高团队效率？")
+    manager.add_agent_message(advisor, "先明确目标")
+    manager.add_agent_message(critic, "目标容易流于形式")
+    manager.add_user_message("请大家讨论一下")
+    manager.add_agent_message(advisor, "建议每周复盘", round_num=1)
+    manager.add_agent_message(critic, "复盘成本偏高", round_num=1)
+    manager.add_agent_message(advisor, "总结：先试点复盘", is_summary=True)
+    return session_id, manager
+
+
+def _get(client, session_id, path, **params):
+    response = client.get(f"/api{path}", params=params, headers={"X-Session-Id": session_id})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_context_pages_with_limit_and_clips_private_contexts(client):
+    session_id, _ = _session(client)
+    seen = []
+    since = 0
+    while True:
+        page = _get(client, session_id, "/context", since=since, limit=3)
+        seqs = [message["seq"] for message in page["global_context"]]
+        assert page["cursor"] == seqs[-1]
+        for agent in page["agents"].values():
+            assert all(since < message["seq"] <= page["cursor"] for message in agent["private_context"])
+        seen += seqs
+        since = page["cursor"]
+        if not page["has_more"]:
+            break
+    assert seen == list(range(1, 8))
+
+    advisor = _get(client, session_id, "/context", since=1, limit=3)["agents"]["顾问"]
+    assert [message["seq"] for message in advisor["private_context"]] == [2, 4]  # 用户消息和自己的回复
+    assert advisor["private_context_length"] == 5
+
+
+def test_empty_page_keeps_cursor(client):
+    session_id, manager = _session(client)
+    page = _get(client, session_id, "/context", since=7, limit=2)
+    assert page["global_context"] == [] and page["cursor"] == 7 and not page["has_more"]
+    assert all(agent["private_context"] == [] for agent in page["agents"].values())
+
+    manager.add_user_message("还有别的想法吗？")
+    status = _get(client, session_id, "/discussion/status", since=7)
+    assert status["discussion_messages"] == []
+    assert status["cursor"] == 8  # 跳过之后的非讨论消息，下次不必重新扫描
+    assert not status["has_more"]
+
+
+def test_truncation_after_trim(client):
+    session_id, manager = _session(client)
+    manager.global_context.trim(3)
+
+    page = _get(client, session_id, "/context", since=2, limit=2)
+    assert page["truncated"] and page["first_seq"] == 5
+    assert [message["seq"] for message in page["global_context"]] == [5, 6]
+    assert page["cursor"] == 6 and page["has_more"]
+
+    page = _get(client, session_id, "/context", since=page["cursor"], limit=2)
+    assert not page["truncated"]
+    assert [message["seq"] for message in page["global_context"]] == [7]
+    assert page["cursor"] == 7 and not page["has_more"]
+
+
+def test_discussion_status_pages_discussion_messages_only(client):
+    session_id, _ = _session(client)
+    page = _get(client, session_id, "/discussion/status", limit=2)
+    assert page["discussion_count"] == 3
+    assert [message["seq"] for message in page["discussion_messages"]] == [5, 6]
+    assert page["cursor"] == 6 and page["has_more"]
+    page = _get(client, session_id, "/discussion/status", since=6, limit=2)
+    assert [message["seq"] for message in page["discussion_messages"]] == [7]
+    assert not page["has_more"]
+
+
+def test_summary_only_returns_counts(client):
+    session_id, _ = _session(client)
+    context = _get(client, session_id, "/context", summary_only=True)
+    assert "global_context" not in context and "cursor" not in context
+    assert context["counts"]["total"] == 7 and context["counts"]["discussion"] == 3
+    assert context["counts"]["by_role"] == {"user": 2, "assistant": 5}
+    assert context["agents"]["顾问"] == {"private_context_length": 5}
+
+    status = _get(client, session_id, "/discussion/status", summary_only=True)
+    assert "discussion_messages" not in status
+    assert status["counts"] == {"total": 3, "by_agent": {"顾问": 1, "批评者": 1}, "by_round": {"1": 2}, "summaries": 1}
@@ -0,0 +1,11 @@
+from app.utils.convergence import ConvergenceDetector
+
+
+def test_convergence_detector():
+    detector = ConvergenceDetector(threshold=0.6)
+    previous = ["远程办公可以节省通勤时间"]
+    assert detector.has_converged(previous, ["远程办公可以节省通勤时间。"])
+    assert not detector.has_converged(previous, ["数据安全是更大的风险"])
+    assert not ConvergenceDetector(threshold=0).has_converged(previous, previous)
+    detector.record_early_stop(rounds_saved=2, tokens_per_round=100)
+    assert (detector.early_stops, detector.rounds_saved, detector.tokens_saved) == (1, 2, 200)
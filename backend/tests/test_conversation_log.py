@@ -0,0 +1,71 @@
+from app.agents.advisor_agent import AdvisorAgent
+from app.models.conversation_log import ConversationLog, Message
+
+
+def _discussion_log():
+    log = ConversationLog()
+    log.append(Message("user", "讨论远程办公"))
+    for round_num in (1, 2):
+        for name in ("顾问", "批评者"):
+            log.append(Message("assistant", f"{name}第{round_num}轮", name=name,
+                               is_discussion=True, discussion_round=round_num))
+    log.append(Message("assistant", "总结", name="协调者", is_discussion=True, is_summary=True))
+    return log
+
+
+def test_indexes_and_queries():
+    log = _discussion_log()
+    assert len(log) == 6 and log.next_seq == 7
+    assert log.latest_user_message().content == "讨论远程办公"
+    assert [m.content for m in log.by_agent("顾问")] == ["顾问第1轮", "顾问第2轮"]
+    assert [m.content for m in log.round_messages(2)] == ["顾问第2轮", "批评者第2轮"]
+    assert log.has_round_responses(1, since_seq=1)
+    assert not log.has_round_responses(1, since_seq=3)
+    assert [m.seq for m in log.since(4)] == [5, 6]
+    assert log.discussion_counts() == {
+        "total": 5, "by_agent": {"顾问": 2, "批评者": 2}, "by_round": {1: 2, 2: 2}, "summaries": 1,
+    }
+
+
+def test_page_cursor():
+    log = _discussion_log()
+    first, more = log.page(since=0, limit=4)
+    assert [m.seq for m in first] == [1, 2, 3, 4] and more
+    rest, more = log.page(since=first[-1].seq, limit=4)
+    assert [m.seq for m in rest] == [5, 6] and not more
+    discussion, _ = log.page(discussion_only=True, limit=2)
+    assert [m.seq for m in discussion] == [2, 3]
+
+
+def test_trim_keeps_indexes_consistent():
+    log = _discussion_log()
+    log.trim(3)
+    assert [m.seq for m in log] == [4, 5, 6]
+    assert log.first_seq == 4
+    assert log.latest_user_message() is None
+    assert log.round_messages(1) == []
+    assert log.discussion_counts()["by_agent"] == {"批评者": 1, "顾问": 1}
+    # 序号继续递增
+    assert log.append(Message("user", "新问题")).seq == 7
+
+
+def test_roundtrip_through_dict():
+    log = _discussion_log()
+    restored = ConversationLog([Message.from_dict(data) for data in reversed(log.to_list())])
+    assert restored.to_list() == log.to_list()
+    assert restored.next_seq == log.next_seq
+
+
+def test_private_context_is_a_view_over_the_log():
+    agent = AdvisorAgent(openai_client=object())
+    log = _discussion_log()
+    agent.projection.rebuild(log)
+    log.subscribe(agent.projection.observe)
+    log.append(Message("assistant", "直接回复", name="顾问"))
+    log.append(Message("assistant", "别人的回复", name="批评者"))
+
+    contents = [m.content for m in agent.private_context]
+    assert contents == ["讨论远程办公", "顾问第1轮", "顾问第2轮", "直接回复"]
+    # 视图中的消息就是日志中的同一对象，没有复制
+    assert agent.private_context[-1] is log.by_agent("顾问")[-1]
+    assert [line.line for line in agent.projection.discussion][-1] == "协调者: 总结"
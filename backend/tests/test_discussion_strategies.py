@@ -0,0 +1,68 @@
+import asyncio
+from app.utils.discussion_strategies import PipelinedDiscussionStrategy
+
+
+class FakeAgent:
+    """按固定延迟发言的Agent，on_reply在每次生成完成时调用"""
+
+    def __init__(self, name, delay=0.01, on_reply=None):
+        self.name = name
+        self.delay = delay
+        self.on_reply = on_reply
+
+    async def should_respond_in_discussion(self, global_context, round_num):
+        return True
+
+    async def generate_discussion_response(self, global_context, round_num, on_token=None):
+        await asyncio.sleep(self.delay)
+        if self.on_reply:
+            self.on_reply()
+        return f"{self.name}第{round_num}轮的发言"
+
+
+def test_pipelined_runs_all_rounds():
+    agents = [FakeAgent(name) for name in ("甲", "乙", "丙")]
+    strategy = PipelinedDiscussionStrategy(agents, max_rounds=3, quorum=0.5, agent_timeout=5)
+    committed = []
+
+    async def commit(response):
+        committed.append((response["agent_name"], response["round"]))
+
+    asyncio.run(strategy.run([], commit))
+    assert len(committed) == 9
+    assert strategy.current_round == 3
+
+
+def test_pipelined_does_not_commit_after_cancel():
+    async def scenario():
+        state = {"cancelled": False, "late": []}
+        committed = []
+        task = None
+
+        def cancel_when_turn_completes():
+            # 在发言恰好完成的时刻取消：wait_for此时可能丢失取消
+            if not state["cancelled"]:
+                state["cancelled"] = True
+                task.cancel()
+
+        agents = [FakeAgent(name, on_reply=cancel_when_turn_completes) for name in ("甲", "乙", "丙", "丁")]
+        strategy = PipelinedDiscussionStrategy(agents, max_rounds=3, quorum=0.5, agent_timeout=5)
+
+        async def commit(response):
+            if state["cancelled"]:
+                state["late"].append(response)
+            committed.append(response)
+
+        task = asyncio.create_task(strategy.run([], commit))
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        assert task.cancelled()
+        committed_at_return = len(committed)
+        await asyncio.sleep(0.1)
+        return state["late"], committed_at_return, len(committed)
+
+    late, committed_at_return, committed_later = asyncio.run(scenario())
+    assert late == []
+    assert committed_later == committed_at_return
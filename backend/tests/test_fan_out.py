@@ -0,0 +1,71 @@
+import asyncio
+from app.utils.fan_out import Deadline, fan_out
+
+
+async def _reply(value, delay=0.0):
+    await asyncio.sleep(delay)
+    return value
+
+
+async def _fail():
+    raise RuntimeError("boom")
+
+
+def test_fan_out_collects_results_timeouts_and_failures():
+    async def scenario():
+        deadline = Deadline()
+        result = await fan_out(
+            [("甲", _reply("a")), ("乙", _reply("b", delay=1)), ("丙", _fail()), ("丁", _reply(None))],
+            agent_timeout=0.05,
+            deadline=deadline
+        )
+        return result, deadline
+
+    result, deadline = asyncio.run(scenario())
+    assert result.results == [("甲", "a")]
+    assert result.timed_out == ["乙"]
+    assert result.failed == ["丙"]
+    assert deadline.timed_out_agents == ["乙"]
+    assert deadline.failed_agents == ["丙"]
+
+
+def test_fan_out_request_deadline_cancels_slow_jobs():
+    async def scenario():
+        deadline = Deadline(0.05)
+        result = await fan_out([("甲", _reply("a")), ("乙", _reply("b", delay=1))], deadline=deadline)
+        return result, deadline
+
+    result, deadline = asyncio.run(scenario())
+    assert result.results == [("甲", "a")]
+    assert result.timed_out == ["乙"]
+    assert deadline.expired()
+
+
+def test_cancelled_fan_out_leaves_no_commits_behind():
+    async def scenario():
+        deadline = Deadline()
+        committed = []
+        returned = asyncio.Event()
+
+        async def job(name):
+            # 与AgentManager._process_agent_response相同：生成完成后检查请求是否已结束再提交
+            await asyncio.sleep(0.02 if name == "甲" else 0.2)
+            await asyncio.sleep(0)
+            if not deadline.expired():
+                committed.append((name, returned.is_set()))
+            return name
+
+        task = asyncio.create_task(fan_out([(name, job(name)) for name in ("甲", "乙", "丙")], 5, deadline))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        returned.set()
+        await asyncio.sleep(0.3)
+        return committed, deadline
+
+    committed, deadline = asyncio.run(scenario())
+    assert deadline.cancelled
+    assert committed == [("甲", False)]
@@ -0,0 +1,81 @@
+import asyncio
+from app.agents.agent_manager import AgentManager
+from app.utils import identity_guard
+from app.utils.identity_guard import IdentityGuard
+from app.utils.llm_errors import LLMServerError
+
+NAMES = ("顾问", "批评者", "创新者", "协调者")
+
+
+class FakeClient:
+    """按顺序返回预设的重写结果，结果为异常时抛出"""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    async def generate_completion(self, messages, **kwargs):
+        self.calls.append(messages)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+def _correct(client, agent_index, content):
+    manager = AgentManager(openai_client=client)
+    return asyncio.run(manager._correct_identity(manager.agents[agent_index], content))
+
+
+def test_single_wrong_name_is_rewritten_locally():
+    guard = IdentityGuard(NAMES)
+    text = "作为批评者，我认为这个方案风险很大。"
+    assert guard.find_wrong_identities(text, "顾问") == ["批评者"]
+    assert guard.rewrite_locally(text, "顾问") == "作为顾问，我认为这个方案风险很大。"
+
+
+def test_own_name_is_left_alone():
+    guard = IdentityGuard(NAMES)
+    text = "我是顾问，作为顾问我建议先做调研。"
+    assert guard.find_wrong_identities(text, "顾问") == []
+    assert guard.rewrite_locally(text, "顾问") == text
+
+
+def test_longer_name_wins_over_prefix():
+    guard = IdentityGuard(("顾问", "顾问助理"))
+    text = "作为顾问助理，我补充一点。"
+    assert guard.find_wrong_identities(text, "顾问") == ["顾问助理"]
+    assert guard.rewrite_locally(text, "顾问") == "作为顾问，我补充一点。"
+
+
+def test_single_wrong_name_does_not_call_llm():
+    client = FakeClient()
+    assert _correct(client, 0, "我是创新者，提一个新点子。") == "我是顾问，提一个新点子。"
+    assert client.calls == []
+
+
+def test_several_wrong_names_use_llm_rewrite():
+    before = identity_guard.get_stats()
+    client = FakeClient("我建议先小范围试点。")
+    assert _correct(client, 0, "作为批评者我反对，作为创新者我支持。") == "我建议先小范围试点。"
+    assert len(client.calls) == 1
+
+    stats = identity_guard.get_stats()
+    assert stats["llm_rewrites"] == before["llm_rewrites"] + 1
+    assert stats["checked"] >= before["checked"] + 2  # 原回复和重写结果各检查一次
+
+
+def test_failed_llm_rewrite_falls_back_to_local_rewrite():
+    before = identity_guard.get_stats()
+    client = FakeClient(LLMServerError("upstream error", 503))
+    content = _correct(client, 0, "作为批评者我反对，作为创新者我支持。")
+    assert content == "作为顾问我反对，作为顾问我支持。"
+
+    stats = identity_guard.get_stats()
+    assert stats["llm_rewrite_failures"] == before["llm_rewrite_failures"] + 1
+    assert stats["local_rewrites"] == before["local_rewrites"] + 1
+
+
+def test_rewrite_with_remaining_wrong_names_is_fixed_locally():
+    client = FakeClient("作为批评者，我还是建议先试点。")
+    assert _correct(client, 0, "作为批评者我反对，作为创新者我支持。") == "作为顾问，我还是建议先试点。"
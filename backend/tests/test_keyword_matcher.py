@@ -0,0 +1,25 @@
+from app.utils.keyword_matcher import KeywordMatcher
+
+
+def test_finds_overlapping_keywords_with_labels():
+    matcher = KeywordMatcher({"discussion": ["讨论", "你们讨论"], "agent:顾问": ["顾问"]})
+    matches = matcher.find_all("请顾问和你们讨论一下")
+    assert (1, "顾问", "agent:顾问") in matches
+    assert (4, "你们讨论", "discussion") in matches
+    assert (6, "讨论", "discussion") in matches
+    assert matcher.match_labels("请顾问和你们讨论一下") == {"discussion", "agent:顾问"}
+
+
+def test_same_keyword_in_several_groups():
+    matcher = KeywordMatcher({"a": ["商量"], "b": ["商量", "一下"]})
+    assert sorted(label for _, _, label in matcher.find_all("商量")) == ["a", "b"]
+
+
+def test_suffix_outputs_follow_fail_links():
+    # 匹配到"者不要"之后，需经失败指针转到"不要"才能继续匹配出"不要说话"
+    matcher = KeywordMatcher({"silence": ["不要说话"], "agent": ["批评者", "者不要"]})
+    labels = [(pos, keyword) for pos, keyword, _ in matcher.find_all("批评者不要说话")]
+    assert (0, "批评者") in labels
+    assert (2, "者不要") in labels
+    assert (3, "不要说话") in labels
+    assert matcher.find_all("") == []
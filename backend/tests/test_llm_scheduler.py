@@ -0,0 +1,103 @@
+import asyncio
+from app.utils.llm_scheduler import LLMScheduler, Priority, TokenBucket, llm_session
+
+
+async def _hold(scheduler, order, label, priority=Priority.INTERACTIVE, session="", hold=0.01):
+    llm_session.set(session)
+    async with scheduler.slot(priority):
+        order.append(label)
+        await asyncio.sleep(hold)
+
+
+def test_concurrency_limit():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=2)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            async with scheduler.slot():
+                peak = max(peak, scheduler.get_stats()["active"])
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        return peak, scheduler.get_stats()
+
+    peak, stats = asyncio.run(scenario())
+    assert peak == 2
+    assert stats["active"] == 0
+    assert stats["priorities"]["interactive"]["granted"] == 6
+
+
+def test_higher_priority_goes_first():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        order = []
+        blocker = asyncio.create_task(_hold(scheduler, order, "blocker", hold=0.05))
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(_hold(scheduler, order, "background", Priority.BACKGROUND)),
+            asyncio.create_task(_hold(scheduler, order, "discussion", Priority.DISCUSSION)),
+            asyncio.create_task(_hold(scheduler, order, "interactive", Priority.INTERACTIVE)),
+        ]
+        await asyncio.gather(blocker, *tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["blocker", "interactive", "discussion", "background"]
+
+
+def test_sessions_take_turns_within_a_priority():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        order = []
+        blocker = asyncio.create_task(_hold(scheduler, order, "blocker", hold=0.05))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(_hold(scheduler, order, f"a{i}", Priority.DISCUSSION, "a")) for i in range(3)]
+        tasks += [asyncio.create_task(_hold(scheduler, order, "b0", Priority.DISCUSSION, "b"))]
+        await asyncio.gather(blocker, *tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["blocker", "a0", "b0", "a1", "a2"]
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        order = []
+        blocker = asyncio.create_task(_hold(scheduler, order, "blocker", hold=0.05))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(_hold(scheduler, order, "cancelled"))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.gather(blocker, waiting, return_exceptions=True)
+        await _hold(scheduler, order, "after")
+        return order, scheduler.get_stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["blocker", "after"]
+    assert stats["active"] == 0
+    assert stats["priorities"]["interactive"]["queue_depth"] == 0
+
+
+def test_rate_limit_delays_calls():
+    async def scenario():
+        # 每分钟600次，即每0.1秒补充一个令牌；初始令牌用完后下一次调用需要等待
+        scheduler = LLMScheduler(max_concurrency=10, rpm_limit=600)
+        scheduler.request_bucket.tokens = 1
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(_hold(scheduler, [], "1", hold=0), _hold(scheduler, [], "2", hold=0))
+        return loop.time() - started, scheduler.rate_limited
+
+    elapsed, rate_limited = asyncio.run(scenario())
+    assert elapsed >= 0.08
+    assert rate_limited == 1
+
+
+def test_token_bucket():
+    bucket = TokenBucket(60)
+    assert bucket.wait_time(10) == 0
+    bucket.consume(60)
+    assert 9 < bucket.wait_time(10) <= 10
+    # 超过容量的请求按容量计算，不会永远等待
+    assert bucket.wait_time(1000) <= 60
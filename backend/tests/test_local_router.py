@@ -0,0 +1,48 @@
+from app.utils.local_router import LocalIntentRouter
+
+AGENTS = ["顾问", "批评者", "创新者", "协调者"]
+
+
+def route(text):
+    return LocalIntentRouter().route(text, AGENTS)
+
+
+def test_single_silenced_agent():
+    result = route("批评者不要说话")
+    assert result["should_not_speak"] == ["批评者"]
+    assert result["confidence"] >= 0.8
+
+
+def test_silence_with_gap():
+    assert route("批评者就不要说话了")["should_not_speak"] == ["批评者"]
+
+
+def test_listed_agents_share_the_silence_marker():
+    assert route("批评者和创新者不要说话")["should_not_speak"] == ["批评者", "创新者"]
+    assert route("批评者、创新者与协调者都别说话")["should_not_speak"] == ["批评者", "创新者", "协调者"]
+    assert route("批评者，创新者不要回答")["should_not_speak"] == ["批评者", "创新者"]
+    assert route("批评者创新者闭嘴")["should_not_speak"] == ["批评者", "创新者"]
+
+
+def test_mention_outside_the_list_is_not_silenced():
+    result = route("批评者说得对，创新者不要说话")
+    assert result["should_not_speak"] == ["创新者"]
+
+
+def test_negated_mention_is_left_to_the_llm():
+    # "除了顾问"表示其他人不要说话，本地无法可靠判断
+    router = LocalIntentRouter()
+    result = router.route("除了顾问，其他人都不要说话", AGENTS)
+    assert "顾问" not in result["should_not_speak"]
+    assert router.try_route("除了顾问，其他人都不要说话", AGENTS) is None
+
+
+def test_only_marker_with_listed_agents():
+    result = route("只有顾问和创新者回答，批评者不要说话")
+    assert result["specified_agents"] == ["顾问", "创新者"]
+    assert result["should_not_speak"] == ["批评者", "协调者"]
+
+
+def test_discussion_requests():
+    assert route("你们讨论一下这个方案")["needs_discussion"] is True
+    assert route("不要讨论，直接回答")["needs_discussion"] is False
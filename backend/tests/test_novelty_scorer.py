@@ -0,0 +1,22 @@
+from app.utils.novelty_scorer import NoveltyScorer, char_ngrams
+
+
+def test_char_ngrams_ignore_punctuation():
+    assert char_ngrams("远程，办公！") == char_ngrams("远程办公")
+    assert sum(char_ngrams("远程办公").values()) == 3
+
+
+def test_novelty_bounds():
+    scorer = NoveltyScorer()
+    assert scorer.novelty([], ["任何内容"]) == 0.0
+    assert scorer.novelty(["任何内容"], []) == 1.0
+    assert scorer.novelty(["远程办公提高效率"], ["远程办公提高效率"]) < 0.01
+
+
+def test_new_content_scores_higher_than_repetition():
+    scorer = NoveltyScorer()
+    seen = ["远程办公可以节省通勤时间", "远程办公需要更好的沟通工具"]
+    repeated = scorer.novelty(["远程办公可以节省通勤时间和沟通工具"], seen)
+    novel = scorer.novelty(["数据安全和合规审计是更大的风险"], seen)
+    assert novel > repeated
+
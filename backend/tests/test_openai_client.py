@@ -0,0 +1,151 @@
+import asyncio
+import json
+import time
+import httpx
+import pytest
+import app.utils.openai_client as openai_client
+from app.core.config import settings
+from app.utils.circuit_breaker import CircuitBreaker, CircuitState
+from app.utils.fan_out import fan_out
+from app.utils.llm_errors import LLMConnectionError, LLMRequestError
+from app.utils.openai_client import OpenAIClient, create_http_client
+
+
+def _client(handler, **kwargs):
+    return OpenAIClient(http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)), **kwargs)
+
+
+def _messages(text):
+    return [{"role": "user", "content": text}]
+
+
+def _completion(text):
+    return httpx.Response(200, json={
+        "id": "x", "object": "chat.completion", "created": 0, "model": "m",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+    })
+
+
+def _chunk(text):
+    chunk = {"id": "x", "object": "chat.completion.chunk", "created": 0, "model": "m",
+             "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]}
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode()
+
+
+def _run(client, **kwargs):
+    async def run():
+        try:
+            return await client.generate_completion(_messages("你好"), **kwargs)
+        finally:
+            await client.close()
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 2)
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0.01)
+
+
+def test_request_timeout_leaves_room_for_retries():
+    timeout = create_http_client().timeout
+    assert timeout.read * (settings.LLM_MAX_RETRIES + 1) <= settings.AGENT_RESPONSE_TIMEOUT
+
+
+def test_retryable_errors_are_retried_with_backoff(monkeypatch):
+    calls = []
+    bounds = []
+    monkeypatch.setattr(openai_client.random, "uniform", lambda low, high: bounds.append(high) or high)
+
+    def handler(request):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise httpx.ReadTimeout("timed out", request=request)
+        if len(calls) == 2:
+            return httpx.Response(503, json={"error": {"message": "busy"}})
+        return _completion("好的")
+
+    client = _client(handler)
+    assert _run(client) == "好的"
+    assert len(calls) == 3
+    assert client.retries == 2
+    assert bounds == [0.01, 0.02]  # 退避上限按2的幂增长
+    assert calls[2] - calls[1] >= 0.02
+    assert client.breaker.get_stats()["failure_rate"] > 0
+
+
+def test_client_errors_are_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400, json={"error": {"message": "bad request"}})
+
+    client = _client(handler)
+    with pytest.raises(LLMRequestError):
+        _run(client)
+    assert len(calls) == 1
+    assert client.retries == 0
+    assert client.breaker.get_stats()["failure_rate"] == 0.0  # 请求本身的错误不计入熔断
+
+
+def test_no_retry_after_tokens_were_streamed():
+    calls = []
+
+    async def broken_stream():
+        yield _chunk("前半句")
+        raise httpx.ReadError("connection reset")
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, content=broken_stream(), headers={"content-type": "text/event-stream"})
+
+    tokens = []
+
+    async def on_token(text):
+        tokens.append(text)
+
+    client = _client(handler)
+    with pytest.raises(LLMConnectionError):
+        _run(client, on_token=on_token)
+    assert len(calls) == 1
+    assert tokens == ["前半句"]
+
+
+def test_slow_call_is_hedged_and_faster_reply_wins(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGING", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_SAMPLES", 1)
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            await asyncio.sleep(5)
+            return _completion("慢")
+        return _completion("快")
+
+    client = _client(handler)
+    client.latency.add(0.05)
+    started = time.monotonic()
+    assert _run(client) == "快"
+    assert time.monotonic() - started < 2
+    assert len(calls) == 2
+    assert client.hedged == 1 and client.hedge_wins == 1
+
+
+def test_hung_calls_cancelled_by_agent_timeout_open_breaker():
+    async def hang(request):
+        await asyncio.sleep(3600)
+
+    breaker = CircuitBreaker(slow_call_seconds=0.1, min_calls=2, open_seconds=60)
+    client = _client(hang, breaker=breaker)
+
+    async def run():
+        jobs = [(f"agent{i}", client.generate_completion(_messages(f"问题{i}"))) for i in range(6)]
+        result = await fan_out(jobs, agent_timeout=0.3)
+        await client.close()
+        return result
+
+    result = asyncio.run(run())
+    assert len(result.timed_out) == 6
+    assert breaker.state is CircuitState.OPEN
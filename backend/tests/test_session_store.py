@@ -0,0 +1,101 @@
+import asyncio
+import time
+from app.agents.agent_manager import AgentManager
+from app.utils.conversation_store import ConversationStore
+from app.utils.session_store import Session, SessionStore
+
+
+def _store_factory(store, restores):
+    def factory(session_id):
+        agent_manager = AgentManager(openai_client=object(), session_id=session_id, store=store)
+        original = agent_manager.restore
+
+        async def counting_restore():
+            restores.append(session_id)
+            await original()
+
+        agent_manager.restore = counting_restore
+        return Session(session_id, agent_manager, None)
+    return factory
+
+
+def test_sessions_are_isolated_and_evicted_lru():
+    sessions = SessionStore(lambda session_id: Session(session_id, None, None), max_sessions=2)
+    first = sessions.get_or_create("a")
+    assert sessions.get_or_create("a") is first
+    sessions.get_or_create("b")
+    sessions.get_or_create("a")  # a变为最近访问
+    sessions.get_or_create("c")
+    assert sessions.get("b") is None
+    assert sessions.get("a") is first
+    assert sessions.get_stats() == {"active": 2, "created": 3, "evicted": 1}
+
+
+def test_generated_session_is_not_restored(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.db"))
+    restores = []
+    sessions = SessionStore(_store_factory(store, restores))
+    session = sessions.get_or_create(None)
+    asyncio.run(session.restore())
+    assert restores == []
+    assert not session.needs_restore
+    store.close()
+
+
+def test_evicted_session_is_restored_from_store(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.db"))
+    restores = []
+    sessions = SessionStore(_store_factory(store, restores), max_sessions=1)
+
+    async def scenario():
+        session = sessions.get_or_create("s1")
+        await session.restore()
+        session.agent_manager.add_user_message("你好")
+        session.agent_manager.add_user_message("再见")
+        sessions.get_or_create("s2")  # 淘汰s1，其写入可能仍在排队
+        restored = sessions.get_or_create("s1")
+        assert restored is not session
+        # 同时到达的请求共享同一次恢复
+        await asyncio.gather(restored.restore(), restored.restore())
+        return restored
+
+    restored = asyncio.run(scenario())
+    assert restores == ["s1", "s1"]
+    assert [msg.content for msg in restored.agent_manager.global_context] == ["你好", "再见"]
+    # 恢复后的上下文仍会增量更新各Agent的投影
+    restored.agent_manager.add_user_message("还在吗")
+    assert restored.agent_manager.agents[0].private_context[-1].content == "还在吗"
+    store.close()
+
+
+def test_load_tail_without_pending_writes_does_not_wait(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.db"))
+    store.append("s1", "global", {"role": "user", "content": "你好"})
+    store.flush()
+    assert store.load_tail("s1", "global", 10) == [{"role": "user", "content": "你好"}]
+    assert store.load_tail("unknown", "global", 10) == []
+    store.close()
+
+
+def test_idle_sessions_are_evicted():
+    sessions = SessionStore(lambda session_id: Session(session_id, None, None), idle_timeout=0.05)
+    sessions.get_or_create("a")
+    time.sleep(0.06)
+    second = sessions.get_or_create("b")
+    assert sessions.get("a") is None
+    assert sessions.get("b") is second
+    assert sessions.get_stats()["evicted"] == 1
+
+
+def test_touch_moves_session_to_lru_tail():
+    sessions = SessionStore(lambda session_id: Session(session_id, None, None), max_sessions=2)
+    first = sessions.get_or_create("a")
+    sessions.get_or_create("b")
+    before = first.last_access
+    sessions.touch("a")  # 如WebSocket上收到消息
+    assert first.last_access >= before
+    sessions.get_or_create("c")
+    assert sessions.get("b") is None
+    assert sessions.get("a") is first
+    sessions.touch("b")  # 已淘汰的会话不会被重新加入
+    assert sessions.get("b") is None
@@ -0,0 +1,82 @@
+import asyncio
+from app.utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_flight():
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+
+        async def factory():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "结果"
+
+        results = await asyncio.gather(*(flights.do("k", factory) for _ in range(5)))
+        # 上一次结束后键已释放，新的调用重新发起
+        again = await flights.do("k", factory)
+        return results, again, calls, flights.get_stats()
+
+    results, again, calls, stats = asyncio.run(scenario())
+    assert results == ["结果"] * 5 and again == "结果"
+    assert calls == 2
+    assert stats["started"] == 2 and stats["coalesced"] == 4 and stats["in_flight"] == 0
+
+
+def test_errors_are_shared():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def factory():
+            await asyncio.sleep(0.01)
+            raise ValueError("失败")
+
+        return await asyncio.gather(*(flights.do("k", factory) for _ in range(2)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_one_cancelled_waiter_does_not_cancel_the_others():
+    async def scenario():
+        flights = SingleFlight()
+        started = asyncio.Event()
+
+        async def factory():
+            started.set()
+            await asyncio.sleep(0.05)
+            return "结果"
+
+        first = asyncio.create_task(flights.do("k", factory))
+        second = asyncio.create_task(flights.do("k", factory))
+        await started.wait()
+        first.cancel()
+        return await second, first
+
+    result, first = asyncio.run(scenario())
+    assert result == "结果"
+    assert first.cancelled()
+
+
+def test_flight_is_cancelled_when_every_waiter_leaves():
+    async def scenario():
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def factory():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(flights.do("k", factory)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return flights.get_stats()
+
+    assert asyncio.run(scenario())["in_flight"] == 0
@@ -0,0 +1,41 @@
+from app.agents.advisor_agent import AdvisorAgent
+from app.models.conversation_log import ConversationLog, Message
+from app.utils.token_budget import MESSAGE_OVERHEAD_TOKENS, count_tokens, message_tokens
+
+
+def test_count_tokens():
+    assert count_tokens("") == 0
+    assert count_tokens("你好") == 2
+    assert count_tokens("abcd") == 1
+    assert count_tokens("你好abcde") == 4
+    assert message_tokens("你好") == 2 + MESSAGE_OVERHEAD_TOKENS
+
+
+def _agent_with_history(budget):
+    agent = AdvisorAgent(openai_client=object())
+    log = ConversationLog()
+    log.subscribe(agent.projection.observe)
+    agent.projection.rebuild(log)
+    for index in range(5):
+        log.append(Message("user", f"第{index}个问题" + "很长" * 20))
+        log.append(Message("assistant", f"第{index}个回答" + "很长" * 20, name=agent.name))
+    log.append(Message("user", "最新的问题"))
+    agent.context_token_budget = budget
+    return agent, log
+
+
+def test_prompt_keeps_newest_messages_within_budget():
+    agent, log = _agent_with_history(budget=0)
+    system_tokens = message_tokens(agent.prepare_messages(log)[0]["content"])
+    per_message = message_tokens("第0个问题" + "很长" * 20)
+
+    agent.context_token_budget = system_tokens + message_tokens("最新的问题") + 2 * per_message
+    messages = agent.prepare_messages(log)
+    assert messages[0]["role"] == "system"
+    assert [msg["content"][:5] for msg in messages[1:]] == ["第4个问题", "第4个回答", "最新的问题"]
+
+
+def test_latest_user_message_is_kept_even_over_budget():
+    agent, log = _agent_with_history(budget=1)
+    messages = agent.prepare_messages(log)
+    assert [msg["content"] for msg in messages[1:]] == ["最新的问题"]
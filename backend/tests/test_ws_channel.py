@@ -0,0 +1,87 @@
+import asyncio
+import json
+import re
+import httpx
+from fastapi.testclient import TestClient
+import app.utils.openai_client as openai_client
+
+AGENT_DELAY = 0.3  # Agent发言的模拟耗时，保证插话发生在讨论进行中
+
+
+def _reply_for(body):
+    system = body["messages"][0]["content"]
+    prompt = body["messages"][-1]["content"]
+    if "JSON" in system:
+        match = re.search(r'用户(?:输入|消息): "(.*?)"', prompt, re.DOTALL)
+        needs_discussion = bool(match) and "讨论" in match.group(1)
+        return json.dumps({
+            "needs_discussion": needs_discussion, "topic": "测试主题", "suggested_rounds": 3, "confidence": 0.9,
+            "specified_agents": [], "should_speak": [], "should_not_speak": [],
+        }, ensure_ascii=False)
+    return f"关于{prompt[-10:]}的看法"
+
+
+async def _handler(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content)
+    if "JSON" not in body["messages"][0]["content"]:
+        await asyncio.sleep(AGENT_DELAY)
+    text = _reply_for(body)
+    if body.get("stream"):
+        chunk = {"id": "x", "object": "chat.completion.chunk", "created": 0, "model": "m",
+                 "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]}
+        content = f"data: {json.dumps(chunk, ensure_ascii=False)}\n\ndata: [DONE]\n\n"
+        return httpx.Response(200, content=content.encode(), headers={"content-type": "text/event-stream"})
+    return httpx.Response(200, json={
+        "id": "x", "object": "chat.completion", "created": 0, "model": "m",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+    })
+
+
+# 在导入路由之前替换共享客户端，讨论检测器等模块级对象也使用它
+openai_client._shared_client = openai_client.OpenAIClient(
+    http_client=httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+)
+
+import main  # noqa: E402
+
+
+def _discussion_count(client, session_id):
+    context = client.get("/api/context", params={"summary_only": True},
+                         headers={"X-Session-Id": session_id}).json()
+    return context["counts"]["discussion"]
+
+
+def test_interjection_stops_the_discussion_it_replaces():
+    with TestClient(main.app) as client, client.websocket_connect("/api/ws") as ws:
+        session_id = ws.receive_json()["session_id"]
+        ws.send_json({"type": "discussion", "topic": "远程办公", "max_rounds": 4, "strategy": "pipelined"})
+
+        before = []
+        while sum(1 for event in before if event["type"] == "message") < 2:
+            before.append(ws.receive_json())
+        ws.send_json({"type": "message", "content": "等等，我想补充一点：预算有限"})
+
+        after_cancel = None
+        while True:
+            event = ws.receive_json()
+            if event["type"] == "cancelled":
+                after_cancel = []
+            elif after_cancel is None:
+                before.append(event)
+            else:
+                after_cancel.append(event)
+                if event["type"] in ("done", "error"):
+                    break
+
+        assert after_cancel is not None
+        assert after_cancel[-1]["type"] == "done"
+        # cancelled之后只有新流程（直接回复，没有讨论轮次）的事件
+        assert all(event.get("round") is None for event in after_cancel)
+        assert any(event["type"] == "message" for event in after_cancel)
+
+        # 上下文中的讨论发言正好是cancelled之前推送过的那些，之后也不再增加
+        committed_before_cancel = sum(1 for event in before if event["type"] == "message")
+        assert _discussion_count(client, session_id) == committed_before_cancel
+        ws.send_json({"type": "cancel"})
+        asyncio.run(asyncio.sleep(AGENT_DELAY * 3))
+        assert _discussion_count(client, session_id) == committed_before_cancel
@@ -1,7 +1,7 @@
 import { useState, useEffect, useRef } from 'react'
 import MessageInput from './MessageInput'
 import MessageList from './MessageList'
-import { sendMessage } from '../services/api'
+import { sendMessage, getSessionHeaders } from '../services/api'
 import '../styles/ChatInterface.css'
 
 function ChatInterface() {
@@ -82,7 +82,9 @@ function ChatInterface() {
   // 获取上下文数据
   const fetchContext = async () => {
     try {
-      const response = await fetch('http://localhost:8000/api/context');
+      const response = await fetch('http://localhost:8000/api/context', {
+        headers: getSessionHeaders(),
+      });
       const data = await response.json();
       setContextData(data);
     } catch (error) {
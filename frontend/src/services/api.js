@@ -8,6 +8,28 @@ const apiClient = axios.create({
   },
 })
 
+// 会话ID：由后端分配，保存在本地并在每次请求时带上
+const SESSION_HEADER = 'X-Session-Id'
+const SESSION_STORAGE_KEY = 'multiAgentSessionId'
+
+export const getSessionHeaders = () => {
+  const sessionId = localStorage.getItem(SESSION_STORAGE_KEY)
+  return sessionId ? { [SESSION_HEADER]: sessionId } : {}
+}
+
+apiClient.interceptors.request.use((config) => {
+  Object.assign(config.headers, getSessionHeaders())
+  return config
+})
+
+apiClient.interceptors.response.use((response) => {
+  const sessionId = response.headers[SESSION_HEADER.toLowerCase()]
+  if (sessionId) {
+    localStorage.setItem(SESSION_STORAGE_KEY, sessionId)
+  }
+  return response
+})
+
 export const sendMessage = async (content) => {
   try {
     const response = await apiClient.post('/chat', { content })